@@ -1,7 +1,45 @@
-from google.genai import types
 import uuid
 import asyncio
 import threading
+import time
+
+from config.settings import (
+    LLM_CACHE_SIZE,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_INITIAL_CONCURRENCY,
+    LLM_MIN_CONCURRENCY,
+    LLM_MAX_CONCURRENCY,
+    LLM_TARGET_LATENCY,
+)
+from tools.lru_cache import LRUCache
+from tools.rate_limiter import LLMRateLimiter, LLMRequestCancelled
+from orchestrator.profiling import current_profile
+
+llm_cache = LRUCache("llm", LLM_CACHE_SIZE)
+
+# Shared by every agent and session, so quota pressure is handled in one place
+llm_limiter = LLMRateLimiter(
+    requests_per_min=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_min=LLM_TOKENS_PER_MINUTE,
+    initial_concurrency=LLM_INITIAL_CONCURRENCY,
+    min_concurrency=LLM_MIN_CONCURRENCY,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    target_latency=LLM_TARGET_LATENCY,
+)
+
+def _allow_nested_event_loop():
+    """
+    asyncio.run() below fails if the calling thread already runs an event
+    loop. Patch with nest_asyncio only in that case, instead of globally at
+    app start-up.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    import nest_asyncio
+    nest_asyncio.apply()
 
 class BaseAgent:
     _lock = threading.Lock()
@@ -19,7 +57,52 @@ class BaseAgent:
         {extra_context}
         """
 
-    def run_llm(self, agent_template, llm_input: str) -> str:
+    def run_llm(self, agent_template, llm_input: str, cache: bool = True) -> str:
+        """
+        Returns the LLM response for llm_input, served from the process-wide
+        prompt cache when the same agent has already answered the same input.
+        With cache=False the response is not stored; the caller stores it
+        with remember_llm once it has checked the answer.
+        """
+        key = self._llm_cache_key(agent_template, llm_input)
+        profile = current_profile.get()
+        cached = llm_cache.get(key)
+        if cached is not None:
+            print(f"[{self.name}] LLM cache hit.")
+            if profile is not None:
+                profile.record_llm_cache_hit()
+            return cached
+
+        # Waits for a slot by priority class (see tools.rate_limiter)
+        queued = time.perf_counter()
+        try:
+            with llm_limiter.slot(agent_template.instruction + llm_input) as call:
+                started = time.perf_counter()
+                response = self._invoke_llm(agent_template, llm_input)
+                call["output"] = response
+        except LLMRequestCancelled:
+            print(f"[{self.name}] LLM call cancelled while queued.")
+            return ""
+        if profile is not None:
+            profile.record_llm(started - queued, time.perf_counter() - started)
+
+        if cache:
+            self.remember_llm(agent_template, llm_input, response)
+        return response
+
+    @staticmethod
+    def _llm_cache_key(agent_template, llm_input: str) -> tuple:
+        return (agent_template.name, agent_template.instruction, llm_input)
+
+    def remember_llm(self, agent_template, llm_input: str, response: str) -> None:
+        """
+        Stores a response in the prompt cache.
+        """
+        # Empty text means the call failed; don't pin the failure
+        if response:
+            llm_cache.put(self._llm_cache_key(agent_template, llm_input), response)
+
+    def _invoke_llm(self, agent_template, llm_input: str) -> str:
         """
         Executes LLM call using the correct ADK 2025 Runner API.
         Creates a FRESH stack (Model, Agent, Runner) for each call to ensure thread safety.
@@ -27,7 +110,10 @@ class BaseAgent:
         from google.adk.runners import InMemoryRunner
         from google.adk.agents import Agent
         from google.adk.models.google_llm import Gemini
+        from google.genai import types
         import os
+
+        _allow_nested_event_loop()
         
         # 1. Generate Session ID
         current_session_id = str(uuid.uuid4())
@@ -96,6 +182,7 @@ class BaseAgent:
 
         except Exception as e:
             print(f"[{self.name}] Runner Execution Failed: {e}")
+            llm_limiter.report_error(e)
             # Proceed to fallback below
             pass
 
@@ -128,6 +215,7 @@ class BaseAgent:
 
         except Exception as e2:
             print(f"[{self.name}] Critical Failure: {e2}")
+            llm_limiter.report_error(e2)
             return ""
 
     def run(self, shared_state: dict):
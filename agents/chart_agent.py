@@ -1,17 +1,29 @@
 import json
+import math
 import re
-from google.adk.agents import Agent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.genai import types
 
 from agents.base_agent import BaseAgent
-from tools.chart_tool import generate_chart_tool
 
 import os
 
+def _bin_labels(edges):
+    """
+    One "low–high" label per histogram bin. Edges are rounded to the
+    decimal place of the bin width, so adjacent bins never share a label.
+    """
+    width = min(b - a for a, b in zip(edges, edges[1:]))
+    decimals = max(0, math.ceil(-math.log10(width))) if width > 0 else 0
+    # No separators below 10,000, so years read as years
+    fmt = f"{',' if max(abs(edges[0]), abs(edges[-1])) >= 10000 else ''}.{decimals}f"
+    return [f"{lo:{fmt}}–{hi:{fmt}}" for lo, hi in zip(edges, edges[1:])]
+
 class ChartAgent(BaseAgent):
     def __init__(self):
+        from google.adk.agents import Agent
+        from google.adk.models.google_llm import Gemini
+        from google.adk.runners import InMemoryRunner
+        from google.genai import types
+
         super().__init__("ChartAgent")
 
         self.retry_config = types.HttpRetryOptions(
@@ -65,10 +77,51 @@ class ChartAgent(BaseAgent):
             print(f"[ChartAgent] JSON Extraction Failed: {e}")
             return []
 
+    def _profile_charts(self, profile, max_charts=3):
+        """
+        Overview charts drawn straight from the table profile (no LLM):
+        value distributions of numeric columns and the most common values
+        of categorical ones, alternating, in column order.
+        """
+        from tools.chart_tool import generate_chart_tool
+
+        numeric, categorical = [], []
+        for name, col in profile["columns"].items():
+            if col["type"] == "numeric" and col.get("histogram") and col["distinct"] > 1:
+                # Skip identifier-like columns (nearly every value distinct and integral)
+                if col["distinct"] >= 0.95 * profile["rows"] and float(col["min"]).is_integer():
+                    continue
+                numeric.append(name)
+            elif col["type"] == "text" and 1 < col["distinct"] <= 100:
+                categorical.append(name)
+
+        picks = []
+        for pair in zip(numeric + [None] * len(categorical), categorical + [None] * len(numeric)):
+            picks += [p for p in pair if p is not None]
+        charts = []
+        for name in picks[:max_charts]:
+            col = profile["columns"][name]
+            if col["type"] == "numeric":
+                edges, counts = col["histogram"]["edges"], col["histogram"]["counts"]
+                rows = list(zip(_bin_labels(edges), counts))
+                spec = {"type": "bar", "x_col": name, "y_col": "rows", "title": f"Distribution of {name}"}
+            else:
+                rows = [(str(t["value"]), t["count"]) for t in col["top_values"]]
+                spec = {"type": "bar", "x_col": name, "y_col": "rows", "title": f"Most common {name} values"}
+            images = generate_chart_tool(rows, [name, "rows"], spec["type"], spec["x_col"], spec["y_col"], spec["title"])
+            if images:
+                charts.append({"spec": spec, "images": images})
+        return charts
+
     def run(self, shared_state):
         rows = shared_state.get("sql_result", {}).get("rows", [])
         columns = shared_state.get("sql_result", {}).get("columns", [])
 
+        # Discovery over the whole table: charts come from the profile
+        profile = shared_state.get("profile")
+        if shared_state.get("discovery_mode", False) and profile and profile["columns"]:
+            return {"chart_agent": {"charts": self._profile_charts(profile)}}
+
         if not rows:
             print("[ChartAgent] No data to visualize.")
             return {"chart_agent": {"charts": []}}
@@ -97,6 +150,9 @@ class ChartAgent(BaseAgent):
         response = self.run_llm(self.chart_llm_agent, llm_input)
         specs = self._extract_json(response)
         
+        # matplotlib is only loaded once a chart is actually rendered
+        from tools.chart_tool import generate_chart_tool
+
         charts = []
         for spec in specs:
             try:
@@ -105,13 +161,14 @@ class ChartAgent(BaseAgent):
                     print(f"[ChartAgent] Invalid spec: {spec}")
                     continue
 
-                png = generate_chart_tool(
+                images = generate_chart_tool(
                     rows, columns, 
                     spec.get('type'), spec.get('x_col'), spec.get('y_col'), 
                     spec.get('title')
                 )
-                if png:
-                    charts.append({"spec": spec, "png": png})
+                if images:
+                    # Blob handles per output profile; bytes stay in the blob store
+                    charts.append({"spec": spec, "images": images})
             except Exception as e:
                 print(f"[ChartAgent] Chart gen failed: {e}")
 
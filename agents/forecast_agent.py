@@ -1,14 +1,16 @@
-from google.adk.agents import Agent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.genai import types
 
 from agents.base_agent import BaseAgent
+from tools.result_store import rows_frame, is_spilled, frame_chunks
 
 import os
 
 class ForecastAgent(BaseAgent):
     def __init__(self):
+        from google.adk.agents import Agent
+        from google.adk.models.google_llm import Gemini
+        from google.adk.runners import InMemoryRunner
+        from google.genai import types
+
         super().__init__("ForecastAgent")
 
         self.retry_config = types.HttpRetryOptions(
@@ -28,8 +30,9 @@ class ForecastAgent(BaseAgent):
             ),
             instruction="""
             You are a Predictive Analyst.
-            Based on the provided data, provide a brief forecast or trend analysis.
-            If the data is not time-series or suitable for forecasting, explain why.
+            You are given forecasts that were already computed from the data.
+            Explain them briefly in plain language: direction, size of change and uncertainty.
+            Use only the numbers provided; do not compute or invent new ones.
             """,
             tools=[]
         )
@@ -46,17 +49,49 @@ class ForecastAgent(BaseAgent):
         if not rows:
             return {"forecast_agent": {"forecast_text": "No data available for forecasting."}}
 
-        # Limit rows for context
-        sample_rows = rows[:20]
-        
+        # The numbers come from the local engine; the LLM only narrates them.
+        # numpy/pandas are only loaded once there is something to forecast
+        from tools.forecast_engine import forecast, describe_forecast
+
+        try:
+            if is_spilled(rows):
+                # Columns are found on a sample; period sums stream over every chunk
+                result = forecast(rows.sample_frame(columns), frame_chunks(rows, columns))
+            else:
+                result = forecast(rows_frame(rows, columns))
+        except Exception as e:
+            print(f"[ForecastAgent] Forecast failed: {e}")
+            result = None
+
+        if result is None:
+            return {"forecast_agent": {
+                "forecast_text": "The result is not a time series (it needs a date column, a numeric "
+                                 "column and enough points), so no forecast was produced."
+            }}
+
+        summary = describe_forecast(result)
         llm_input = self.build_llm_input(
             shared_state,
             extra_context=f"""
-            Columns: {columns}
-            Data Sample (first 20 rows): {sample_rows}
+            Computed forecast:
+            {summary}
             """
         )
-
         response = self.run_llm(self.forecast_llm_agent, llm_input)
-        
-        return {"forecast_agent": {"forecast_text": response}}
\ No newline at end of file
+
+        # matplotlib is only loaded once a chart is actually rendered
+        from tools.chart_tool import generate_forecast_chart
+
+        charts = []
+        images = generate_forecast_chart(result)
+        if images:
+            value_label = result["value_col"] or "value"
+            spec = {"type": "forecast", "x_col": result["time_col"], "y_col": result["value_col"],
+                    "title": f"{value_label} forecast"}
+            charts.append({"spec": spec, "images": images})
+
+        return {"forecast_agent": {
+            "forecast_text": response or summary,
+            "forecast": {k: v for k, v in result.items() if k != "history"},
+            "charts": charts,
+        }}
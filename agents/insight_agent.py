@@ -1,14 +1,16 @@
-from google.adk.agents import Agent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.genai import types
 
 from agents.base_agent import BaseAgent
+from tools.result_store import rows_frame, is_spilled, frame_chunks
 
 import os
 
 class InsightAgent(BaseAgent):
     def __init__(self):
+        from google.adk.agents import Agent
+        from google.adk.models.google_llm import Gemini
+        from google.adk.runners import InMemoryRunner
+        from google.genai import types
+
         super().__init__("InsightAgent")
 
         self.retry_config = types.HttpRetryOptions(
@@ -53,9 +55,18 @@ class InsightAgent(BaseAgent):
         is_discovery = shared_state.get("discovery_mode", False)
         
         if is_discovery:
+            # The profile covers every row; the sample only shows what values look like
+            profile = shared_state.get("profile")
+            if profile:
+                # The profiler pulls in numpy/pandas; only load it to describe one
+                from tools.profiler import describe_profile
+
+                overview = f"{describe_profile(profile)}\nData Sample (first 5 rows): {rows[:5]}"
+            else:
+                overview = f"Data Sample (first 20 rows): {sample_rows}"
             prompt = f"""
             Columns: {columns}
-            Data Sample (first 20 rows): {sample_rows}
+            {overview}
             
             Task: Generate 3-5 interesting questions that a user might want to ask about this data.
             Return ONLY a JSON list of strings. Example: ["Question 1?", "Question 2?"]
@@ -77,16 +88,40 @@ class InsightAgent(BaseAgent):
             return {"insight_agent": {"recommended_questions": questions}}
         
         else:
-            # Normal insight generation
-            llm_input = self.build_llm_input(
-                shared_state,
-                extra_context=f"""
+            # Findings are computed over the full result; the LLM only phrases them.
+            # numpy/pandas are only loaded once there is a result to analyze
+            from tools.insight_engine import analyze, describe_findings
+
+            try:
+                if is_spilled(rows):
+                    # Totals stream over every chunk; other statistics use a uniform sample
+                    findings = analyze(rows.sample_frame(columns), frames=frame_chunks(rows, columns))
+                else:
+                    findings = analyze(rows_frame(rows, columns))
+            except Exception as e:
+                print(f"[InsightAgent] Analysis failed: {e}")
+                findings = []
+
+            if findings:
+                context = f"""
+                Columns: {columns}
+                Total Rows: {len(rows)}
+                Findings computed over all rows, most notable first:
+                {describe_findings(findings)}
+
+                Phrase the findings above as 3-5 key insights. Use only these numbers.
+                """
+            else:
+                context = f"""
                 Columns: {columns}
                 Data Sample (first 20 rows): {sample_rows}
                 Total Rows: {len(rows)}
                 """
-            )
 
+            llm_input = self.build_llm_input(shared_state, extra_context=context)
             response = self.run_llm(self.insight_llm_agent, llm_input)
-            
-            return {"insight_agent": {"insights": response}}
\ No newline at end of file
+
+            return {"insight_agent": {
+                "insights": response or describe_findings(findings),
+                "findings": findings,
+            }}
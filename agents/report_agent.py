@@ -1,16 +1,62 @@
+import hashlib
+import json
+
 from agents.base_agent import BaseAgent
-from tools.pdf_tool import generate_pdf_report
+from orchestrator.jobs import report_jobs
+from tools.history_store import history_store
 
 class ReportAgent(BaseAgent):
     def __init__(self):
         super().__init__("ReportAgent")
 
+    def _snapshot(self, shared_state: dict) -> dict:
+        """
+        Copies just what the report needs, so the background job is not
+        affected by the caller appending to history afterwards.
+        Without an explicit history list, the job reads the session's turns
+        from the history store, up to the turn count recorded here.
+        """
+        history = shared_state.get("history")
+        session_id = shared_state.get("session_id")
+        return {
+            "user_query": shared_state.get("user_query", ""),
+            "insight_agent": shared_state.get("insight_agent", {}),
+            "forecast_agent": shared_state.get("forecast_agent", {}),
+            "chart_agent": shared_state.get("chart_agent", {}),
+            "history": list(history) if history is not None else None,
+            "history_turns": history_store.count(session_id) if history is None and session_id else 0,
+            "session_id": session_id,
+        }
+
+    def _job_key(self, snapshot: dict) -> str:
+        payload = json.dumps(snapshot, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def submit(self, shared_state: dict) -> str:
+        """
+        Queues report generation in the background and returns the job id.
+        Identical session state reuses the existing job. A session's jobs
+        write the same file, so they run one at a time in order: the last
+        one queued is the last one written.
+        """
+        snapshot = self._snapshot(shared_state)
+        job_id = report_jobs.submit(
+            lambda: self.run(snapshot).get("report_file"),
+            dedupe_key=self._job_key(snapshot),
+            serial_key=snapshot["session_id"],
+        )
+        print(f"[ReportAgent] Report job queued: {job_id}")
+        return job_id
+
     def run(self, shared_state: dict) -> dict:
         """
         Generates the PDF report using the full session history.
         """
-        # Extract history passed from Orchestrator
-        history = shared_state.get("history", [])
+        # Extract history passed from Orchestrator, or load it from the store
+        history = shared_state.get("history")
+        if history is None:
+            session_id = shared_state.get("session_id")
+            history = history_store.load(session_id, end=shared_state.get("history_turns")) if session_id else []
         
         # Create a snapshot of the current turn
         current_turn = {
@@ -23,7 +69,11 @@ class ReportAgent(BaseAgent):
         # Combine history + current
         full_history = history + [current_turn]
         
-        pdf_path = generate_pdf_report(full_history)
+        # reportlab is only loaded when a report is actually built
+        from tools.pdf_tool import generate_pdf_report
+
+        # Previous turns hit the fragment cache; only the new turn is drawn
+        pdf_path = generate_pdf_report(full_history, session_id=shared_state.get("session_id"))
         
         if pdf_path:
             print(f"[ReportAgent] PDF generated at: {pdf_path}")
@@ -1,15 +1,22 @@
-from google.adk.agents import Agent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.genai import types
 import re
 
 from agents.base_agent import BaseAgent
+from tools.lru_cache import LRUCache
+from tools.sql_tool import DB_PATH, data_version, validate_sql
+from tools.nl2sql import translate
+from config.settings import SQL_REPAIR_ATTEMPTS, NL2SQL_FAST_PATH, NL2SQL_MIN_CONFIDENCE
 
 import os
 
+schema_cache = LRUCache("schema", 8)
+
 class SQLAgent(BaseAgent):
     def __init__(self):
+        from google.adk.agents import Agent
+        from google.adk.models.google_llm import Gemini
+        from google.adk.runners import InMemoryRunner
+        from google.genai import types
+
         super().__init__("SQLAgent")
         
         self.retry_config = types.HttpRetryOptions(
@@ -67,13 +74,21 @@ class SQLAgent(BaseAgent):
             
         return text
 
-    def _get_table_schema(self):
+    def _get_table_columns(self) -> list:
+        """
+        Column names of 'data_table', cached per data version so they are
+        read from SQLite once per upload rather than once per question.
+        Returns [] when the database or table is missing.
+        """
+        version = data_version()
+        cached = schema_cache.get(version)
+        if cached is not None:
+            return cached
+
         try:
             import sqlite3
-            import os
-            DB_PATH = os.path.join(os.path.dirname(__file__), '../db/analyst.db')
             if not os.path.exists(DB_PATH):
-                return "Table 'data_table' columns: Unknown (DB not found)"
+                return []
             
             conn = sqlite3.connect(DB_PATH)
             cursor = conn.cursor()
@@ -81,16 +96,67 @@ class SQLAgent(BaseAgent):
             columns = [info[1] for info in cursor.fetchall()]
             conn.close()
             if columns:
-                return f"Table 'data_table' columns: {', '.join(columns)}"
-            return "Table 'data_table' columns: Unknown (Table not found)"
+                schema_cache.put(version, columns)
+            return columns
         except Exception as e:
             print(f"[SQLAgent] Schema fetch failed: {e}")
-            return "Table 'data_table' columns: Unknown"
+            return []
+
+    def _get_table_schema(self):
+        """
+        Schema description for the prompt.
+        """
+        if not os.path.exists(DB_PATH):
+            return "Table 'data_table' columns: Unknown (DB not found)"
+        columns = self._get_table_columns()
+        if columns:
+            return f"Table 'data_table' columns: {', '.join(columns)}"
+        return "Table 'data_table' columns: Unknown (Table not found)"
+
+    def _ask_sql(self, llm_input: str, calls: list) -> str:
+        """
+        SQL for one prompt. Replies are not cached here: run() caches the
+        calls only once the final query validates, so a retry never replays
+        broken SQL and failed repairs.
+        """
+        response = self.run_llm(self.sql_llm_agent, llm_input, cache=False)
+        calls.append((llm_input, response))
+        return self._clean_sql(response)
+
+    def _repair_sql(self, shared_state: dict, schema_info: str, sql_query: str, error: str, calls: list) -> str:
+        """
+        Asks the LLM to fix a query that failed validation, giving it the
+        exact error.
+        """
+        llm_input = self.build_llm_input(
+            shared_state,
+            extra_context=f"""{schema_info}
+Rules: Use 'data_table' as table name.
+
+Your previous query:
+{sql_query}
+failed with this SQLite error:
+{error}
+Return a corrected query."""
+        )
+        return self._ask_sql(llm_input, calls)
 
     def run(self, shared_state: dict) -> dict:
         """
         Generates SQL based on user_query and updates shared_state.
+        The query is compiled against the live schema before it is returned;
+        invalid SQL gets up to SQL_REPAIR_ATTEMPTS LLM repair rounds.
+        Simple question shapes are translated locally (tools.nl2sql) when
+        the match is confident enough, skipping the LLM entirely.
         """
+        if NL2SQL_FAST_PATH:
+            sql_query, confidence = translate(shared_state.get("user_query", ""))
+            if (sql_query and confidence >= NL2SQL_MIN_CONFIDENCE
+                    and validate_sql(sql_query, self._get_table_columns()) is None):
+                print(f"[SQLAgent] Rule-based SQL (confidence {confidence:.2f}): {sql_query}")
+                shared_state["sql_agent"] = {"sql": sql_query, "source": "rules", "confidence": confidence}
+                return shared_state
+
         schema_info = self._get_table_schema()
         
         llm_input = self.build_llm_input(
@@ -98,10 +164,28 @@ class SQLAgent(BaseAgent):
             extra_context=f"{schema_info}\nRules: Use 'data_table' as table name."
         )
 
-        response = self.run_llm(self.sql_llm_agent, llm_input)
-        sql_query = self._clean_sql(response)
+        calls = []
+        sql_query = self._ask_sql(llm_input, calls)
+
+        columns = self._get_table_columns()
+        error = validate_sql(sql_query, columns)
+        attempts = 0
+        while error and attempts < SQL_REPAIR_ATTEMPTS:
+            attempts += 1
+            print(f"[SQLAgent] Validation failed ({error}); repair attempt {attempts}/{SQL_REPAIR_ATTEMPTS}.")
+            sql_query = self._repair_sql(shared_state, schema_info, sql_query, error, calls)
+            error = validate_sql(sql_query, columns)
+
+        if error is None:
+            for call_input, response in calls:
+                self.remember_llm(self.sql_llm_agent, call_input, response)
         
         print(f"[SQLAgent] Generated SQL: {sql_query}")
         
-        shared_state["sql_agent"] = {"sql": sql_query}
-        return shared_state
\ No newline at end of file
+        shared_state["sql_agent"] = {
+            "sql": sql_query,
+            "source": "llm",
+            "repair_attempts": attempts,
+            "validation_error": error,
+        }
+        return shared_state
@@ -0,0 +1,330 @@
+"""
+Headless HTTP API for the analysis pipeline.
+
+Run with:
+    uvicorn api.server:app --host 0.0.0.0 --port 8000
+
+Pipeline runs execute on a bounded worker pool; once API_MAX_PENDING runs are
+in flight or queued, new requests are rejected with 503 + Retry-After.
+/ask streams newline-delimited JSON events as each stage finishes.
+"""
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+import sqlite3
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, Union
+
+# Ensure root import visibility
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+from config.settings import API_WORKERS, API_MAX_PENDING, MAX_SQL_ROWS
+from orchestrator.jobs import report_jobs, refine_jobs, DONE
+from orchestrator.profiling import parse_modes
+from orchestrator.service import get_orchestrator
+from orchestrator.speculative import speculator
+from agents.base_agent import llm_limiter
+from tools.blob_store import blob_store
+from tools.history_store import history_store
+from tools.result_export import EXPORT_FORMATS, csv_chunks, export_file
+from tools.sql_tool import load_csv_to_db, fetch_sample_tool, stream_query
+
+
+class WorkerPool:
+    """
+    Thread pool with an admission limit: at most max_pending jobs may be
+    running or waiting at once. Counters are only touched on the event loop.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="api-worker"
+        )
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server busy: {self.pending} requests pending.",
+                headers={"Retry-After": "5"},
+            )
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future) -> None:
+        self.pending -= 1
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Create and start warming the shared orchestrator before serving
+    get_orchestrator()
+    yield
+
+
+pool = WorkerPool(API_WORKERS, API_MAX_PENDING)
+app = FastAPI(title="AI Data Analyst API", lifespan=lifespan)
+
+
+class AskRequest(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+    stream: bool = True
+    # Aggregates from the stratified sample with error bounds; exact result via /refine
+    approximate: bool = False
+    # Run profiling: true, or modes such as "cpu,memory" (see orchestrator.profiling)
+    profile: Optional[Union[bool, str]] = None
+
+
+class ExportRequest(BaseModel):
+    sql: str
+    format: str = "csv"
+
+
+def _public_result(shared_state: dict) -> dict:
+    """
+    JSON-safe view of a pipeline result. Rows are capped at MAX_SQL_ROWS.
+    """
+    sql_result = shared_state.get("sql_result", {})
+    rows = sql_result.get("rows", [])
+    return {
+        "user_query": shared_state.get("user_query"),
+        "session_id": shared_state.get("session_id"),
+        "sql": shared_state.get("sql_agent", {}).get("sql"),
+        "sql_result": {
+            "columns": sql_result.get("columns", []),
+            "rows": [list(r) for r in rows[:MAX_SQL_ROWS]],
+            "row_count": len(rows),
+            "error": sql_result.get("error"),
+            "approximate": sql_result.get("approximate"),
+        },
+        "insight_agent": shared_state.get("insight_agent", {}),
+        "forecast_agent": shared_state.get("forecast_agent", {}),
+        "chart_agent": shared_state.get("chart_agent", {}),
+        "report_job": shared_state.get("report_job"),
+        "stage_status": shared_state.get("stage_status", {}),
+        "stage_errors": shared_state.get("stage_errors", {}),
+        "cancelled": shared_state.get("cancelled", False),
+        "run_profile": shared_state.get("run_profile"),
+    }
+
+
+def _run_ask(question: str, session_id: str, on_progress=None, approximate: bool = False,
+             profile=None) -> dict:
+    speculator.claim(session_id, question)
+    result = get_orchestrator().run(question, session_id=session_id, on_progress=on_progress,
+                                    approximate=approximate, profile=profile)
+    if result.get("stage_status", {}).get("sql_tool") == DONE:
+        history_store.append(session_id, {
+            "user_query": question,
+            "insight_agent": result.get("insight_agent", {}),
+            "forecast_agent": result.get("forecast_agent", {}),
+            "chart_agent": result.get("chart_agent", {}),
+        })
+    return _public_result(result)
+
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event, default=str) + "\n"
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "pending": pool.pending,
+        "workers": pool.workers,
+        "max_pending": pool.max_pending,
+        "llm": llm_limiter.stats(),
+    }
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """
+    Loads a CSV request body into 'data_table'.
+    """
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty CSV body.")
+    loaded = await pool.submit(load_csv_to_db, io.BytesIO(body))
+    if not loaded:
+        raise HTTPException(status_code=400, detail="Failed to load CSV.")
+    return {"loaded": True}
+
+
+def _check_profile(profile) -> None:
+    try:
+        parse_modes(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/discovery")
+async def discovery(session_id: Optional[str] = None, profile: Optional[str] = None):
+    """
+    Table profile, overview charts and recommended questions. With a session_id, the
+    recommended questions are precomputed in the background for that session.
+    """
+    _check_profile(profile)
+
+    def work():
+        state = {"sql_result": fetch_sample_tool(20), "user_query": ""}
+        result = get_orchestrator().run_discovery(state, profile=profile)
+        questions = result.get("insight_agent", {}).get("recommended_questions", [])
+        if session_id:
+            speculator.start(get_orchestrator(), session_id, questions)
+        return {
+            "chart_agent": result.get("chart_agent", {}),
+            "insight_agent": result.get("insight_agent", {}),
+            "profile": result.get("profile"),
+            "run_profile": result.get("run_profile"),
+            "session_id": session_id,
+        }
+
+    return await pool.submit(work)
+
+
+@app.post("/ask")
+async def ask(req: AskRequest):
+    session_id = req.session_id or uuid.uuid4().hex
+    _check_profile(req.profile)
+
+    if not req.stream:
+        return await pool.submit(_run_ask, req.question, session_id, None, req.approximate, req.profile)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def push(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    def work():
+        try:
+            result = _run_ask(req.question, session_id, on_progress=lambda e: push({"event": "progress", **e}),
+                              approximate=req.approximate, profile=req.profile)
+            push({"event": "result", "result": result})
+        except Exception as e:
+            push({"event": "error", "error": str(e)})
+        finally:
+            push(None)
+
+    # Admission (and a possible 503) happens before the stream starts
+    pool.submit(work)
+
+    async def stream():
+        yield _ndjson({"event": "accepted", "session_id": session_id})
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield _ndjson(event)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/sessions/{session_id}/history")
+async def session_history(session_id: str, full: bool = False, start: int = 0, end: Optional[int] = None):
+    """
+    Turn summaries of a session, or full turns [start, end) with full=true.
+    """
+    if full:
+        return {"session_id": session_id, "turns": await pool.submit(history_store.load, session_id, start, end)}
+    return {"session_id": session_id, "turns": history_store.summaries(session_id)[start:end]}
+
+
+@app.get("/reports/{job_id}")
+async def report_status(job_id: str):
+    job = report_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job.")
+    return job
+
+
+@app.get("/reports/{job_id}/file")
+async def report_file(job_id: str):
+    job = report_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job.")
+    if job["status"] != DONE or not job.get("result") or not os.path.exists(job["result"]):
+        raise HTTPException(status_code=409, detail=f"Report not ready ({job['status']}).")
+    return FileResponse(job["result"], media_type="application/pdf", filename=os.path.basename(job["result"]))
+
+
+@app.get("/refine/{job_id}")
+async def refine_status(job_id: str):
+    """
+    Exact result of a query first answered approximately. The job id is
+    sql_result.approximate.refine_job of an /ask response.
+    """
+    job = refine_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown refine job.")
+    job = dict(job)
+    if job["status"] == DONE and job.get("result"):
+        rows = job["result"].get("rows", [])
+        job["result"] = {
+            "columns": job["result"].get("columns", []),
+            "rows": [list(r) for r in rows[:MAX_SQL_ROWS]],
+            "row_count": len(rows),
+            "error": job["result"].get("error"),
+        }
+    return job
+
+
+@app.post("/export")
+async def export(req: ExportRequest):
+    """
+    Full result of a read-only query (e.g. the sql of an /ask response) as a
+    CSV or Parquet download, without the MAX_SQL_ROWS cap. Rows are read
+    from the cursor in EXPORT_CHUNK_ROWS chunks: CSV is streamed as it is
+    read, Parquet is written chunk by chunk to a temporary file first.
+    """
+    if req.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown export format; expected one of {list(EXPORT_FORMATS)}.")
+    media_type, extension = EXPORT_FORMATS[req.format]
+    try:
+        columns, chunks = await pool.submit(stream_query, req.sql)
+    except (sqlite3.Error, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Query cannot be exported: {e}")
+    filename = f"result{extension}"
+
+    if req.format == "csv":
+        return StreamingResponse(
+            csv_chunks(columns, chunks), media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    try:
+        path = await pool.submit(export_file, columns, chunks, req.format)
+    except HTTPException:
+        chunks.close()
+        raise
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(path, media_type=media_type, filename=filename, background=BackgroundTask(os.remove, path))
+
+
+@app.get("/blobs/{handle:path}")
+async def blob(handle: str):
+    """
+    Serves chart images by the handle found in chart_agent results.
+    """
+    data = blob_store.get(handle)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Unknown blob.")
+    media_type = "image/svg+xml" if handle.endswith(".svg") else "image/png"
+    return Response(content=data, media_type=media_type)
@@ -0,0 +1,89 @@
+"""
+Import-time benchmark.
+
+Runs each module import in a fresh interpreter under `python -X importtime`
+and reports its cumulative cost plus the heaviest dependencies it pulled in.
+
+Usage:
+    python benchmarks/import_time.py [module ...] [--top N]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_MODULES = [
+    "orchestrator.service",
+    "orchestrator.root_orchestrator",
+    "agents.base_agent",
+    "agents.sql_agent",
+    "agents.chart_agent",
+    "agents.report_agent",
+    "tools.sql_tool",
+    "tools.blob_store",
+    "tools.chart_tool",
+    "tools.pdf_tool",
+]
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str) -> list:
+    """
+    Returns [(cumulative_us, self_us, depth, name)] for every import
+    triggered by `import module` in a clean interpreter.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(cumulative_us), int(self_us), len(indent) // 2, name))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=5, help="heaviest top-level dependencies to list per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<36} {'cumulative ms':>14}")
+    print("-" * 51)
+    for module in args.modules:
+        try:
+            entries = measure(module)
+        except RuntimeError as e:
+            print(f"{module:<36} {'FAILED':>14}  {e}")
+            continue
+
+        # -X importtime prints children before their parent, one indent deeper
+        total_us, children = 0, []
+        pending = []
+        for entry in entries:
+            if entry[2] == 0:
+                if entry[3] == module:
+                    total_us = entry[0]
+                    children = [e for e in pending if e[2] == 1]
+                pending = []
+            else:
+                pending.append(entry)
+
+        print(f"{module:<36} {total_us / 1000:>14.1f}")
+        for cumulative_us, _, _, name in sorted(children, reverse=True)[:args.top]:
+            print(f"    {name:<32} {cumulative_us / 1000:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Concurrent-session load test of the pipeline, with a stub LLM.
+
+Each simulated session uploads its own CSV, runs discovery and asks M
+questions through the orchestrator, like a user of the app. LLM calls are
+replaced by a local stub with log-normal latency, so the numbers measure
+this process (scheduling, SQLite, pandas, rendering) plus the configured
+LLM rate limiter, not the model.
+
+For every concurrency level it records throughput, p50/p99 latency per
+operation, RSS growth, and SQLite lock contention: statements that failed
+with "database is locked"/"busy" and the time spent in them. The levels
+form a capacity curve, saved as JSON under logs/loadtest/ so runs before
+and after a change can be compared with --compare.
+
+The run works in a temporary directory (database, history, result spill
+files, chart cache and blobs), so the app's own data is left untouched.
+Caches are cleared between levels and every question is asked once, so
+each level measures the pipeline doing real work.
+
+Usage:
+    python benchmarks/load_test.py [--sessions 1,2,4,8] [--questions 3] [--rows 5000]
+                                   [--llm-latency 0.8] [--llm-rpm 600] [--label NAME]
+                                   [--compare BASELINE.json]
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+QUESTIONS = {
+    "What is the total sales by region?":
+        'SELECT region, SUM(sales) AS total_sales FROM data_table GROUP BY region ORDER BY total_sales DESC',
+    "Show the monthly sales trend":
+        "SELECT strftime('%Y-%m', date) AS month, SUM(sales) AS total_sales FROM data_table GROUP BY month ORDER BY month",
+    "Which are the top 5 products by quantity sold?":
+        'SELECT product, SUM(quantity) AS units FROM data_table GROUP BY product ORDER BY units DESC LIMIT 5',
+    "What is the average order value per region?":
+        'SELECT region, AVG(sales) AS avg_order FROM data_table GROUP BY region',
+    "How many orders were placed each day?":
+        'SELECT date, COUNT(*) AS orders FROM data_table GROUP BY date ORDER BY date',
+    "Which orders had the highest sales?":
+        'SELECT * FROM data_table ORDER BY sales DESC LIMIT 50',
+}
+
+
+# -----------------------------------------------------
+# Stub LLM
+# -----------------------------------------------------
+
+class StubLLM:
+    """
+    Stands in for BaseAgent._invoke_llm: sleeps for a log-normal latency
+    (median `latency` seconds) and returns a canned answer of the shape
+    each agent expects.
+    """
+
+    def __init__(self, latency: float, sigma: float = 0.4, seed: int = 0):
+        self.latency = latency
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _sleep(self) -> None:
+        with self._lock:
+            delay = self.latency * self._rng.lognormvariate(0, self.sigma) if self.latency > 0 else 0
+            self.calls += 1
+        time.sleep(delay)
+
+    def __call__(self, agent, agent_template, llm_input: str) -> str:
+        self._sleep()
+        name = agent_template.name
+        if name == "SQL_LLM":
+            for question, sql in QUESTIONS.items():
+                if question in llm_input:
+                    return sql
+            return "SELECT * FROM data_table LIMIT 100"
+        if name == "Chart_LLM":
+            match = re.search(r"Columns: (\[.*?\])", llm_input)
+            columns = ast.literal_eval(match.group(1)) if match else []
+            if len(columns) < 2:
+                return "[]"
+            return json.dumps([{"type": "bar", "x_col": columns[0], "y_col": columns[-1],
+                                "title": f"{columns[-1]} by {columns[0]}"}])
+        if name == "Insight_LLM" and "JSON list of strings" in llm_input:
+            return json.dumps(list(QUESTIONS)[:4])
+        return "Sales are concentrated in a few regions and grew steadily over the period."
+
+
+# -----------------------------------------------------
+# SQLite contention counters
+# -----------------------------------------------------
+
+class SQLiteStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.statements = 0
+            self.locked = 0
+            self.locked_wait_s = 0.0
+            self.errors = 0
+            self.messages = Counter()
+
+    def record(self, elapsed: float, error: Exception = None) -> None:
+        with self._lock:
+            self.statements += 1
+            if error is None:
+                return
+            message = str(error).lower()
+            self.messages[message[:80]] += 1
+            if "locked" in message or "busy" in message:
+                # SQLite retried for up to the connection timeout before giving up
+                self.locked += 1
+                self.locked_wait_s += elapsed
+            else:
+                self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"statements": self.statements, "locked": self.locked,
+                    "locked_wait_s": round(self.locked_wait_s, 3), "other_errors": self.errors,
+                    "error_messages": dict(self.messages.most_common(5))}
+
+
+sqlite_stats = SQLiteStats()
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except sqlite3.OperationalError as e:
+        sqlite_stats.record(time.perf_counter() - started, e)
+        raise
+    sqlite_stats.record(time.perf_counter() - started)
+    return result
+
+
+class CountingCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        return _timed(super().execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return _timed(super().executemany, *args, **kwargs)
+
+
+class CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args, **kwargs):
+        return self.cursor().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self.cursor().executemany(*args, **kwargs)
+
+    def commit(self):
+        return _timed(super().commit)
+
+
+def instrument_sqlite() -> None:
+    """
+    Every sqlite3.connect() in the process returns a counting connection,
+    including db.connection.get_connection, which looks sqlite3.connect up
+    on each call.
+    """
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        kwargs.setdefault("factory", CountingConnection)
+        return connect(*args, **kwargs)
+
+    sqlite3.connect = counting_connect
+
+
+# -----------------------------------------------------
+# Isolation
+# -----------------------------------------------------
+
+def isolate_storage(directory: str) -> None:
+    """
+    Points every file the pipeline writes at directory instead of the
+    app's db/ and cache/ paths.
+    """
+    from pathlib import Path
+
+    import agents.sql_agent
+    import db.connection
+    import db.init_db
+    import tools.nl2sql
+    import tools.profiler
+    import tools.result_export
+    import tools.result_store
+    import tools.sql_tool
+    from tools.blob_store import blob_store
+    from tools.chart_cache import chart_cache
+    from tools.history_store import history_store
+
+    root = Path(directory)
+    # Modules that imported DB_PATH hold their own reference
+    for module in (tools.sql_tool, agents.sql_agent, tools.nl2sql, tools.profiler):
+        module.DB_PATH = str(root / "analyst.db")
+    history_store.db_path = str(root / "history.db")
+    blob_store.blob_dir = root / "blobs"
+    chart_cache.cache_dir = root / "charts"
+    spill_dir = root / "results"
+    spill_dir.mkdir()
+    tools.result_store.RESULT_SPILL_DIR = tools.result_export.RESULT_SPILL_DIR = spill_dir
+
+    # db.connection (used by the db/init_db.py ingest script) binds the app's
+    # DB_PATH as a default argument, and its callers pass that path explicitly
+    app_db = Path(db.connection.DB_PATH)
+    isolated_db = root / "data.db"
+    get_connection = db.connection.get_connection
+
+    def isolated_connection(db_path=isolated_db):
+        return get_connection(isolated_db if Path(db_path) == app_db else db_path)
+
+    db.connection.DB_PATH = isolated_db
+    db.connection.get_connection = db.init_db.get_connection = isolated_connection
+
+
+def clear_caches() -> None:
+    """
+    Drops results cached by the previous level. pipeline_flight only holds
+    executions in flight, so it is empty once a level has finished.
+    """
+    from agents.base_agent import llm_cache
+    from tools.chart_cache import chart_cache
+    from tools.sql_tool import sql_result_cache
+
+    llm_cache.clear()
+    sql_result_cache.clear()
+    chart_cache.clear()
+
+
+# -----------------------------------------------------
+# Process memory
+# -----------------------------------------------------
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Peak, not current, where /proc is unavailable (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start = rss_bytes()
+        self.peak = self.start
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = rss_bytes()
+        self.peak = max(self.peak, self.end)
+
+
+# -----------------------------------------------------
+# Sessions
+# -----------------------------------------------------
+
+def make_csv(rows: int, seed: int) -> bytes:
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "date": (pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")).strftime("%Y-%m-%d"),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice([f"P{i:02d}" for i in range(30)], rows),
+        "quantity": rng.integers(1, 20, rows),
+        "sales": rng.lognormal(4, 0.8, rows).round(2),
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def run_session(orchestrator, session_index: int, questions: int, rows: int, think: float, record) -> None:
+    from tools.sql_tool import load_csv_to_db, fetch_sample_tool
+
+    session_id = f"load-{session_index}-{time.time_ns()}"
+    rng = random.Random(session_index)
+    csv = make_csv(rows, seed=session_index)
+
+    started = time.perf_counter()
+    ok = load_csv_to_db(io.BytesIO(csv))
+    record("upload", time.perf_counter() - started, ok)
+
+    started = time.perf_counter()
+    try:
+        result = orchestrator.run_discovery({"sql_result": fetch_sample_tool(20), "user_query": ""})
+        ok = not result.get("stage_errors")
+    except Exception:
+        ok = False
+    record("discovery", time.perf_counter() - started, ok)
+
+    for question in rng.sample(list(QUESTIONS), min(questions, len(QUESTIONS))):
+        if think:
+            time.sleep(think)
+        # Unique text: concurrent sessions must not share one pipeline run or LLM answer
+        question = f"{question} ({session_id})"
+        started = time.perf_counter()
+        try:
+            result = orchestrator.run(question, session_id=session_id, history=[], report=False)
+            ok = not result.get("sql_result", {}).get("error") and not result.get("stage_errors")
+        except Exception:
+            ok = False
+        record("ask", time.perf_counter() - started, ok)
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 3)
+
+
+def run_level(orchestrator, sessions: int, args) -> dict:
+    timings = {"upload": [], "discovery": [], "ask": []}
+    failures = {"upload": 0, "discovery": 0, "ask": 0}
+    lock = threading.Lock()
+
+    def record(op, elapsed, ok):
+        with lock:
+            timings[op].append(elapsed)
+            if not ok:
+                failures[op] += 1
+
+    sqlite_stats.reset()
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="load-session") as pool:
+            futures = [pool.submit(run_session, orchestrator, i, args.questions, args.rows, args.think, record)
+                       for i in range(sessions)]
+            for future in futures:
+                future.result()
+        wall = time.perf_counter() - started
+
+    ops = {
+        op: {"count": len(t), "failed": failures[op], "p50_s": percentile(t, 0.5), "p99_s": percentile(t, 0.99)}
+        for op, t in timings.items()
+    }
+    return {
+        "sessions": sessions,
+        "wall_s": round(wall, 3),
+        "questions_per_s": round(len(timings["ask"]) / wall, 3),
+        "sessions_per_min": round(sessions / wall * 60, 2),
+        "ops": ops,
+        "rss_mb": {"start": round(rss.start / 2**20, 1), "peak": round(rss.peak / 2**20, 1),
+                   "growth": round((rss.end - rss.start) / 2**20, 1)},
+        "sqlite": sqlite_stats.snapshot(),
+    }
+
+
+def print_curve(levels: list) -> None:
+    print(f"\n{'sessions':>8} {'q/s':>7} {'ask p50':>8} {'ask p99':>8} {'disc p99':>9} {'failed':>7} "
+          f"{'rss peak':>9} {'rss +':>7} {'locked':>7} {'lock s':>7}")
+    for level in levels:
+        ops = level["ops"]
+        failed = sum(o["failed"] for o in ops.values())
+        print(f"{level['sessions']:>8} {level['questions_per_s']:>7.2f} {ops['ask']['p50_s'] or 0:>8.2f} "
+              f"{ops['ask']['p99_s'] or 0:>8.2f} {ops['discovery']['p99_s'] or 0:>9.2f} {failed:>7} "
+              f"{level['rss_mb']['peak']:>9.1f} {level['rss_mb']['growth']:>+7.1f} "
+              f"{level['sqlite']['locked']:>7} {level['sqlite']['locked_wait_s']:>7.2f}")
+
+
+def print_comparison(baseline: dict, current: dict) -> None:
+    base = {level["sessions"]: level for level in baseline["levels"]}
+    print(f"\nvs {baseline['label']} ({baseline['started']}):")
+    print(f"{'sessions':>8} {'q/s':>16} {'ask p99':>16} {'locked':>12}")
+    for level in current["levels"]:
+        b = base.get(level["sessions"])
+        if b is None:
+            continue
+        print(f"{level['sessions']:>8} {b['questions_per_s']:>7.2f} -> {level['questions_per_s']:<5.2f} "
+              f"{b['ops']['ask']['p99_s'] or 0:>7.2f} -> {level['ops']['ask']['p99_s'] or 0:<5.2f} "
+              f"{b['sqlite']['locked']:>5} -> {level['sqlite']['locked']:<4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--questions", type=int, default=3, help="questions asked per session")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in each session's CSV")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between a session's questions")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="median stub LLM latency (s)")
+    parser.add_argument("--llm-rpm", type=float, default=None,
+                        help="LLM requests/min for the rate limiter (default: LLM_REQUESTS_PER_MINUTE)")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own log output")
+    args = parser.parse_args()
+
+    # Settings are read at import time
+    if args.llm_rpm is not None:
+        os.environ["LLM_REQUESTS_PER_MINUTE"] = str(args.llm_rpm)
+
+    instrument_sqlite()
+    workdir = tempfile.TemporaryDirectory(prefix="loadtest-")
+    isolate_storage(workdir.name)
+    from agents.base_agent import BaseAgent, llm_limiter
+    from config.settings import LOGS_DIR
+    from orchestrator.root_orchestrator import RootOrchestrator
+
+    stub = StubLLM(args.llm_latency)
+    BaseAgent._invoke_llm = lambda agent, template, llm_input: stub(agent, template, llm_input)
+    orchestrator = RootOrchestrator()
+    orchestrator.warm()
+
+    result = {
+        "label": args.label,
+        "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "verbose")},
+        "levels": [],
+    }
+    for sessions in [int(s) for s in args.sessions.split(",")]:
+        print(f"[LoadTest] {sessions} concurrent sessions...", file=sys.stderr)
+        clear_caches()
+        stdout = sys.stdout
+        if not args.verbose:
+            sys.stdout = open(os.devnull, "w")
+        try:
+            level = run_level(orchestrator, sessions, args)
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+        result["levels"].append(level)
+    result["llm"] = {"stub_calls": stub.calls, "limiter": llm_limiter.stats()}
+    workdir.cleanup()
+
+    print_curve(result["levels"])
+    out_dir = LOGS_DIR / "loadtest"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{args.label}.json"
+    out_path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"\nSaved {out_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Compares two profiled pipeline runs (see orchestrator.profiling).
+
+Prints the wall clock / LLM breakdown of both runs side by side, the
+functions whose CPU time changed most, and, when both runs traced memory,
+the allocation sites that changed most.
+
+Usage:
+    python benchmarks/profile_diff.py BASE_RUN NEW_RUN [--top N] [--sort tottime|cumtime]
+
+Runs are given as run ids (directories under logs/profiles/) or paths.
+"""
+import argparse
+import json
+import os
+import pstats
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PROFILE_DIR = os.path.join(ROOT_DIR, "logs", "profiles")
+
+
+def resolve(run: str) -> str:
+    path = run if os.path.isdir(run) else os.path.join(PROFILE_DIR, run)
+    if not os.path.isfile(os.path.join(path, "summary.json")):
+        raise SystemExit(f"No profile found for {run!r} (looked in {path})")
+    return path
+
+
+def load_json(path: str, name: str):
+    try:
+        with open(os.path.join(path, name), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_cpu(path: str):
+    """
+    {function label: (calls, tottime, cumtime)}, or None without a CPU profile.
+    """
+    file = os.path.join(path, "cpu.pstats")
+    if not os.path.isfile(file):
+        return None
+    stats = pstats.Stats(file).stats
+    functions = {}
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+        if filename.startswith(ROOT_DIR):
+            filename = os.path.relpath(filename, ROOT_DIR)
+        functions[f"{filename}:{line}({name})"] = (calls, tottime, cumtime)
+    return functions
+
+
+def print_summary(base: dict, new: dict) -> None:
+    print(f"{'':<28} {'base':>10} {'new':>10} {'change':>10}")
+    rows = [
+        ("wall clock (s)", base["wall_s"], new["wall_s"]),
+        ("LLM queued (s)", base["llm"]["wait_s"], new["llm"]["wait_s"]),
+        ("LLM calls (s)", base["llm"]["call_s"], new["llm"]["call_s"]),
+        ("LLM calls", base["llm"]["calls"], new["llm"]["calls"]),
+        ("LLM cache hits", base["llm"]["cache_hits"], new["llm"]["cache_hits"]),
+    ]
+    for name in dict.fromkeys(list(base["stages"]) + list(new["stages"])):
+        b = base["stages"].get(name, {})
+        n = new["stages"].get(name, {})
+        rows.append((f"{name} wall (s)", b.get("wall_s", 0.0), n.get("wall_s", 0.0)))
+        rows.append((f"{name} non-LLM (s)", b.get("other_s", 0.0), n.get("other_s", 0.0)))
+    for label, b, n in rows:
+        if isinstance(b, int) and isinstance(n, int):
+            print(f"{label:<28} {b:>10} {n:>10} {n - b:>+10}")
+        else:
+            print(f"{label:<28} {b:>10.3f} {n:>10.3f} {n - b:>+10.3f}")
+
+
+def print_cpu(base: dict, new: dict, sort: str, top: int) -> None:
+    index = 1 if sort == "tottime" else 2
+    changes = []
+    for name in set(base) | set(new):
+        b = base.get(name, (0, 0.0, 0.0))
+        n = new.get(name, (0, 0.0, 0.0))
+        changes.append((n[index] - b[index], b[index], n[index], b[0], n[0], name))
+    changes.sort(key=lambda c: abs(c[0]), reverse=True)
+
+    print(f"\nLargest {sort} changes:")
+    print(f"{'base s':>9} {'new s':>9} {'change':>9} {'calls':>15}  function")
+    for delta, b, n, b_calls, n_calls, name in changes[:top]:
+        print(f"{b:>9.3f} {n:>9.3f} {delta:>+9.3f} {f'{b_calls}->{n_calls}':>15}  {name}")
+
+
+def print_memory(base: dict, new: dict, top: int) -> None:
+    print(f"\nTraced memory: peak {base['peak_kb']:,.0f} KB -> {new['peak_kb']:,.0f} KB")
+    b_sites = {t["where"]: t["size_kb"] for t in base["top"]}
+    n_sites = {t["where"]: t["size_kb"] for t in new["top"]}
+    changes = sorted(
+        ((n_sites.get(w, 0.0) - b_sites.get(w, 0.0), w) for w in set(b_sites) | set(n_sites)),
+        key=lambda c: abs(c[0]), reverse=True,
+    )
+    print("Largest allocation changes (KB, among each run's top sites):")
+    for delta, where in changes[:top]:
+        print(f"{b_sites.get(where, 0.0):>12,.1f} {n_sites.get(where, 0.0):>12,.1f} {delta:>+12,.1f}  {where}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--top", type=int, default=20, help="functions / allocation sites to list")
+    parser.add_argument("--sort", choices=("tottime", "cumtime"), default="tottime")
+    args = parser.parse_args()
+
+    base_dir, new_dir = resolve(args.base), resolve(args.new)
+    base, new = load_json(base_dir, "summary.json"), load_json(new_dir, "summary.json")
+    print(f"base: {base['run_id']} ({base['kind']}) {base['label']}")
+    print(f"new:  {new['run_id']} ({new['kind']}) {new['label']}\n")
+    print_summary(base, new)
+
+    base_cpu, new_cpu = load_cpu(base_dir), load_cpu(new_dir)
+    if base_cpu is not None and new_cpu is not None:
+        print_cpu(base_cpu, new_cpu, args.sort, args.top)
+    else:
+        print("\n(no CPU profile in both runs)", file=sys.stderr)
+
+    base_mem, new_mem = load_json(base_dir, "memory.json"), load_json(new_dir, "memory.json")
+    if base_mem is not None and new_mem is not None:
+        print_memory(base_mem, new_mem, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,22 @@ SCHEMA_PATH = DB_DIR / "schema.json"
 REPORTS_DIR = ORCHESTRATOR_DIR / "reports"
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Reports are rendered off the interactive path by a bounded worker pool
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", 2))
+# Cached per-turn PDF fragments; least recently used ones are deleted past this
+REPORT_FRAGMENTS_MAX_BYTES = int(os.environ.get("REPORT_FRAGMENTS_MAX_BYTES", 256 * 1024 * 1024))
+
+# -----------------------------------------------------
+# SESSION HISTORY (SQLite; full turns on disk, summaries in memory)
+# -----------------------------------------------------
+HISTORY_DB_PATH = DB_DIR / "history.db"
+HISTORY_CACHE_SESSIONS = int(os.environ.get("HISTORY_CACHE_SESSIONS", 256))
+# Newest turns per session kept as plain JSON; older ones are zlib-compressed
+# (losslessly: nothing is dropped, they only cost a decompress to read)
+HISTORY_UNCOMPRESSED_TURNS = int(os.environ.get("HISTORY_UNCOMPRESSED_TURNS", 20))
+HISTORY_SUMMARY_CHARS = 300
+HISTORY_RETENTION_DAYS = float(os.environ.get("HISTORY_RETENTION_DAYS", 30))
+
 # -----------------------------------------------------
 # UI / TEMP STORAGE
 # -----------------------------------------------------
@@ -46,11 +62,146 @@ ASSETS_DIR.mkdir(parents=True, exist_ok=True)
 LOGS_DIR = BASE_DIR / "logs"
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Opt-in run profiling (orchestrator.profiling): "" off, "1"/"all", or
+# a comma-separated subset of "timing,cpu,memory"
+RUN_PROFILING = os.environ.get("RUN_PROFILING", "")
+RUN_PROFILE_DIR = LOGS_DIR / "profiles"
+RUN_PROFILE_TOP = 40           # functions / allocation sites kept in the text reports
+RUN_PROFILE_TRACE_FRAMES = 1   # tracemalloc frames per allocation
+
+# -----------------------------------------------------
+# PIPELINE SCHEDULING
+# -----------------------------------------------------
+# Seconds before a pipeline stage (LLM call, SQL, ...) is abandoned
+PIPELINE_STAGE_TIMEOUT = float(os.environ.get("PIPELINE_STAGE_TIMEOUT", 120))
+
+# Recommended questions are run in the background after discovery so a
+# click is served from the caches. Capped per session by count and time.
+SPECULATIVE_ENABLED = os.environ.get("SPECULATIVE_ENABLED", "1") == "1"
+SPECULATIVE_WORKERS = int(os.environ.get("SPECULATIVE_WORKERS", 1))
+SPECULATIVE_MAX_QUESTIONS = int(os.environ.get("SPECULATIVE_MAX_QUESTIONS", 3))
+SPECULATIVE_BUDGET_SECONDS = float(os.environ.get("SPECULATIVE_BUDGET_SECONDS", 90))
+
+# -----------------------------------------------------
+# LLM RATE LIMITING (process-wide, in front of every LLM call)
+# -----------------------------------------------------
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 60))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", 250000))
+# Adaptive in-flight limit: +1 per window of healthy calls, halved on 429s
+LLM_INITIAL_CONCURRENCY = int(os.environ.get("LLM_INITIAL_CONCURRENCY", 4))
+LLM_MIN_CONCURRENCY = int(os.environ.get("LLM_MIN_CONCURRENCY", 1))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+# Calls slower than this (seconds) also count as congestion
+LLM_TARGET_LATENCY = float(os.environ.get("LLM_TARGET_LATENCY", 20))
+
+# -----------------------------------------------------
+# HEADLESS HTTP API
+# -----------------------------------------------------
+API_WORKERS = int(os.environ.get("API_WORKERS", 4))          # concurrent pipeline runs
+API_MAX_PENDING = int(os.environ.get("API_MAX_PENDING", 16)) # running + queued before 503
+
 # -----------------------------------------------------
 # GENERAL APP SETTINGS
 # -----------------------------------------------------
 MAX_PREVIEW_ROWS = 50
 MAX_SQL_ROWS = 5000
+# LLM repair rounds for generated SQL that fails validation (EXPLAIN)
+SQL_REPAIR_ATTEMPTS = int(os.environ.get("SQL_REPAIR_ATTEMPTS", 2))
+# Template-based NL->SQL for simple questions; the LLM handles the rest
+NL2SQL_FAST_PATH = os.environ.get("NL2SQL_FAST_PATH", "1") == "1"
+NL2SQL_MIN_CONFIDENCE = float(os.environ.get("NL2SQL_MIN_CONFIDENCE", 0.85))
+
+# -----------------------------------------------------
+# APPROXIMATE QUERIES (stratified sample kept at ingest)
+# -----------------------------------------------------
+# Tables with fewer rows are always queried exactly (no sample is kept)
+SAMPLE_MIN_TABLE_ROWS = int(os.environ.get("SAMPLE_MIN_TABLE_ROWS", 200000))
+SAMPLE_ROWS = int(os.environ.get("SAMPLE_ROWS", 100000))
+SAMPLE_MIN_PER_STRATUM = 1000  # small groups are over-sampled (or kept whole)
+SAMPLE_MAX_STRATA = 50         # a text column with at most this many values stratifies the sample
+APPROX_CONFIDENCE_Z = 1.96     # error bounds are 95% confidence half-widths
+# Re-run approximate queries exactly in the background
+APPROX_REFINE = os.environ.get("APPROX_REFINE", "1") == "1"
+REFINE_WORKERS = int(os.environ.get("REFINE_WORKERS", 1))
+
+# -----------------------------------------------------
+# IN-MEMORY CACHES (shared by UI, API and batch runs)
+# -----------------------------------------------------
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", 512))                 # prompts
+SQL_RESULT_CACHE_SIZE = int(os.environ.get("SQL_RESULT_CACHE_SIZE", 128))   # queries
+SQL_RESULT_CACHE_MAX_ROWS = int(os.environ.get("SQL_RESULT_CACHE_MAX_ROWS", MAX_SQL_ROWS))
+
+# -----------------------------------------------------
+# CHART RENDERING
+# -----------------------------------------------------
+# Point budget per chart: larger results are reduced before plotting
+MAX_CHART_POINTS = int(os.environ.get("MAX_CHART_POINTS", 2000))
+# Bar/pie charts keep the top N categories and fold the rest into "Other"
+MAX_CHART_CATEGORIES = int(os.environ.get("MAX_CHART_CATEGORIES", 15))
+
+# Rendered charts are cached on disk, keyed by spec + data hash (LRU-evicted).
+# Entries are blob handles (the images live in the blob store), so this
+# bounds a small index rather than the images themselves.
+CACHE_DIR = BASE_DIR / "cache"
+CHART_CACHE_DIR = CACHE_DIR / "charts"
+CHART_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CHART_CACHE_MAX_BYTES = int(os.environ.get("CHART_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+
+# DPI of the raster thumbnails shown in the Streamlit grid
+CHART_THUMB_DPI = int(os.environ.get("CHART_THUMB_DPI", 60))
+
+# -----------------------------------------------------
+# FORECASTING (local engine; the LLM only narrates)
+# -----------------------------------------------------
+FORECAST_MIN_POINTS = 6        # fewer regular periods: no forecast
+FORECAST_MAX_POINTS = 2000     # most recent periods used per series
+FORECAST_MAX_SERIES = 20       # largest groups forecast when results are grouped
+
+# -----------------------------------------------------
+# INSIGHTS (local statistics; the LLM only phrases findings)
+# -----------------------------------------------------
+INSIGHT_MAX_FINDINGS = 6       # top-ranked findings passed to the LLM
+INSIGHT_MIN_CORRELATION = 0.5  # |r| below this is not reported
+INSIGHT_OUTLIER_Z = 3.0        # z-score beyond which a value outside the IQR fences is an outlier
+INSIGHT_MAX_GROUPS = 1000      # category columns with more values are not grouped by
+
+# -----------------------------------------------------
+# DATASET PROFILER (one streaming pass with sketches; feeds discovery)
+# -----------------------------------------------------
+PROFILE_WORKERS = int(os.environ.get("PROFILE_WORKERS", min(4, os.cpu_count() or 1)))  # row ranges scanned in parallel
+PROFILE_CHUNK_ROWS = int(os.environ.get("PROFILE_CHUNK_ROWS", 50000))   # rows fetched per batch
+PROFILE_HLL_PRECISION = 12     # 4096 registers, ~1.6% distinct-count error
+PROFILE_KLL_K = 400            # quantile sketch size, ~0.5% rank error
+PROFILE_TOP_VALUES = 50        # heavy-hitter counters per column
+
+# -----------------------------------------------------
+# QUERY RESULT MEMORY BUDGET
+# -----------------------------------------------------
+# Results larger than this are spilled to a temporary SQLite file and
+# handed out as a lazy, paged row sequence (tools.result_store)
+RESULT_MEMORY_MAX_BYTES = int(os.environ.get("RESULT_MEMORY_MAX_BYTES", 32 * 1024 * 1024))
+# Process-wide bytes of results held in memory (fetching, or kept in state/caches)
+RESULT_MEMORY_TOTAL_BYTES = int(os.environ.get("RESULT_MEMORY_TOTAL_BYTES", 256 * 1024 * 1024))
+RESULT_FETCH_ROWS = 10000      # rows per fetchmany() while sizing a result
+RESULT_PAGE_ROWS = 5000        # rows per page read back from a spill file
+# Spilled results are analyzed from a uniform sample of this many rows where
+# statistics don't need every row (correlations, outliers, scatter density)
+RESULT_SAMPLE_ROWS = int(os.environ.get("RESULT_SAMPLE_ROWS", 50000))
+RESULT_SPILL_DIR = CACHE_DIR / "results"
+RESULT_SPILL_DIR.mkdir(parents=True, exist_ok=True)
+RESULT_SPILL_MAX_AGE_S = 24 * 3600  # leftover spill files with no owning PID older than this are removed
+# Paged result table in the UI, and chunked CSV/Parquet export
+RESULT_VIEW_PAGE_SIZES = (50, 200, 1000)
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 10000))
+
+# -----------------------------------------------------
+# BLOB STORE (chart images referenced by handle from state)
+# -----------------------------------------------------
+BLOB_DIR = CACHE_DIR / "blobs"
+BLOB_DIR.mkdir(parents=True, exist_ok=True)
+BLOB_MEMORY_MAX_BYTES = int(os.environ.get("BLOB_MEMORY_MAX_BYTES", 32 * 1024 * 1024))
+# Least recently used blobs are deleted once the directory grows past this
+BLOB_DISK_MAX_BYTES = int(os.environ.get("BLOB_DISK_MAX_BYTES", 512 * 1024 * 1024))
 
 # Ensure core directories exist
 DATA_DIR.mkdir(exist_ok=True)
@@ -0,0 +1,142 @@
+"""
+Batch question mode.
+
+Runs every question in a JSONL file through the pipeline with a thread pool
+and writes one row per question to a columnar (Parquet) file. The schema,
+SQL result and LLM caches are process-wide, so repeated questions and shared
+prompts across the batch are only paid for once.
+
+Input lines are JSON objects: {"question": "...", "id": "optional"}
+
+Usage:
+    python -m orchestrator.batch questions.jsonl results.parquet [--csv data.csv] [--workers 4]
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+# Ensure root import visibility
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.settings import MAX_SQL_ROWS
+from orchestrator.service import get_orchestrator
+
+
+def read_questions(path: str) -> list:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("question"):
+                print(f"[Batch] Skipping line {line_no}: no 'question'.")
+                continue
+            questions.append({"id": str(item.get("id", line_no)), "question": item["question"]})
+    return questions
+
+
+def _run_one(orchestrator, item: dict) -> dict:
+    started = time.perf_counter()
+    try:
+        result = orchestrator.run(item["question"], history=[], report=False)
+        error = result.get("sql_result", {}).get("error")
+    except Exception as e:
+        result, error = {}, f"Pipeline failed: {e}"
+
+    sql_result = result.get("sql_result", {})
+    rows = sql_result.get("rows", [])
+    charts = result.get("chart_agent", {}).get("charts", [])
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "sql": result.get("sql_agent", {}).get("sql"),
+        "error": error,
+        "row_count": len(rows),
+        "columns": json.dumps(sql_result.get("columns", [])),
+        "rows": json.dumps([list(r) for r in rows[:MAX_SQL_ROWS]], default=str),
+        "insights": result.get("insight_agent", {}).get("insights"),
+        "forecast": result.get("forecast_agent", {}).get("forecast_text"),
+        "chart_handles": json.dumps([c.get("images", {}) for c in charts]),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_batch(questions: list, workers: int = 4) -> list:
+    """
+    Runs questions concurrently on the shared orchestrator; results keep
+    input order.
+    """
+    orchestrator = get_orchestrator(warm=False)
+    orchestrator.warm()
+
+    results = [None] * len(questions)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+        futures = {executor.submit(_run_one, orchestrator, q): i for i, q in enumerate(questions)}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            i = futures[future]
+            results[i] = future.result()
+            print(f"[Batch] {done}/{len(questions)} done ({questions[i]['id']}).")
+    return results
+
+
+def write_results(results: list, out_path: str) -> str:
+    """
+    Writes results as Parquet; falls back to CSV if pyarrow is unavailable.
+    Returns the path written.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(results)
+    try:
+        df.to_parquet(out_path, index=False)
+        return out_path
+    except ImportError:
+        fallback = os.path.splitext(out_path)[0] + ".csv"
+        print(f"[Batch] pyarrow not installed; writing CSV to {fallback}")
+        df.to_csv(fallback, index=False)
+        return fallback
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL file of questions")
+    parser.add_argument("output", help="output .parquet path")
+    parser.add_argument("--csv", help="load this CSV into the database before running")
+    parser.add_argument("--workers", type=int, default=4, help="questions run in parallel")
+    args = parser.parse_args()
+
+    if args.csv:
+        from tools.sql_tool import load_csv_to_db
+        if not load_csv_to_db(args.csv):
+            sys.exit(1)
+
+    questions = read_questions(args.questions)
+    started = time.perf_counter()
+    results = run_batch(questions, workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    path = write_results(results, args.output)
+    failed = sum(1 for r in results if r["error"])
+    print(f"[Batch] {len(results)} questions in {elapsed:.1f}s "
+          f"({len(results) / max(elapsed, 1e-9) * 3600:.0f}/hour), {failed} failed -> {path}")
+
+    from agents.base_agent import llm_cache, llm_limiter
+    from agents.sql_agent import schema_cache
+    from tools.sql_tool import sql_result_cache
+    for cache in (schema_cache, sql_result_cache, llm_cache):
+        print(f"[Batch] cache {cache.stats()}")
+    print(f"[Batch] llm limiter {llm_limiter.stats()}")
+
+    from orchestrator.root_orchestrator import pipeline_flight
+    from tools.sql_tool import sql_flight
+    for flight in (pipeline_flight, sql_flight):
+        print(f"[Batch] single-flight {flight.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import concurrent.futures
+import contextvars
+import threading
+import time
+from typing import Callable, Optional
+
+from tools.rate_limiter import current_cancel_token
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+SKIPPED = "skipped"
+CANCELLED = "cancelled"
+
+
+class StageError(Exception):
+    """
+    Raised by a stage to fail it while still publishing some updates
+    (e.g. the SQL tool reporting its error into sql_result).
+    """
+
+    def __init__(self, message: str, updates: Optional[dict] = None):
+        super().__init__(message)
+        self.updates = updates or {}
+
+
+class CancelToken:
+    """
+    Cancellation flag; a token with a parent is also cancelled with it.
+    """
+
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+
+class Stage:
+    """
+    One node of the pipeline graph.
+
+    fn(state) receives its own copy of the shared state (via the scheduler's
+    copy_state) and returns a dict of updates to merge back.
+    requires: stages that must finish successfully before this one starts.
+    after: stages that must merely finish (any outcome) before this one starts,
+           for steps like aggregation that work with partial results.
+    """
+
+    def __init__(self, name: str, fn: Callable[[dict], dict], requires=(), after=(),
+                 timeout: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.requires = tuple(requires)
+        self.after = tuple(after)
+        self.timeout = timeout
+
+
+class DagScheduler:
+    """
+    Runs a graph of stages on a thread pool, starting each stage as soon as
+    its inputs are ready. Stages past their timeout are abandoned (their
+    late result is discarded), their dependents are skipped and their own
+    cancel token is set, so LLM calls they still have queued are dropped;
+    cancelling the run's token stops scheduling and returns whatever has
+    finished.
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, stages: list, copy_state: Callable[[dict], dict] = dict,
+                 max_workers: Optional[int] = None):
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        for stage in stages:
+            unknown = [d for d in stage.requires + stage.after if d not in names]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+        self.stages = {s.name: s for s in stages}
+        self.copy_state = copy_state
+        self.max_workers = max_workers or len(stages)
+
+    def _ready(self, stage: Stage, status: dict) -> Optional[str]:
+        """
+        Returns RUNNING if the stage can start, SKIPPED if it never can,
+        or None if it must keep waiting.
+        """
+        for dep in stage.requires:
+            if status[dep] in (FAILED, TIMEOUT, SKIPPED, CANCELLED):
+                return SKIPPED
+            if status[dep] != DONE:
+                return None
+        for dep in stage.after:
+            if status[dep] in (PENDING, RUNNING):
+                return None
+        return RUNNING
+
+    def run(self, shared_state: dict, cancel_token: Optional[CancelToken] = None,
+            on_stage_done: Optional[Callable[[str, str, dict], None]] = None) -> dict:
+        """
+        Executes the graph, merging stage updates into shared_state.
+        Per-stage outcomes are recorded in shared_state["stage_status"].
+        """
+        status = {name: PENDING for name in self.stages}
+        errors = {}
+        running = {}   # future -> (stage, deadline, stage token)
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="dag-stage"
+        )
+
+        def finish(name: str, outcome: str, updates: Optional[dict] = None):
+            status[name] = outcome
+            if updates:
+                shared_state.update(updates)
+            if on_stage_done is not None:
+                try:
+                    on_stage_done(name, outcome, updates or {})
+                except Exception as e:
+                    print(f"[DagScheduler] on_stage_done failed for {name}: {e}")
+
+        try:
+            while True:
+                if cancel_token is not None and cancel_token.cancelled:
+                    for name, state in status.items():
+                        if state in (PENDING, RUNNING):
+                            status[name] = CANCELLED
+                    shared_state["cancelled"] = True
+                    print("[DagScheduler] Run cancelled.")
+                    break
+
+                # Start everything whose inputs are ready
+                progressed = False
+                for name, stage in self.stages.items():
+                    if status[name] != PENDING:
+                        continue
+                    readiness = self._ready(stage, status)
+                    if readiness is not None:
+                        progressed = True
+                    if readiness == SKIPPED:
+                        finish(name, SKIPPED)
+                    elif readiness == RUNNING:
+                        status[name] = RUNNING
+                        # Stages inherit the caller's context (e.g. LLM priority), with
+                        # a cancel token of their own under the run's
+                        context = contextvars.copy_context()
+                        stage_token = CancelToken(parent=context.run(current_cancel_token.get) or cancel_token)
+                        context.run(current_cancel_token.set, stage_token)
+                        future = executor.submit(context.run, stage.fn, self.copy_state(shared_state))
+                        deadline = time.monotonic() + stage.timeout if stage.timeout else None
+                        running[future] = (stage, deadline, stage_token)
+
+                if not running:
+                    # Skips can unblock further stages; loop until nothing changes
+                    if progressed and any(s == PENDING for s in status.values()):
+                        continue
+                    for name, state in status.items():
+                        if state == PENDING:
+                            # Only reachable through a dependency cycle
+                            status[name] = SKIPPED
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    running, timeout=self.POLL_INTERVAL, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    stage, _, _ = running.pop(future)
+                    try:
+                        finish(stage.name, DONE, future.result())
+                    except StageError as e:
+                        errors[stage.name] = str(e)
+                        finish(stage.name, FAILED, e.updates)
+                    except Exception as e:
+                        print(f"[DagScheduler] Stage {stage.name} failed: {e}")
+                        errors[stage.name] = str(e)
+                        finish(stage.name, FAILED)
+
+                now = time.monotonic()
+                for future, (stage, deadline, stage_token) in list(running.items()):
+                    if deadline is not None and now > deadline:
+                        print(f"[DagScheduler] Stage {stage.name} timed out after {stage.timeout}s.")
+                        running.pop(future)
+                        stage_token.cancel()
+                        errors[stage.name] = f"Timed out after {stage.timeout}s"
+                        finish(stage.name, TIMEOUT)
+        finally:
+            # Abandoned (timed-out/cancelled) stages finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        shared_state["stage_status"] = dict(status)
+        if errors:
+            shared_state["stage_errors"] = errors
+        return shared_state
@@ -0,0 +1,126 @@
+import concurrent.futures
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+from config.settings import REPORT_WORKERS, REFINE_WORKERS
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Bounded background worker pool with job ids and status polling.
+    Jobs submitted with the same dedupe_key while a previous one is queued,
+    running or done share that job instead of doing the work twice. Jobs
+    with the same serial_key run one at a time, in submission order; later
+    ones wait outside the pool, so they don't hold up other keys.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_finished: int = 256):
+        self.name = name
+        self.max_finished = max_finished
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-job"
+        )
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._serial = {}   # serial_key -> deque of jobs waiting for the running one
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, dedupe_key: Optional[str] = None,
+               serial_key: Optional[str] = None, **kwargs) -> str:
+        with self._lock:
+            if dedupe_key is not None:
+                existing = self._by_key.get(dedupe_key)
+                if existing and self._jobs.get(existing, {}).get("status") != FAILED:
+                    return existing
+
+            job_id = uuid.uuid4().hex[:12]
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "result": None,
+                "error": None,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "dedupe_key": dedupe_key,
+            }
+            if dedupe_key is not None:
+                self._by_key[dedupe_key] = job_id
+            self._prune()
+            self._jobs[job_id]["future"] = concurrent.futures.Future()
+            start = lambda: self._executor.submit(self._run, job_id, fn, args, kwargs, serial_key)
+            if serial_key is None:
+                start()
+            elif serial_key in self._serial:
+                self._serial[serial_key].append(start)
+            else:
+                self._serial[serial_key] = deque()
+                start()
+
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args: tuple, kwargs: dict, serial_key: Optional[str] = None):
+        job = self._jobs[job_id]
+        job["status"] = RUNNING
+        try:
+            job["result"] = fn(*args, **kwargs)
+            job["status"] = DONE
+        except Exception as e:
+            print(f"[JobQueue:{self.name}] Job {job_id} failed: {e}")
+            job["error"] = str(e)
+            job["status"] = FAILED
+        finally:
+            job["finished_at"] = time.time()
+            if serial_key is not None:
+                self._start_next(serial_key)
+            job["future"].set_result(job["result"])
+        return job["result"]
+
+    def _start_next(self, serial_key: str) -> None:
+        with self._lock:
+            waiting = self._serial[serial_key]
+            if waiting:
+                waiting.popleft()()
+            else:
+                del self._serial[serial_key]
+
+    def _prune(self) -> None:
+        """
+        Drops the oldest finished jobs beyond max_finished (caller holds the lock).
+        """
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in (DONE, FAILED)]
+        for jid in finished[:max(len(finished) - self.max_finished, 0)]:
+            job = self._jobs.pop(jid)
+            if self._by_key.get(job["dedupe_key"]) == jid:
+                del self._by_key[job["dedupe_key"]]
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """
+        Public view of a job (without the future), or None if unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "future"}
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            job["future"].result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            pass
+        return self.status(job_id)
+
+
+report_jobs = JobQueue("reports", max_workers=REPORT_WORKERS)
+# Exact re-runs of queries first answered from the sample (approximate mode)
+refine_jobs = JobQueue("refine", max_workers=REFINE_WORKERS)
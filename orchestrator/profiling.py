@@ -0,0 +1,265 @@
+"""
+Opt-in profiling of pipeline runs (RootOrchestrator.run / run_discovery).
+
+Enabled for every run with the RUN_PROFILING environment variable, or per
+call with run(..., profile=...). The value is a comma-separated list of
+modes, or "1"/"all" for every mode:
+
+    timing  wall clock per stage vs time queued for and inside LLM calls
+    cpu     cProfile of the calling thread and of every stage thread, merged
+    memory  tracemalloc: top allocations made during the run
+
+Artifacts are written to LOGS_DIR/profiles/<run_id>/ (summary.json,
+cpu.pstats + cpu.txt, memory.json + memory.txt); compare two runs with
+benchmarks/profile_diff.py. The active profile travels in a context
+variable, which the DAG scheduler propagates into stage threads.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from config.settings import RUN_PROFILING, RUN_PROFILE_DIR, RUN_PROFILE_TOP, RUN_PROFILE_TRACE_FRAMES
+
+MODES = ("timing", "cpu", "memory")
+
+current_profile = contextvars.ContextVar("current_profile", default=None)
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+# tracemalloc is process-wide; concurrent profiled runs share one session
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def parse_modes(value) -> tuple:
+    """
+    Profiling modes from a flag or mode list; () means profiling is off.
+    Timing is always collected when anything is on.
+    """
+    if value is None or value is False:
+        return ()
+    if value is True:
+        return MODES
+    text = str(value).strip().lower()
+    if text in ("", "0", "false", "off", "no"):
+        return ()
+    if text in ("1", "true", "on", "yes", "all"):
+        return MODES
+    requested = {m.strip() for m in text.split(",")}
+    unknown = requested - set(MODES)
+    if unknown:
+        raise ValueError(f"Unknown profiling modes {sorted(unknown)}; expected {list(MODES)}")
+    return tuple(m for m in MODES if m in requested or m == "timing")
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # The profilers' own bookkeeping is not part of the run
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)
+    ])
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(RUN_PROFILE_TRACE_FRAMES)
+            _tracing_owned = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+class RunProfile:
+    """
+    Measurements of one pipeline run. Stage functions are wrapped with
+    wrap(); BaseAgent.run_llm reports its LLM timings with record_llm().
+    """
+
+    def __init__(self, kind: str, label: str, modes: tuple):
+        self.kind = kind
+        self.label = label
+        self.modes = modes
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:6]}"
+        self.dir = RUN_PROFILE_DIR / self.run_id
+        self.stages = {}
+        self.llm = {"calls": 0, "cache_hits": 0, "wait_s": 0.0, "call_s": 0.0}
+        self._profilers = []
+        self._lock = threading.Lock()
+        self._main_profiler = None
+        self._baseline = None
+        self._started = None
+        self.wall_s = None
+
+    def _new_profiler(self) -> Optional[cProfile.Profile]:
+        # A thread can only have one active profiler
+        if "cpu" not in self.modes or sys.getprofile() is not None:
+            return None
+        return cProfile.Profile()
+
+    def _keep(self, profiler: Optional[cProfile.Profile]) -> None:
+        # Only stopped profilers are merged: a timed-out stage may still be running
+        if profiler is not None:
+            profiler.disable()
+            with self._lock:
+                self._profilers.append(profiler)
+
+    def _stage(self, name: str) -> dict:
+        # Caller holds the lock
+        return self.stages.setdefault(name, {"wall_s": 0.0, "llm_wait_s": 0.0, "llm_call_s": 0.0, "llm_calls": 0})
+
+    def wrap(self, name: str, fn):
+        """
+        Stage function that is timed (and cProfiled in its own thread).
+        """
+        def profiled(state):
+            token = _current_stage.set(name)
+            profiler = self._new_profiler()
+            started = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            try:
+                return fn(state)
+            finally:
+                self._keep(profiler)
+                with self._lock:
+                    self._stage(name)["wall_s"] += time.perf_counter() - started
+                _current_stage.reset(token)
+        return profiled
+
+    def record_llm(self, wait_s: float, call_s: float) -> None:
+        """
+        One LLM call: time queued for a rate limiter slot, then inside the call.
+        """
+        stage = _current_stage.get()
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["wait_s"] += wait_s
+            self.llm["call_s"] += call_s
+            if stage is not None:
+                timings = self._stage(stage)
+                timings["llm_calls"] += 1
+                timings["llm_wait_s"] += wait_s
+                timings["llm_call_s"] += call_s
+
+    def record_llm_cache_hit(self) -> None:
+        with self._lock:
+            self.llm["cache_hits"] += 1
+
+    def start(self) -> None:
+        if "memory" in self.modes:
+            _start_tracing()
+            self._baseline = _snapshot()
+        self._main_profiler = self._new_profiler()
+        self._started = time.perf_counter()
+        if self._main_profiler is not None:
+            self._main_profiler.enable()
+
+    def stop(self) -> None:
+        self._keep(self._main_profiler)
+        self.wall_s = time.perf_counter() - self._started
+        try:
+            self._save()
+        except OSError as e:
+            print(f"[Profiling] Could not write artifacts for {self.run_id}: {e}")
+        finally:
+            if "memory" in self.modes:
+                _stop_tracing()
+
+    def summary(self) -> dict:
+        """
+        JSON-safe timing breakdown; llm_* times are summed over concurrent
+        stages, so they can exceed the wall clock.
+        """
+        rounded = lambda d: {k: round(v, 4) if isinstance(v, float) else v for k, v in d.items()}
+        stages = {}
+        for name, t in self.stages.items():
+            stages[name] = rounded({**t, "other_s": max(0.0, t["wall_s"] - t["llm_wait_s"] - t["llm_call_s"])})
+        return {
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "label": self.label,
+            "modes": list(self.modes),
+            "dir": str(self.dir),
+            "wall_s": round(self.wall_s or 0.0, 4),
+            "llm": rounded(self.llm),
+            "stages": stages,
+        }
+
+    def _save(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            profilers = list(self._profilers)
+        if profilers:
+            stats = pstats.Stats(*profilers)
+            stats.dump_stats(str(self.dir / "cpu.pstats"))
+            text = io.StringIO()
+            pstats.Stats(str(self.dir / "cpu.pstats"), stream=text).sort_stats("cumulative").print_stats(RUN_PROFILE_TOP)
+            (self.dir / "cpu.txt").write_text(text.getvalue(), encoding="utf-8")
+
+        if self._baseline is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            diff = _snapshot().compare_to(self._baseline, "lineno")
+            top = [
+                {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                 "size_kb": round(s.size_diff / 1024, 1), "count": s.count_diff}
+                for s in sorted(diff, key=lambda s: s.size_diff, reverse=True)[:RUN_PROFILE_TOP]
+            ]
+            memory = {"traced_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1), "top": top}
+            (self.dir / "memory.json").write_text(json.dumps(memory, indent=2), encoding="utf-8")
+            lines = [f"Traced {memory['traced_kb']:,} KB, peak {memory['peak_kb']:,} KB (process-wide)",
+                     "Top allocations during the run:"]
+            lines += [f"{t['size_kb']:>12,.1f} KB {t['count']:>8} blocks  {t['where']}" for t in top]
+            (self.dir / "memory.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        (self.dir / "summary.json").write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+
+
+@contextmanager
+def profile_run(kind: str, label: str = "", profile=None):
+    """
+    Profiles the enclosed run if `profile` (or, when None, RUN_PROFILING)
+    enables it; yields the RunProfile or None.
+    """
+    modes = parse_modes(RUN_PROFILING if profile is None else profile)
+    if not modes:
+        yield None
+        return
+    run_profile = RunProfile(kind, label, modes)
+    token = current_profile.set(run_profile)
+    run_profile.start()
+    try:
+        yield run_profile
+    finally:
+        current_profile.reset(token)
+        run_profile.stop()
+        print(f"[Profiling] {kind} run {run_profile.run_id}: {run_profile.wall_s:.2f}s, "
+              f"LLM wait {run_profile.llm['wait_s']:.2f}s + calls {run_profile.llm['call_s']:.2f}s "
+              f"-> {run_profile.dir}")
+
+
+def profile_stages(stages: list) -> list:
+    """
+    Wraps the stages' functions for the active profile, if any.
+    """
+    run_profile = current_profile.get()
+    if run_profile is not None:
+        for stage in stages:
+            stage.fn = run_profile.wrap(stage.name, stage.fn)
+    return stages
@@ -1,98 +1,334 @@
-import concurrent.futures
 import copy
 import sys
+import threading
 import os
 
 # Ensure root import visibility
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from agents.base_agent import llm_limiter
 from agents.sql_agent import SQLAgent
 from agents.chart_agent import ChartAgent
 from agents.insight_agent import InsightAgent
 from agents.forecast_agent import ForecastAgent
 from agents.aggregator_agent import AggregatorAgent
 from agents.report_agent import ReportAgent
-from tools.sql_tool import run_sql_tool
+from tools.sql_tool import run_sql_tool, run_exact_sql, data_version, EXACT, APPROXIMATE
+from config.settings import PIPELINE_STAGE_TIMEOUT, APPROX_REFINE
+from orchestrator.dag import DagScheduler, Stage, StageError, CancelToken, DONE
+from orchestrator.jobs import refine_jobs
+from orchestrator.profiling import profile_run, profile_stages
+from orchestrator.speculative import normalize_question
+from tools.rate_limiter import request_context, as_run_priority, RunPriority, INTERACTIVE, DISCOVERY
+from tools.single_flight import SingleFlight
+
+# Shared by every orchestrator in the process; keyed by (question, data version, mode)
+pipeline_flight = SingleFlight("pipeline")
 
 class RootOrchestrator:
+    """
+    Agents are constructed on first use: building them imports the ADK /
+    genai stack, which dominates cold start. warm() builds them up front.
+    """
+    _agent_factories = {
+        "sql_agent": SQLAgent,
+        "chart_agent": ChartAgent,
+        "insight_agent": InsightAgent,
+        "forecast_agent": ForecastAgent,
+        "aggregator_agent": AggregatorAgent,
+        "report_agent": ReportAgent,
+    }
+
     def __init__(self):
-        self.sql_agent = SQLAgent()
-        self.chart_agent = ChartAgent()
-        self.insight_agent = InsightAgent()
-        self.forecast_agent = ForecastAgent()
-        self.aggregator_agent = AggregatorAgent()
-        self.report_agent = ReportAgent()
+        self._agents = {}
+        self._agents_lock = threading.Lock()
+        self._active_runs = {}
+        self._runs_lock = threading.Lock()
 
-    def _run_parallel_agents(self, shared_state):
+    def __getattr__(self, name):
+        factory = type(self)._agent_factories.get(name)
+        if factory is None:
+            raise AttributeError(name)
+        with self._agents_lock:
+            if name not in self._agents:
+                self._agents[name] = factory()
+            return self._agents[name]
+
+    def warm(self):
         """
-        Runs Chart, Insight, and Forecast agents sequentially to avoid asyncio conflicts.
+        Builds every agent and pre-imports the modules the first request
+        would otherwise pay for (chart and report tooling). Safe to call repeatedly.
         """
-        agents = [self.chart_agent, self.insight_agent, self.forecast_agent]
-        updated_state = {}
+        for name in self._agent_factories:
+            getattr(self, name)
+        import tools.chart_tool
+        import tools.pdf_tool
+        print("[RootOrchestrator] Warmed.")
 
-        for agent in agents:
-            try:
-                # Deepcopy to prevent state pollution
-                res = agent.run(copy.deepcopy(shared_state))
-                for k, v in res.items():
-                    if k.endswith("_agent"):
-                        updated_state[k] = v
-            except Exception as e:
-                print(f"Agent {agent.name} failed: {e}")
+    def _agent_stage(self, agent_name: str):
+        """
+        Wraps an analysis agent as a DAG stage returning only its *_agent keys.
+        """
+        def fn(state):
+            res = getattr(self, agent_name).run(state)
+            return {k: v for k, v in res.items() if k.endswith("_agent")}
+        return fn
+
+    def _sql_agent_stage(self, state):
+        state = self.sql_agent.run(state)
+        return {"sql_agent": state.get("sql_agent", {})}
+
+    def _sql_tool_stage(self, state):
+        sql_result = run_sql_tool(state)["sql_result"]
+        if sql_result.get("error"):
+            print("SQL Execution failed. Stopping pipeline.")
+            raise StageError(f"SQL execution failed: {sql_result['error']}", {"sql_result": sql_result})
+        if sql_result.get("approximate") and APPROX_REFINE:
+            # Exact answer in the background; poll orchestrator.jobs.refine_jobs with the job id
+            sql = state["sql_agent"]["sql"]
+            sql_result["approximate"]["refine_job"] = refine_jobs.submit(
+                run_exact_sql, sql, dedupe_key=f"{data_version()}:{sql}"
+            )
+        return {"sql_result": sql_result}
+
+    def _aggregate_stage(self, state):
+        state = self.aggregator_agent.run(state)
+        return {k: state[k] for k in ("chart_agent", "insight_agent", "forecast_agent")}
+
+    def _start_run(self, session_id):
+        """
+        Registers a cancel token for this run. A new run for the same session
+        cancels the one still in flight (the user moved on to a new question).
+        """
+        token = CancelToken()
+        if session_id:
+            with self._runs_lock:
+                previous = self._active_runs.get(session_id)
+                if previous is not None:
+                    print(f"[RootOrchestrator] Cancelling previous run for session {session_id}.")
+                    previous.cancel()
+                self._active_runs[session_id] = token
+        return token
 
-        return updated_state
+    def _end_run(self, session_id, token):
+        if session_id:
+            with self._runs_lock:
+                if self._active_runs.get(session_id) is token:
+                    del self._active_runs[session_id]
 
-    def run_discovery(self, shared_state: dict):
+    def cancel(self, session_id: str) -> bool:
         """
-        Runs agents in discovery mode sequentially.
+        Cancels the in-flight run for a session, if any.
+        """
+        with self._runs_lock:
+            token = self._active_runs.get(session_id)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def run_discovery(self, shared_state: dict, profile=None):
+        """
+        Profiles the table, then runs Chart and Insight agents in discovery
+        mode, in parallel.
+        Concurrent discovery runs on the same data share one execution.
+        profile enables run profiling (see orchestrator.profiling); None
+        follows RUN_PROFILING.
         """
         print("--- Discovery Mode Start ---")
         shared_state["discovery_mode"] = True
-        
-        # Run Chart and Insight agents sequentially
-        agents = [self.chart_agent, self.insight_agent]
-        updated_state = {}
 
-        for agent in agents:
-            try:
-                res = agent.run(copy.deepcopy(shared_state))
-                for k, v in res.items():
-                    if k.endswith("_agent"):
-                        updated_state[k] = v
-            except Exception as e:
-                print(f"Discovery Agent {agent.name} failed: {e}")
-
-        shared_state.update(updated_state)
+        def discover():
+            # One streaming pass over the whole table, not just the sample rows
+            if shared_state.get("profile") is None:
+                # numpy/pandas are only loaded once discovery runs
+                from tools.profiler import profile_table
+
+                shared_state["profile"] = profile_table()
+            scheduler = DagScheduler(profile_stages([
+                Stage("chart_agent", self._agent_stage("chart_agent"), timeout=PIPELINE_STAGE_TIMEOUT),
+                Stage("insight_agent", self._agent_stage("insight_agent"), timeout=PIPELINE_STAGE_TIMEOUT),
+            ]), copy_state=copy.deepcopy)
+            with request_context(DISCOVERY):
+                return scheduler.run(shared_state)
+
+        with profile_run("discovery", profile=profile) as run_profile:
+            if run_profile is not None:
+                # A profile measures this run's own execution, not a shared one
+                shared_state = discover()
+            else:
+                result, shared = pipeline_flight.do(("", data_version(), "discovery"), discover)
+                shared_state = copy.deepcopy(result) if shared else result
+        if run_profile is not None:
+            shared_state["run_profile"] = run_profile.summary()
+
         print("--- Discovery Mode End ---")
         return shared_state
 
-    def run(self, user_query: str, history: list = []):
+    def _emit(self, on_progress, stage: str, **payload):
+        """
+        Reports a finished pipeline stage to an optional progress callback
+        (used by the HTTP API to stream results). Callback errors are ignored.
+        """
+        if on_progress is None:
+            return
+        try:
+            on_progress({"stage": stage, **payload})
+        except Exception as e:
+            print(f"[RootOrchestrator] Progress callback failed: {e}")
+
+    def _pipeline_stages(self) -> list:
+        """
+        The question pipeline as a dependency graph:
+
+            sql_agent -> sql_tool -> chart_agent    -> aggregator
+                                  -> insight_agent  ->
+                                  -> forecast_agent ->
+
+        The three analysis agents start together as soon as rows exist, so
+        e.g. chart rendering overlaps with the other agents' LLM calls. The
+        aggregator waits for all three but tolerates their failure.
+        """
+        analysis = ("chart_agent", "insight_agent", "forecast_agent")
+        stages = [
+            Stage("sql_agent", self._sql_agent_stage, timeout=PIPELINE_STAGE_TIMEOUT),
+            Stage("sql_tool", self._sql_tool_stage, requires=["sql_agent"], timeout=PIPELINE_STAGE_TIMEOUT),
+        ]
+        stages += [
+            Stage(name, self._agent_stage(name), requires=["sql_tool"], timeout=PIPELINE_STAGE_TIMEOUT)
+            for name in analysis
+        ]
+        stages.append(Stage("aggregator", self._aggregate_stage, requires=["sql_tool"], after=analysis))
+        return stages
+
+    def _analyze(self, user_query: str, token: CancelToken, priority: RunPriority, on_stage_done,
+                 approximate: bool = False) -> dict:
+        """
+        Runs the stage graph for one question. The result depends only on the
+        question and the data (history is not read by the analysis agents),
+        which is what makes it shareable between callers.
+        """
+        shared_state = {
+            "user_query": user_query,
+            "discovery_mode": False,
+            "sql_mode": APPROXIMATE if approximate else EXACT,
+        }
+        scheduler = DagScheduler(profile_stages(self._pipeline_stages()), copy_state=copy.deepcopy)
+        with request_context(priority, token):
+            shared_state = scheduler.run(shared_state, cancel_token=token, on_stage_done=on_stage_done)
+        self._report_sql_failure(shared_state)
+        return shared_state
+
+    def _report_sql_failure(self, shared_state: dict) -> None:
+        """
+        When the SQL stage never finished (sql_agent failed or timed out, or
+        the run was cancelled), records why in sql_result["error"], so callers
+        do not mistake the missing result for an empty one.
+        """
+        status = shared_state.get("stage_status", {})
+        if status.get("sql_tool") == DONE or shared_state.get("sql_result", {}).get("error"):
+            return
+        errors = shared_state.get("stage_errors", {})
+        if "sql_tool" in errors:
+            error = errors["sql_tool"]
+        elif "sql_agent" in errors:
+            error = f"SQL generation failed: {errors['sql_agent']}"
+        elif shared_state.get("cancelled"):
+            error = "Run cancelled before the query finished."
+        else:
+            error = f"SQL stage {status.get('sql_tool', 'did not run')}."
+        shared_state["sql_result"] = {"columns": [], "rows": [], "error": error}
+
+    def _replay_progress(self, shared_state: dict, on_stage_done) -> None:
+        """
+        Emits per-stage progress from a finished result, for callers that
+        joined another caller's execution and saw none of its events.
+        """
+        for name, outcome in shared_state.get("stage_status", {}).items():
+            if name == "sql_tool":
+                updates = {"sql_result": shared_state.get("sql_result", {})}
+            elif name in shared_state:
+                updates = {name: shared_state[name]}
+            else:
+                updates = {}
+            on_stage_done(name, outcome, updates)
+
+    def run(self, user_query: str, history: list = None, session_id: str = None, on_progress=None,
+            report: bool = True, cancel_token: CancelToken = None, priority=INTERACTIVE,
+            approximate: bool = False, profile=None):
+        """
+        Answers one question. Pass cancel_token to control cancellation from
+        outside (background work); otherwise the run is registered under
+        session_id and superseded by that session's next question.
+        priority is the LLM rate limiter class for this run's calls (a name,
+        or a RunPriority the caller may raise while the run is in flight).
+        history is only used by the report; when omitted, the report reads
+        the session's turns from tools.history_store.
+
+        Identical questions (normalized) on the same data that are in flight
+        at the same time share one pipeline execution; each caller still
+        gets its own copy of the result and its own report. A caller that
+        joins an execution of lower priority (an interactive question
+        matching a speculative precompute) raises it to its own.
+
+        With approximate=True, aggregate queries are answered from the
+        stratified sample (sql_result["approximate"] carries the error
+        bounds) and the exact result is computed by a background refine job.
+        """
         print("--- Pipeline Start ---")
-        shared_state = {"user_query": user_query, "discovery_mode": False, "history": history}
-
-        # 1. SQL
-        print("Running SQLAgent...")
-        shared_state = self.sql_agent.run(shared_state)
-        
-        print("Running SQL Tool...")
-        shared_state = run_sql_tool(shared_state)
-        
-        if shared_state.get("sql_result", {}).get("error"):
-            print("SQL Execution failed. Stopping pipeline.")
-            return shared_state
 
-        # 2. Parallel Analysis
-        print("Running Parallel Agents...")
-        p_results = self._run_parallel_agents(shared_state)
-        shared_state.update(p_results)
+        def on_stage_done(name, outcome, updates):
+            payload = dict(updates)
+            sql_result = payload.pop("sql_result", None)
+            if sql_result is not None:
+                payload["row_count"] = len(sql_result.get("rows", []))
+                payload["error"] = sql_result.get("error")
+            if "sql_agent" in payload:
+                payload["sql"] = payload.pop("sql_agent").get("sql")
+            self._emit(on_progress, name, status=outcome, **payload)
 
-        # 3. Aggregate
-        print("Running AggregatorAgent...")
-        shared_state = self.aggregator_agent.run(shared_state)
+        run_priority = as_run_priority(priority)
 
-        # 4. Report
-        print("Running ReportAgent...")
-        shared_state = self.report_agent.run(shared_state)
+        def analyze():
+            executed.append(True)
+            return self._analyze(user_query, token, run_priority, on_stage_done, approximate)
+
+        def escalate(leader_priority: RunPriority):
+            if leader_priority.raise_to(run_priority.value):
+                print(f"[RootOrchestrator] Joined run raised to {run_priority.value} priority.")
+                llm_limiter.reprioritize()
+
+        with profile_run("ask", user_query, profile) as run_profile:
+            token = cancel_token or self._start_run(session_id)
+            try:
+                while True:
+                    executed = []
+                    if run_profile is not None:
+                        result, shared = analyze(), False
+                    else:
+                        key = (normalize_question(user_query), data_version(), "ask-approx" if approximate else "ask")
+                        result, shared = pipeline_flight.do(key, analyze, context=run_priority, on_join=escalate)
+                    # The execution we joined was cancelled by its owner, not by us: run again
+                    if not executed and result.get("cancelled") and not token.cancelled:
+                        continue
+                    break
+            finally:
+                if cancel_token is None:
+                    self._end_run(session_id, token)
+
+        # Other callers hold the same result object
+        shared_state = copy.deepcopy(result) if shared else result
+        if not executed:
+            self._emit(on_progress, "coalesced", status=DONE)
+            self._replay_progress(shared_state, on_stage_done)
+        shared_state.update({"user_query": user_query, "history": history, "session_id": session_id})
+        if run_profile is not None:
+            shared_state["run_profile"] = run_profile.summary()
+
+        if report and shared_state.get("stage_status", {}).get("aggregator") == DONE:
+            # Background; poll orchestrator.jobs.report_jobs with the job id
+            shared_state["report_job"] = self.report_agent.submit(shared_state)
+            self._emit(on_progress, "report", status=DONE, report_job=shared_state["report_job"])
 
         print("--- Pipeline End ---")
-        return shared_state
\ No newline at end of file
+        return shared_state
@@ -0,0 +1,31 @@
+import threading
+
+from orchestrator.root_orchestrator import RootOrchestrator
+
+_orchestrator = None
+_lock = threading.Lock()
+
+
+def get_orchestrator(warm: bool = True) -> RootOrchestrator:
+    """
+    Returns the process-wide RootOrchestrator, creating it on first call.
+    The orchestrator holds no per-request state (each run gets its own
+    shared_state), so one instance is shared across sessions and threads.
+    Warm-up runs in a background thread so it never blocks the caller.
+    """
+    global _orchestrator
+    if _orchestrator is None:
+        with _lock:
+            if _orchestrator is None:
+                orchestrator = RootOrchestrator()
+                if warm:
+                    threading.Thread(target=_warm, args=(orchestrator,), daemon=True).start()
+                _orchestrator = orchestrator
+    return _orchestrator
+
+
+def _warm(orchestrator: RootOrchestrator) -> None:
+    try:
+        orchestrator.warm()
+    except Exception as e:
+        print(f"[Orchestrator Service] Warm-up failed: {e}")
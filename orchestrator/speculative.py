@@ -0,0 +1,147 @@
+import threading
+from typing import Optional
+
+from config.settings import (
+    SPECULATIVE_ENABLED,
+    SPECULATIVE_WORKERS,
+    SPECULATIVE_MAX_QUESTIONS,
+    SPECULATIVE_BUDGET_SECONDS,
+)
+from orchestrator.dag import CancelToken
+from orchestrator.jobs import JobQueue, DONE
+from agents.base_agent import llm_limiter
+from tools.rate_limiter import INTERACTIVE, SPECULATIVE, RunPriority
+from tools.sql_tool import data_version
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case/whitespace-insensitive form of a question, used to match a click
+    (or a retyped question) to precomputed work.
+    """
+    return " ".join((question or "").lower().split()).rstrip("?.! ")
+
+
+class SpeculationCancelled(Exception):
+    pass
+
+
+class SpeculativeExecutor:
+    """
+    Runs a session's recommended questions through the pipeline in the
+    background (no report) so the LLM, SQL and chart caches are already warm
+    when the user clicks one.
+
+    Work is bounded per session by max_questions and a wall-clock budget,
+    runs on its own small worker pool, and is cancelled when the session
+    uploads new data or asks something else.
+    """
+
+    def __init__(self, max_workers: int, max_questions: int, budget_seconds: float, enabled: bool = True):
+        self.enabled = enabled
+        self.max_questions = max_questions
+        self.budget_seconds = budget_seconds
+        self.queue = JobQueue("speculative", max_workers=max_workers)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def start(self, orchestrator, session_id: str, questions: list) -> list:
+        """
+        Replaces any speculation running for session_id with the given
+        questions. Returns the job ids queued.
+        """
+        self.cancel(session_id)
+        if not self.enabled or not questions:
+            return []
+
+        version = data_version()
+        tokens, jobs, priorities = {}, {}, {}
+        for question in questions:
+            key = normalize_question(question)
+            if not key or key in jobs:
+                continue
+            if len(jobs) >= self.max_questions:
+                break
+            tokens[key] = CancelToken()
+            priorities[key] = RunPriority(SPECULATIVE)
+            jobs[key] = self.queue.submit(
+                self._speculate, orchestrator, question, tokens[key], priorities[key],
+                dedupe_key=f"{session_id}:{version}:{key}"
+            )
+
+        # Budget: whatever is still queued or running afterwards is dropped
+        timer = threading.Timer(self.budget_seconds, lambda: [t.cancel() for t in tokens.values()])
+        timer.daemon = True
+        timer.start()
+
+        with self._lock:
+            self._sessions[session_id] = {"tokens": tokens, "jobs": jobs, "priorities": priorities, "timer": timer}
+        print(f"[Speculative] Precomputing {len(jobs)} questions for session {session_id}.")
+        return list(jobs.values())
+
+    def _speculate(self, orchestrator, question: str, token: CancelToken, priority: RunPriority) -> dict:
+        if token.cancelled:
+            raise SpeculationCancelled(f"Cancelled before start: {question}")
+        result = orchestrator.run(question, report=False, cancel_token=token, priority=priority)
+        if result.get("cancelled"):
+            raise SpeculationCancelled(f"Cancelled: {question}")
+        return {"stage_status": result.get("stage_status", {})}
+
+    def cancel(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        session["timer"].cancel()
+        for token in session["tokens"].values():
+            token.cancel()
+
+    def claim(self, session_id: str, question: str, timeout: Optional[float] = None) -> bool:
+        """
+        Called before the session runs question for real. Cancels the
+        session's other speculative work and, if this question is being
+        precomputed, raises that run to interactive priority and waits for it
+        so the real run is served from the caches. Returns True if
+        precomputation for the question completed.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+
+        key = normalize_question(question)
+        for other, token in session["tokens"].items():
+            if other != key:
+                token.cancel()
+
+        job_id = session["jobs"].get(key)
+        if job_id is None:
+            session["timer"].cancel()
+            return False
+
+        # The user is now waiting on this run
+        if session["priorities"][key].raise_to(INTERACTIVE):
+            llm_limiter.reprioritize()
+        job = self.queue.wait(job_id, timeout=self.budget_seconds if timeout is None else timeout)
+        session["timer"].cancel()
+        hit = job is not None and job["status"] == DONE
+        print(f"[Speculative] Question {'was' if hit else 'was not'} precomputed: {question}")
+        return hit
+
+    def status(self, session_id: str) -> dict:
+        """
+        Speculative job statuses for a session, keyed by normalized question.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return {}
+        return {key: (self.queue.status(job_id) or {}).get("status") for key, job_id in session["jobs"].items()}
+
+
+speculator = SpeculativeExecutor(
+    max_workers=SPECULATIVE_WORKERS,
+    max_questions=SPECULATIVE_MAX_QUESTIONS,
+    budget_seconds=SPECULATIVE_BUDGET_SECONDS,
+    enabled=SPECULATIVE_ENABLED,
+)
@@ -0,0 +1,83 @@
+"""
+In approximate mode the SQL tool answers aggregates from the sample,
+prefers an exact result it already has, and runs everything else exactly;
+the refine path returns the exact answer.
+"""
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tools.sql_tool
+from tools import approx_query
+from tools.approx_query import build_sample_table
+from tools.sql_tool import APPROXIMATE, EXACT, run_exact_sql, run_sql_tool, sql_result_cache
+
+ROWS = 5000
+TOTALS = "SELECT region, SUM(amt) FROM data_table GROUP BY region ORDER BY region"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(approx_query, "SAMPLE_MIN_TABLE_ROWS", 0)
+    monkeypatch.setattr(approx_query, "SAMPLE_ROWS", 1000)
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"region": rng.choice(["north", "south", "east"], ROWS), "amt": rng.integers(1, 100, ROWS)})
+    db_path = str(tmp_path / "analyst.db")
+    conn = sqlite3.connect(db_path)
+    df.to_sql("data_table", conn, index=False)
+    build_sample_table(conn, df)
+    conn.close()
+    monkeypatch.setattr(tools.sql_tool, "DB_PATH", db_path)
+    sql_result_cache.clear()
+    yield db_path
+    sql_result_cache.clear()
+
+
+def _run(sql: str, mode: str) -> dict:
+    return run_sql_tool({"sql_agent": {"sql": sql}, "sql_mode": mode})["sql_result"]
+
+
+def _exact(db_path: str, sql: str) -> list:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_aggregate_is_answered_from_the_sample(db):
+    result = _run(TOTALS, APPROXIMATE)
+    info = result["approximate"]
+    assert info["sample_rows"] < info["population_rows"] == ROWS
+    exact = _exact(db, TOTALS)
+    assert [r[0] for r in result["rows"]] == [r[0] for r in exact]
+    for (_, estimate), (_, total), bound in zip(result["rows"], exact, info["bounds"]["SUM(amt)"]):
+        # Within twice the 95% half-width (fixed seed, so not flaky)
+        assert abs(estimate - total) <= 2 * bound
+
+
+def test_cached_exact_result_wins(db):
+    exact = _run(TOTALS, EXACT)
+    assert "approximate" not in exact
+    assert _run(TOTALS, APPROXIMATE)["rows"] == exact["rows"] == _exact(db, TOTALS)
+    assert "approximate" not in _run(TOTALS, APPROXIMATE)
+
+
+def test_non_aggregate_runs_exactly(db):
+    sql = "SELECT region, amt FROM data_table WHERE amt > 97 ORDER BY rowid"
+    result = _run(sql, APPROXIMATE)
+    assert "approximate" not in result
+    assert result["rows"] == _exact(db, sql)
+
+
+def test_refine_returns_the_exact_answer(db):
+    assert "approximate" in _run(TOTALS, APPROXIMATE)
+    refined = run_exact_sql(TOTALS)
+    assert "approximate" not in refined
+    assert refined["rows"] == _exact(db, TOTALS)
@@ -0,0 +1,52 @@
+"""
+Approximate mode must group exactly like the query it approximates. With
+the sample covering the whole table the estimates are exact, so the
+approximate rows can be compared with SQLite's own answer.
+"""
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools import approx_query
+from tools.approx_query import build_sample_table, execute_approximate
+
+ROWS = 20000
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(approx_query, "SAMPLE_MIN_TABLE_ROWS", 0)
+    monkeypatch.setattr(approx_query, "SAMPLE_ROWS", ROWS)
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", "west"], ROWS),
+        "cat": rng.choice(["a", "b", "c"], ROWS),
+        "amt": rng.integers(1, 200, ROWS),
+    })
+    conn = sqlite3.connect(":memory:")
+    df.to_sql("data_table", conn, index=False)
+    build_sample_table(conn, df)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT SUM(amt) FROM data_table GROUP BY cat ORDER BY 1",
+    "SELECT region, SUM(amt) FROM data_table GROUP BY region, cat ORDER BY 1, 2",
+    "SELECT region, COUNT(*), AVG(amt) FROM data_table GROUP BY cat, region ORDER BY 1, 2",
+    "SELECT region, SUM(amt) AS total FROM data_table GROUP BY region ORDER BY total DESC",
+    "SELECT COUNT(*) FROM data_table WHERE amt > 100",
+])
+def test_matches_exact_result(conn, sql):
+    approx = execute_approximate(conn, sql)
+    assert approx is not None
+    exact = conn.execute(sql).fetchall()
+    assert len(approx["rows"]) == len(exact)
+    for got, want in zip(approx["rows"], exact):
+        assert got == pytest.approx(want)
@@ -0,0 +1,93 @@
+"""
+The blob store writes identical content once, serves repeat reads from
+memory, rejects handles that would escape its directory, and keeps its
+disk tier under the limit by evicting the least recently used blobs.
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.blob_store import BlobStore, chart_image_handle, is_blob_handle
+
+BLOB = 1000
+
+
+def _data(i: int) -> bytes:
+    return bytes([i % 256]) * BLOB
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = BlobStore(tmp_path)
+    handle = store.put(b"png bytes")
+    assert is_blob_handle(handle) and handle.endswith(".png")
+    assert store.put(b"png bytes") == handle
+    assert store.put(b"svg bytes", ext="svg") != handle
+    assert len(list(tmp_path.glob("*/*"))) == 2
+    assert store.get(handle) == b"png bytes"
+
+
+def test_reads_fall_back_to_disk(tmp_path):
+    writer = BlobStore(tmp_path, memory_max_bytes=0)
+    handle = writer.put(_data(1))
+    assert writer._memory_bytes == 0
+
+    reader = BlobStore(tmp_path, memory_max_bytes=10 * BLOB)
+    assert reader.get(handle) == _data(1)
+    os.remove(reader.path(handle))
+    # Served from memory after the first read
+    assert reader.get(handle) == _data(1)
+    assert BlobStore(tmp_path).get(handle) is None
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    store = BlobStore(tmp_path, memory_max_bytes=3 * BLOB)
+    for i in range(10):
+        store.put(_data(i))
+    assert store._memory_bytes <= 3 * BLOB
+    assert len(store._memory) == 3
+
+
+@pytest.mark.parametrize("handle", ["blob:../../etc/passwd", "blob:.hidden", "blob:a\\b", "not-a-handle"])
+def test_invalid_handles_are_rejected(tmp_path, handle):
+    store = BlobStore(tmp_path)
+    with pytest.raises(ValueError):
+        store.path(handle)
+    assert store.get(handle) is None
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    store = BlobStore(tmp_path, memory_max_bytes=0, disk_max_bytes=10 * BLOB)
+    handles = []
+    for i in range(10):
+        handles.append(store.put(_data(i)))
+        os.utime(store.path(handles[-1]), (i, i))
+    # A read refreshes the oldest blob
+    assert store.get(handles[0]) == _data(0)
+
+    store.put(_data(10))
+    on_disk = sum(p.stat().st_size for p in tmp_path.glob("*/*"))
+    assert on_disk <= 9 * BLOB
+    assert store.get(handles[0]) == _data(0)
+    assert store.get(handles[1]) is None
+
+
+def test_concurrent_puts_of_the_same_content(tmp_path):
+    store = BlobStore(tmp_path)
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(store.put(_data(7)))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(handles)) == 1
+    assert [p.name for p in tmp_path.glob("*/*")] == [handles[0][len("blob:"):]]
+
+
+def test_chart_image_handle_falls_back_to_any_profile():
+    assert chart_image_handle({"images": {"thumb": "blob:a.png", "print": "blob:b.svg"}}, "print") == "blob:b.svg"
+    assert chart_image_handle({"images": {"thumb": "blob:a.png"}}, "print") == "blob:a.png"
+    assert chart_image_handle({}, "thumb") is None
@@ -0,0 +1,47 @@
+"""
+The chart cache stays under its byte limit, evicting least recently used
+entries, without rescanning its directory on every write.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tools.chart_cache
+from tools.chart_cache import ChartRenderCache
+
+ENTRY = b"x" * 100
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ChartRenderCache(tmp_path, max_bytes=1000)
+    for i in range(10):
+        cache.put(f"k{i}", ENTRY)
+        # mtime is the LRU clock
+        os.utime(tmp_path / f"k{i}.bin", (i, i))
+    os.utime(tmp_path / "k0.bin")   # recently read
+
+    cache.put("k10", ENTRY)
+
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.bin")) <= 900
+    assert cache.get("k0") == ENTRY
+    assert cache.get("k1") is None
+    assert cache.get("k10") == ENTRY
+
+
+def test_scans_only_when_over_the_limit(tmp_path, monkeypatch):
+    scans = []
+    trim_files = tools.chart_cache.trim_files
+
+    def counting_trim(*args):
+        scans.append(args)
+        return trim_files(*args)
+
+    monkeypatch.setattr(tools.chart_cache, "trim_files", counting_trim)
+    cache = ChartRenderCache(tmp_path, max_bytes=1000)
+    for i in range(30):
+        cache.put(f"k{i}", ENTRY)
+
+    # First write, then once per trim down to 900 bytes (every 2 writes past the limit)
+    assert len(scans) < 15
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.bin")) <= 1000
@@ -0,0 +1,61 @@
+"""
+Charts rendered from several threads at once each get their own image:
+every concurrent render must match the same chart rendered alone.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.blob_store import blob_store
+from tools.chart_cache import chart_cache
+from tools.chart_tool import generate_chart_tool, generate_forecast_chart
+
+CHARTS = 24
+
+
+def _chart_args(i: int) -> tuple:
+    rows = [(f"c{k}", (i + 1) * (k + 1)) for k in range(3 + i % 5)]
+    return rows, ["category", "value"], ("bar", "line", "scatter")[i % 3], "category", "value", f"Chart {i}"
+
+
+def _forecast(i: int) -> dict:
+    periods = [f"2024-{m:02d}-01" for m in range(1, 7)]
+    return {
+        "series": [{"name": "sales", "forecast": {
+            "period": ["2024-07-01", "2024-08-01"], "value": [i + 7.0, i + 8.0],
+            "lower": [i + 6.0, i + 6.5], "upper": [i + 8.0, i + 9.5],
+        }}],
+        "history": {"periods": periods, "values": {"sales": [i + m for m in range(1, 7)]}},
+        "value_col": "sales", "time_col": "month", "horizon": 2, "frequency": "month",
+    }
+
+
+def _render(i: int):
+    if i % 4 == 3:
+        return generate_forecast_chart(_forecast(i), profiles=("thumb",))
+    return generate_chart_tool(*_chart_args(i), profiles=("thumb",))
+
+
+@pytest.fixture
+def isolated_storage(tmp_path, monkeypatch):
+    def use(name):
+        monkeypatch.setattr(blob_store, "blob_dir", tmp_path / name / "blobs")
+        monkeypatch.setattr(chart_cache, "cache_dir", tmp_path / name / "charts")
+    return use
+
+
+def test_concurrent_renders_match_sequential(isolated_storage):
+    isolated_storage("sequential")
+    expected = [blob_store.get(_render(i)["thumb"]) for i in range(CHARTS)]
+
+    # Fresh cache: every concurrent call really renders
+    isolated_storage("concurrent")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        images = list(pool.map(_render, range(CHARTS)))
+
+    assert all(images)
+    assert [blob_store.get(image["thumb"]) for image in images] == expected
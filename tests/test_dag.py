@@ -0,0 +1,113 @@
+"""
+The stage scheduler runs independent stages concurrently, skips the
+dependents of failed stages, and on a timeout marks the stage and cancels
+its token so its queued LLM calls are dropped.
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator.dag import (
+    CANCELLED, DONE, FAILED, SKIPPED, TIMEOUT, CancelToken, DagScheduler, Stage, StageError,
+)
+from tools.rate_limiter import SPECULATIVE, current_cancel_token, current_priority, request_context
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(name):
+        def fn(state):
+            barrier.wait()
+            return {name: state["x"] + 1}
+        return fn
+
+    stages = [
+        Stage("a", branch("a")),
+        Stage("b", branch("b")),
+        Stage("total", lambda state: {"total": state["a"] + state["b"]}, requires=["a", "b"]),
+    ]
+    state = DagScheduler(stages).run({"x": 1})
+    assert state["total"] == 4
+    assert set(state["stage_status"].values()) == {DONE}
+
+
+def test_failure_skips_dependents_but_not_after_stages():
+    def fail(state):
+        raise StageError("no rows", {"sql_result": {"error": "no rows"}})
+
+    stages = [
+        Stage("sql", fail),
+        Stage("chart", lambda state: {"chart": 1}, requires=["sql"]),
+        Stage("aggregate", lambda state: {"seen": sorted(state)}, after=["sql", "chart"]),
+    ]
+    state = DagScheduler(stages).run({})
+    assert state["stage_status"] == {"sql": FAILED, "chart": SKIPPED, "aggregate": DONE}
+    assert state["stage_errors"] == {"sql": "no rows"}
+    assert "sql_result" in state["seen"]
+
+
+def test_timeout_marks_the_stage_and_cancels_it():
+    started, tokens = threading.Event(), []
+
+    def slow(state):
+        tokens.append(current_cancel_token.get())
+        started.set()
+        while not tokens[0].cancelled:
+            time.sleep(0.01)
+        return {"late": True}
+
+    run_token = CancelToken()
+    stages = [
+        Stage("slow", slow, timeout=0.2),
+        Stage("after_slow", lambda state: {"next": True}, requires=["slow"]),
+    ]
+    began = time.monotonic()
+    with request_context(SPECULATIVE, run_token):
+        state = DagScheduler(stages).run({}, cancel_token=run_token)
+
+    assert time.monotonic() - began < 2
+    assert state["stage_status"] == {"slow": TIMEOUT, "after_slow": SKIPPED}
+    assert state["stage_errors"]["slow"] == "Timed out after 0.2s"
+    assert "late" not in state
+    # Only the stage is cancelled, not the run it belongs to
+    assert tokens[0].cancelled and not run_token.cancelled
+
+
+def test_cancelled_run_reaches_running_stages():
+    token, seen = CancelToken(), []
+    release = threading.Event()
+
+    def waiting(state):
+        seen.append((current_cancel_token.get(), current_priority.get().value))
+        release.wait(5)
+        return {}
+
+    def cancel_soon():
+        time.sleep(0.2)
+        token.cancel()
+
+    threading.Thread(target=cancel_soon).start()
+    with request_context(SPECULATIVE, token):
+        state = DagScheduler([Stage("wait", waiting), Stage("then", lambda s: {}, requires=["wait"])]).run(
+            {}, cancel_token=token)
+    release.set()
+
+    assert state["cancelled"] is True
+    assert state["stage_status"] == {"wait": CANCELLED, "then": CANCELLED}
+    stage_token, priority = seen[0]
+    assert stage_token.cancelled and priority == SPECULATIVE
+
+
+@pytest.mark.parametrize("stages", [
+    [Stage("a", dict), Stage("a", dict)],
+    [Stage("a", dict, requires=["missing"])],
+])
+def test_invalid_graphs_are_rejected(stages):
+    with pytest.raises(ValueError):
+        DagScheduler(stages)
@@ -0,0 +1,80 @@
+"""
+The local forecaster recovers known series: a straight line is extended
+exactly, a repeating season is carried forward, grouped results become one
+series per group, and chunked input forecasts like the whole frame.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.forecast_engine import describe_forecast, forecast, prepare_series
+
+
+def _monthly(values, start="2020-01-01") -> pd.DataFrame:
+    months = pd.date_range(start, periods=len(values), freq="MS")
+    return pd.DataFrame({"month": months.strftime("%Y-%m-%d"), "sales": values})
+
+
+def test_linear_series_is_extended():
+    result = forecast(_monthly([100 + 5 * i for i in range(36)]))
+    s = result["series"][0]
+    assert result["frequency"] == "month"
+    assert result["horizon"] == 12
+    assert s["trend_per_period"] == pytest.approx(5)
+    assert s["forecast"][0]["period"] == "2023-01-01"
+    assert [p["value"] for p in s["forecast"]] == pytest.approx([280 + 5 * k for k in range(12)], abs=1e-6)
+    for p in s["forecast"]:
+        assert p["lower"] <= p["value"] <= p["upper"]
+
+
+def test_seasonal_series_repeats_its_season():
+    season = [10, 12, 15, 20, 26, 30, 32, 31, 25, 18, 13, 11]
+    result = forecast(_monthly(season * 4))
+    s = result["series"][0]
+    assert s["model"] in ("holt_winters", "seasonal_naive")
+    assert [p["value"] for p in s["forecast"]] == pytest.approx(season, abs=0.5)
+
+
+def test_daily_frequency_and_weekly_season():
+    days = pd.date_range("2024-01-01", periods=8 * 7, freq="D")
+    weekly = np.tile([5.0, 5, 5, 5, 5, 20, 20], 8)
+    result = forecast(pd.DataFrame({"day": days, "visits": weekly}))
+    assert result["frequency"] == "day"
+    values = [p["value"] for p in result["series"][0]["forecast"]]
+    assert values[:7] == pytest.approx([5, 5, 5, 5, 5, 20, 20], abs=0.5)
+
+
+def test_grouped_result_forecasts_each_group():
+    frame = pd.concat([
+        _monthly([float(base + i) for i in range(24)]).assign(region=name)
+        for name, base in (("north", 100), ("south", 10))
+    ])
+    result = forecast(frame)
+    assert result["group_col"] == "region"
+    assert {s["name"] for s in result["series"]} == {"north", "south"}
+    north = next(s for s in result["series"] if s["name"] == "north")
+    assert north["forecast"][0]["value"] == pytest.approx(124, abs=1e-6)
+
+
+def test_chunked_input_matches_whole_frame():
+    frame = _monthly([float(i % 7 + i) for i in range(48)])
+    chunks = [frame.iloc[i:i + 10] for i in range(0, len(frame), 10)]
+    whole = prepare_series(frame)
+    chunked = prepare_series(frame.head(5), frames=iter(chunks))
+    np.testing.assert_allclose(chunked["Y"], whole["Y"])
+
+
+def test_not_a_time_series():
+    assert forecast(pd.DataFrame({"region": ["a", "b"], "sales": [1, 2]})) is None
+    assert forecast(_monthly([1.0, 2.0, 3.0])) is None
+
+
+def test_description_names_the_model():
+    text = describe_forecast(forecast(_monthly([100 + 5 * i for i in range(36)])))
+    assert text.startswith("Forecast of 12 months ahead from 36 points:")
+    assert "trend +5.00 per month" in text
@@ -0,0 +1,88 @@
+"""
+Session history compresses old turns without losing anything, keeps only
+recently used sessions' summaries in memory, and deletes idle sessions.
+"""
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.history_store import HistoryStore
+
+
+def _turn(i: int) -> dict:
+    return {
+        "user_query": f"question {i}",
+        "insight_agent": {"insights": f"insight {i} " * 50},
+        "chart_agent": {"charts": [f"blob-{i}"]},
+        "ignored": "not a turn key",
+    }
+
+
+def _store(tmp_path, **overrides) -> HistoryStore:
+    options = dict(max_sessions=2, uncompressed_turns=3, retention_days=30)
+    options.update(overrides)
+    return HistoryStore(tmp_path / "history.db", **options)
+
+
+def _compacted(store: HistoryStore, session_id: str) -> list:
+    conn = sqlite3.connect(store.db_path)
+    try:
+        return [c for (c,) in conn.execute(
+            "SELECT compacted FROM turns WHERE session_id = ? ORDER BY turn", (session_id,))]
+    finally:
+        conn.close()
+
+
+def test_old_turns_are_compressed_losslessly(tmp_path):
+    store = _store(tmp_path)
+    for i in range(8):
+        assert store.append("s", _turn(i)) == i
+
+    assert _compacted(store, "s") == [1] * 5 + [0] * 3
+    turns = store.load("s")
+    assert len(turns) == 8
+    expected = {k: v for k, v in _turn(2).items() if k != "ignored"}
+    expected["forecast_agent"] = {}
+    assert turns[2] == expected
+    assert [t["user_query"] for t in store.load("s", 4, 6)] == ["question 4", "question 5"]
+
+
+def test_summaries_survive_a_restart(tmp_path):
+    store = _store(tmp_path, max_sessions=8)
+    for i in range(5):
+        store.append("s", _turn(i))
+    summaries = store.summaries("s")
+    assert summaries[0] == {"user_query": "question 0", "summary": (_turn(0)["insight_agent"]["insights"])[:300],
+                            "charts": 1}
+    assert _store(tmp_path).summaries("s") == summaries
+
+
+def test_memory_keeps_recent_sessions_only(tmp_path):
+    store = _store(tmp_path)
+    for session_id in ("a", "b", "c"):
+        store.append(session_id, _turn(0))
+        store.summaries(session_id)
+    assert store.stats() == {"cached_sessions": 2, "cached_turns": 2}
+    # An evicted session is read back from disk
+    assert store.count("a") == 1
+
+    store.delete_session("a")
+    assert store.count("a") == 0 and store.load("a") == []
+
+
+def test_idle_sessions_expire(tmp_path):
+    store = _store(tmp_path)
+    store.append("old", _turn(0))
+    store.append("old", _turn(1))
+    store.append("new", _turn(0))
+    conn = sqlite3.connect(store.db_path)
+    conn.execute("UPDATE turns SET created_at = ? WHERE session_id = 'old'", (time.time() - 31 * 86400,))
+    conn.commit()
+    conn.close()
+
+    reopened = _store(tmp_path)
+    assert reopened.count("old") == 0
+    assert reopened.count("new") == 1
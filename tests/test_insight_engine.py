@@ -0,0 +1,89 @@
+"""
+The insight engine finds the statistics planted in a known result, and a
+large result analyzed from a sample plus its chunks reports the same
+totals as the whole frame.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.insight_engine import analyze, describe_findings
+
+ROWS = 400
+
+
+@pytest.fixture
+def frame() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    units = rng.integers(1, 50, ROWS).astype(float)
+    region = np.where(np.arange(ROWS) % 10 < 7, "north", rng.choice(["south", "east", "west"], ROWS))
+    return pd.DataFrame({
+        "order_id": np.arange(ROWS),
+        "region": region,
+        "units": units,
+        "revenue": units * 20 + rng.normal(0, 5, ROWS),
+    })
+
+
+def _by_kind(findings: list, kind: str) -> list:
+    return [f for f in findings if f["kind"] == kind]
+
+
+def test_correlation_and_contributors(frame):
+    findings = analyze(frame, max_findings=20)
+    (corr,) = _by_kind(findings, "correlation")
+    assert set(corr["columns"]) == {"units", "revenue"}
+    assert corr["value"] > 0.95
+
+    (top,) = _by_kind(findings, "contributors")
+    assert top["columns"] == ["region", "revenue"]
+    assert top["top"][0] == "north"
+    share = frame.groupby("region")["revenue"].sum()
+    assert top["top_share"] == pytest.approx(share["north"] / share.sum())
+    # Identifier columns are not measures
+    assert all("order_id" not in f["columns"] for f in findings)
+
+
+def test_outlier_is_named_by_its_row(frame):
+    frame.loc[123, ["units", "revenue"]] = [40, 50000]
+    frame.loc[123, "region"] = "west"
+    (outlier,) = [f for f in _by_kind(analyze(frame, max_findings=20), "outlier") if f["columns"] == ["revenue"]]
+    assert outlier["value"] == 50000
+    assert outlier["count"] == 1
+    assert "(region = west)" in outlier["text"]
+
+
+def test_latest_period_change():
+    months = pd.date_range("2023-01-01", periods=12, freq="MS").strftime("%Y-%m-%d")
+    sales = [100.0] * 11 + [150.0]
+    findings = analyze(pd.DataFrame({"month": months, "sales": sales}), max_findings=20)
+    latest = _by_kind(findings, "period_change")[0]
+    assert latest["value"] == pytest.approx(0.5)
+    assert "in the latest month (2023-12-01)" in latest["text"]
+
+
+def test_skewed_column():
+    values = np.concatenate([np.ones(90), np.linspace(50, 100, 10)])
+    (skew,) = _by_kind(analyze(pd.DataFrame({"amount": values}), max_findings=20), "skew")
+    assert skew["value"] > 1
+    assert "right-skewed" in skew["text"]
+
+
+def test_chunked_totals_match_whole_frame(frame):
+    chunks = [frame.iloc[i:i + 64] for i in range(0, ROWS, 64)]
+    whole = _by_kind(analyze(frame, max_findings=20), "contributors")
+    sampled = _by_kind(analyze(frame.iloc[::4], max_findings=20, frames=iter(chunks)), "contributors")
+    assert sampled[0]["top_share"] == pytest.approx(whole[0]["top_share"])
+
+
+def test_ranking_and_description(frame):
+    findings = analyze(frame, max_findings=2)
+    assert len(findings) == 2
+    assert findings[0]["score"] >= findings[1]["score"]
+    assert describe_findings(findings).splitlines()[1].startswith("2. ")
+    assert analyze(frame.head(2)) == []
@@ -0,0 +1,92 @@
+"""
+Background jobs with the same serial_key run one at a time in submission
+order without holding up other keys; dedupe_key shares a job until it
+fails.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator.jobs import DONE, FAILED, JobQueue
+
+
+def test_serial_jobs_run_in_order_one_at_a_time():
+    queue = JobQueue("test", max_workers=4)
+    log, active, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    def job(i):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            log.append(i)
+            active[0] -= 1
+        return i
+
+    ids = [queue.submit(job, i, serial_key="session") for i in range(6)]
+    results = [queue.wait(job_id, timeout=5) for job_id in ids]
+
+    assert log == list(range(6))
+    assert peak[0] == 1
+    assert [r["result"] for r in results] == list(range(6))
+
+
+def test_serial_key_does_not_block_other_keys():
+    queue = JobQueue("test", max_workers=2)
+    release = threading.Event()
+    blocked = queue.submit(release.wait, 5, serial_key="a")
+    queued = queue.submit(lambda: "a2", serial_key="a")
+    other = queue.submit(lambda: "b", serial_key="b")
+
+    assert queue.wait(other, timeout=5)["result"] == "b"
+    assert queue.status(queued)["status"] == "queued"
+    release.set()
+    assert queue.wait(queued, timeout=5)["result"] == "a2"
+    assert queue.status(blocked)["status"] == DONE
+
+
+def test_failed_serial_job_starts_the_next():
+    queue = JobQueue("test", max_workers=1)
+
+    def fail():
+        raise RuntimeError("render failed")
+
+    first = queue.submit(fail, serial_key="s")
+    second = queue.submit(lambda: "ok", serial_key="s")
+    assert queue.wait(second, timeout=5)["result"] == "ok"
+    assert queue.status(first)["status"] == FAILED
+    assert queue.status(first)["error"] == "render failed"
+
+
+def test_dedupe_shares_a_job_until_it_fails():
+    queue = JobQueue("test", max_workers=1)
+    calls = []
+
+    def job():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("first attempt fails")
+        return len(calls)
+
+    first = queue.submit(job, dedupe_key="report")
+    queue.wait(first, timeout=5)
+    retry = queue.submit(job, dedupe_key="report")
+    assert retry != first
+    assert queue.wait(retry, timeout=5)["result"] == 2
+    assert queue.submit(job, dedupe_key="report") == retry
+    assert len(calls) == 2
+
+
+def test_finished_jobs_are_pruned():
+    queue = JobQueue("test", max_workers=1, max_finished=3)
+    ids = []
+    for i in range(6):
+        ids.append(queue.submit(lambda i=i: i))
+        queue.wait(ids[-1], timeout=5)
+    assert queue.status(ids[0]) is None
+    assert queue.status(ids[-1])["result"] == 5
@@ -0,0 +1,70 @@
+"""
+The NL2SQL fast path profiles columns from a bounded number of rows and
+translates the common question shapes from that profile.
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tools.nl2sql
+import tools.sql_tool
+from tools.nl2sql import column_profile, translate
+
+ROWS = 5000
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "analyst.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE data_table (date TEXT, region TEXT, store INTEGER, sales REAL)")
+    conn.executemany("INSERT INTO data_table VALUES (?, ?, ?, ?)", [
+        (f"2024-{i % 12 + 1:02d}-01", "NSEW"[i % 4], i % 30, i * 1.5) for i in range(ROWS)
+    ])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(tools.sql_tool, "DB_PATH", db_path)
+    monkeypatch.setattr(tools.nl2sql, "DB_PATH", db_path)
+    tools.nl2sql.profile_cache.clear()
+    return db_path
+
+
+def test_profile_kinds_and_cardinality(table):
+    assert column_profile() == {
+        "date": {"type": "date", "distinct": 12},
+        "region": {"type": "text", "distinct": 4},
+        "store": {"type": "numeric", "distinct": 30},
+        "sales": {"type": "numeric", "distinct": ROWS},
+    }
+
+
+def test_profile_reads_at_most_the_row_limit(table, monkeypatch):
+    monkeypatch.setattr(tools.nl2sql, "PROFILE_SAMPLE_ROWS", 100)
+    assert column_profile()["sales"]["distinct"] == 100
+
+
+def test_profile_prefers_sample_table(table):
+    conn = sqlite3.connect(table)
+    conn.execute("CREATE TABLE data_sample AS SELECT * FROM data_table WHERE region = 'N'")
+    conn.commit()
+    conn.close()
+    assert column_profile()["region"]["distinct"] == 1
+
+
+@pytest.mark.parametrize("question, sql", [
+    ("total sales by region",
+     'SELECT "region", SUM("sales") AS value FROM data_table GROUP BY "region" ORDER BY value DESC'),
+    ("how many rows", "SELECT COUNT(*) AS row_count FROM data_table"),
+    ("number of records by store",
+     'SELECT "store", COUNT(*) AS count FROM data_table GROUP BY "store" ORDER BY count DESC'),
+])
+def test_translate(table, question, sql):
+    assert translate(question)[0] == sql
+
+
+def test_high_cardinality_numbers_are_not_grouped(table):
+    assert translate("number of records by sales") == (None, 0.0)
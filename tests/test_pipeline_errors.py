@@ -0,0 +1,24 @@
+"""
+A run whose SQL stage never finished reports why in sql_result["error"]
+instead of looking like a query that returned no rows.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator.root_orchestrator import RootOrchestrator
+
+
+def _failing_sql_agent(state):
+    raise RuntimeError("LLM unavailable")
+
+
+def test_failed_sql_agent_sets_sql_error():
+    orchestrator = RootOrchestrator()
+    orchestrator._sql_agent_stage = _failing_sql_agent
+    result = orchestrator.run("total sales by region", session_id="test-session", report=False)
+
+    assert result["stage_status"]["sql_tool"] == "skipped"
+    assert result["sql_result"]["rows"] == []
+    assert result["sql_result"]["error"] == "SQL generation failed: LLM unavailable"
@@ -0,0 +1,65 @@
+"""
+An interactive question that joins an identical speculative run in flight
+raises that run to interactive priority instead of waiting behind other
+speculative work; a lower-priority caller never lowers it.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator.dag import CancelToken
+from orchestrator.root_orchestrator import RootOrchestrator, pipeline_flight
+from tools.rate_limiter import DISCOVERY, INTERACTIVE, SPECULATIVE
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _blocking_orchestrator():
+    orchestrator = RootOrchestrator()
+    started, release, priorities = threading.Event(), threading.Event(), []
+
+    def analyze(user_query, token, priority, on_stage_done, approximate=False):
+        priorities.append(priority)
+        started.set()
+        release.wait(5)
+        return {"stage_status": {}}
+
+    orchestrator._analyze = analyze
+    return orchestrator, started, release, priorities
+
+
+def _join(leader_priority, joiner_priority, joiner_question="Sales by region?"):
+    orchestrator, started, release, priorities = _blocking_orchestrator()
+    coalesced = pipeline_flight.stats()["coalesced"]
+    results = []
+    leader = threading.Thread(target=lambda: results.append(orchestrator.run(
+        "sales by region", report=False, cancel_token=CancelToken(), priority=leader_priority)))
+    leader.start()
+    assert started.wait(5)
+    joiner = threading.Thread(target=lambda: results.append(orchestrator.run(
+        joiner_question, report=False, session_id="joiner", priority=joiner_priority)))
+    joiner.start()
+    _wait_for(lambda: pipeline_flight.stats()["coalesced"] > coalesced)
+    value = priorities[0].value
+    release.set()
+    leader.join(5)
+    joiner.join(5)
+    assert len(priorities) == 1 and len(results) == 2
+    return value
+
+
+def test_interactive_caller_raises_a_speculative_run():
+    assert _join(SPECULATIVE, INTERACTIVE) == INTERACTIVE
+
+
+def test_lower_priority_caller_does_not_lower_a_run():
+    assert _join(INTERACTIVE, SPECULATIVE) == INTERACTIVE
+    assert _join(DISCOVERY, SPECULATIVE) == DISCOVERY
@@ -0,0 +1,75 @@
+"""
+Profiled runs attribute wall clock and LLM time to the stage that spent
+it, write their artifacts, and cost nothing when profiling is off.
+"""
+import json
+import os
+import pstats
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import orchestrator.profiling
+from orchestrator.dag import DagScheduler, Stage
+from orchestrator.profiling import current_profile, parse_modes, profile_run, profile_stages
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator.profiling, "RUN_PROFILE_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("value, modes", [
+    (None, ()), (False, ()), ("0", ()), ("off", ()),
+    (True, ("timing", "cpu", "memory")), ("all", ("timing", "cpu", "memory")),
+    ("memory", ("timing", "memory")), ("cpu, timing", ("timing", "cpu")),
+])
+def test_parse_modes(value, modes):
+    assert parse_modes(value) == modes
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        parse_modes("cpu,disk")
+
+
+def slow_stage(state):
+    time.sleep(0.05)
+    return {"slow": sum(i * i for i in range(20000))}
+
+
+def llm_stage(state):
+    current_profile.get().record_llm(wait_s=0.25, call_s=0.5)
+    return {"llm": True}
+
+
+def test_stage_timings_and_artifacts(profile_dir):
+    with profile_run("ask", "sales by region", "all") as run_profile:
+        stages = profile_stages([Stage("slow", slow_stage), Stage("llm", llm_stage, requires=["slow"])])
+        DagScheduler(stages).run({})
+
+    summary = run_profile.summary()
+    assert summary["modes"] == ["timing", "cpu", "memory"]
+    assert summary["stages"]["slow"]["wall_s"] >= 0.05
+    assert summary["stages"]["llm"]["llm_calls"] == 1
+    assert summary["stages"]["llm"]["llm_wait_s"] == 0.25
+    assert summary["llm"] == {"calls": 1, "cache_hits": 0, "wait_s": 0.25, "call_s": 0.5}
+    assert summary["wall_s"] >= summary["stages"]["slow"]["wall_s"]
+
+    run_dir = profile_dir / run_profile.run_id
+    assert json.loads((run_dir / "summary.json").read_text()) == summary
+    functions = {name for _, _, name in pstats.Stats(str(run_dir / "cpu.pstats")).stats}
+    assert "slow_stage" in functions
+    assert json.loads((run_dir / "memory.json").read_text())["peak_kb"] > 0
+
+
+def test_profiling_off_leaves_stages_alone(profile_dir):
+    stages = [Stage("slow", slow_stage)]
+    with profile_run("ask", "q", "0") as run_profile:
+        assert run_profile is None
+        assert profile_stages(stages)[0].fn is slow_stage
+    assert list(profile_dir.iterdir()) == []
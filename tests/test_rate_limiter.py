@@ -0,0 +1,157 @@
+"""
+The LLM rate limiter halves its concurrency on quota errors and grows it
+back slowly, admits waiting calls by priority, and drops cancelled calls
+from its queue.
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator.dag import CancelToken
+from tools.rate_limiter import (
+    DISCOVERY, INTERACTIVE, SPECULATIVE, LLMRateLimiter, LLMRequestCancelled, RunPriority, TokenBucket,
+    request_context,
+)
+
+
+def _limiter(**overrides) -> LLMRateLimiter:
+    options = dict(requests_per_min=6000, tokens_per_min=10 ** 7, initial_concurrency=8,
+                   min_concurrency=1, max_concurrency=16, target_latency=10.0)
+    options.update(overrides)
+    return LLMRateLimiter(**options)
+
+
+def test_throttle_error_halves_concurrency():
+    limiter = _limiter()
+    with pytest.raises(RuntimeError):
+        with limiter.slot("prompt"):
+            limiter.report_error(RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded"))
+            raise RuntimeError("429")
+    assert limiter.stats()["concurrency_limit"] == 4
+    assert limiter.stats()["throttled"] == 1
+
+    # A second error within the cooldown does not halve again
+    with limiter.slot("prompt"):
+        limiter.report_error(RuntimeError("429"))
+    assert limiter.stats()["concurrency_limit"] == 4
+
+
+def test_other_errors_and_successes_grow_the_limit():
+    limiter = _limiter(initial_concurrency=4)
+    with limiter.slot("prompt"):
+        limiter.report_error(ValueError("bad request"))
+    assert limiter.limit == pytest.approx(4.25)
+    # About +1 per window of `limit` successful calls
+    for _ in range(20):
+        with limiter.slot("prompt"):
+            pass
+    assert 7 < limiter.limit < 8
+
+
+def test_slow_calls_halve_concurrency():
+    limiter = _limiter(target_latency=0.0)
+    with limiter.slot("prompt"):
+        time.sleep(0.01)
+    assert limiter.stats()["concurrency_limit"] == 4
+    assert limiter.stats()["slow"] == 1
+
+
+def test_waiting_calls_are_admitted_by_priority():
+    limiter = _limiter(initial_concurrency=1, max_concurrency=1)
+    order = []
+    blocker = limiter.acquire(INTERACTIVE, 1)
+
+    def call(priority):
+        with request_context(priority):
+            with limiter.slot("prompt"):
+                order.append(priority)
+
+    threads = []
+    for priority in (SPECULATIVE, DISCOVERY, SPECULATIVE, INTERACTIVE):
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        while limiter.stats()["queue_depth"][priority] == 0:
+            time.sleep(0.001)
+    limiter.release(blocker, 0.0)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == [INTERACTIVE, DISCOVERY, SPECULATIVE, SPECULATIVE]
+
+
+def test_cancelled_call_leaves_the_queue():
+    limiter = _limiter(initial_concurrency=1, max_concurrency=1)
+    blocker = limiter.acquire(INTERACTIVE, 1)
+    token = CancelToken()
+    errors = []
+
+    def call():
+        try:
+            limiter.acquire(SPECULATIVE, 1, token)
+        except LLMRequestCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    while limiter.stats()["queue_depth"][SPECULATIVE] == 0:
+        time.sleep(0.001)
+    token.cancel()
+    thread.join(5)
+
+    assert len(errors) == 1
+    assert limiter.stats()["queue_depth"][SPECULATIVE] == 0
+    assert limiter.stats()["cancelled"] == 1
+    limiter.release(blocker, 0.0)
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate_per_min=60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(30, now) == pytest.approx(30)
+    assert bucket.wait_time(30, now + 30) == 0.0
+    # Larger than the bucket: admitted once it is full
+    assert bucket.wait_time(1000, now + 60) == 0.0
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        with request_context("urgent"):
+            pass
+
+
+def test_raised_run_overtakes_queued_work():
+    limiter = _limiter(initial_concurrency=1, max_concurrency=1)
+    order = []
+    blocker = limiter.acquire(INTERACTIVE, 1)
+    joined = RunPriority(SPECULATIVE)
+
+    def call(name, priority):
+        with request_context(priority):
+            with limiter.slot("prompt"):
+                order.append(name)
+
+    threads = []
+    for name, priority in (("other", SPECULATIVE), ("discovery", DISCOVERY), ("joined", joined)):
+        threads.append(threading.Thread(target=call, args=(name, priority)))
+        threads[-1].start()
+        _wait_for_depth(limiter, len(threads))
+    assert joined.raise_to(INTERACTIVE)
+    assert not joined.raise_to(SPECULATIVE)
+    limiter.reprioritize()
+    limiter.release(blocker, 0.0)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["joined", "discovery", "other"]
+
+
+def _wait_for_depth(limiter, depth):
+    while sum(limiter.stats()["queue_depth"].values()) < depth:
+        time.sleep(0.001)
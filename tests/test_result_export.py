@@ -0,0 +1,58 @@
+"""
+Parquet export keeps every row when column types only become clear, or
+change, after the first chunk.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from tools.result_export import write_parquet, write_csv
+
+
+def _export(tmp_path, columns, chunks):
+    path = str(tmp_path / "out.parquet")
+    write_parquet(columns, iter(chunks), path)
+    return pq.read_table(path)
+
+
+def test_null_first_chunk_takes_later_type(tmp_path):
+    table = _export(tmp_path, ["discount"], [[(None,), (None,)], [(5,), (7,)]])
+    assert table.schema.field("discount").type == pa.int64()
+    assert table.column("discount").to_pylist() == [None, None, 5, 7]
+
+
+def test_int_widens_to_float(tmp_path):
+    table = _export(tmp_path, ["price"], [[(1,), (2,)], [(2.5,)], [(3,)]])
+    assert table.schema.field("price").type == pa.float64()
+    assert table.column("price").to_pylist() == [1.0, 2.0, 2.5, 3.0]
+
+
+def test_mixed_types_become_text(tmp_path):
+    table = _export(tmp_path, ["code", "n"], [[(1, 1)], [("A7", 2)], [(None, 3)]])
+    assert table.schema.field("code").type == pa.string()
+    assert table.column("code").to_pylist() == ["1", "A7", None]
+    assert table.column("n").to_pylist() == [1, 2, 3]
+
+
+def test_all_null_and_empty_columns_are_text(tmp_path):
+    assert _export(tmp_path, ["x"], [[(None,)], [(None,)]]).schema.field("x").type == pa.string()
+    assert _export(tmp_path, ["x"], []).num_rows == 0
+
+
+def test_row_groups_follow_chunks(tmp_path):
+    path = str(tmp_path / "out.parquet")
+    write_parquet(["v"], iter([[(None,)], [(1,)], [(1.5,)]]), path)
+    assert pq.ParquetFile(path).num_row_groups == 3
+
+
+def test_csv_matches_rows(tmp_path):
+    path = str(tmp_path / "out.csv")
+    write_csv(["a", "b"], iter([[(1, "x")], [(None, "y")]]), path)
+    with open(path, encoding="utf-8") as f:
+        assert f.read().splitlines() == ["a,b", "1,x", ",y"]
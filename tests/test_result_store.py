@@ -0,0 +1,84 @@
+"""
+In-memory results stay charged to the memory budget while they are held,
+spilled results page back the same rows, and the spill sweep only removes
+files whose owning process is gone.
+"""
+import copy
+import gc
+import os
+import sqlite3
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.result_store import (
+    MemoryBudget, SpilledRows, fetch_rows, rows_page, spill_prefix, sweep_spill_dir,
+)
+
+ROWS = [(i, f"name {i}", i * 0.5) for i in range(2000)]
+
+
+def _cursor():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a, b, c)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    return conn.execute("SELECT * FROM t")
+
+
+def test_held_result_is_charged_until_released():
+    budget = MemoryBudget(total_bytes=10 ** 9)
+    rows = fetch_rows(_cursor(), budget=budget, chunk_rows=300)
+    assert rows == ROWS
+    assert budget.stats()["used_bytes"] == rows.nbytes > 0
+
+    held = {"sql_result": {"rows": rows}}
+    assert copy.deepcopy(held)["sql_result"]["rows"] is rows
+    del rows
+    gc.collect()
+    assert budget.stats()["used_bytes"] > 0
+
+    del held
+    gc.collect()
+    assert budget.stats()["used_bytes"] == 0
+
+
+def test_held_results_push_later_fetches_to_disk():
+    first = fetch_rows(_cursor(), budget=MemoryBudget(10 ** 9))
+    budget = MemoryBudget(total_bytes=first.nbytes + first.nbytes // 2)
+    kept = fetch_rows(_cursor(), budget=budget)
+    assert not isinstance(kept, SpilledRows)
+
+    spilled = fetch_rows(_cursor(), budget=budget)
+    assert isinstance(spilled, SpilledRows)
+    # Only the held result is charged; the spilled one's partial reservation was returned
+    assert budget.stats()["used_bytes"] == kept.nbytes
+
+
+def test_spilled_rows_page_like_the_unspilled_rows():
+    rows = fetch_rows(_cursor(), max_bytes=1000, budget=MemoryBudget(), chunk_rows=300)
+    assert isinstance(rows, SpilledRows)
+    assert len(rows) == len(ROWS)
+    assert list(rows) == ROWS
+    assert rows[:20] == ROWS[:20]
+    assert rows[-1] == ROWS[-1]
+    assert rows[10:40:3] == ROWS[10:40:3]
+    assert rows_page(rows, 1990, 50) == ROWS[1990:]
+
+
+def test_sweep_keeps_files_of_live_processes(tmp_path):
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    own = tmp_path / f"{spill_prefix('result')}abc.db"
+    dead = tmp_path / f"result-{child.pid}-abc.db"
+    legacy = tmp_path / "export-abc.csv"
+    for path in (own, dead, legacy):
+        path.write_bytes(b"")
+    os.utime(own, (0, 0))
+
+    assert sweep_spill_dir(directory=tmp_path) == 1
+    assert own.exists() and legacy.exists() and not dead.exists()
+
+    os.utime(legacy, (0, 0))
+    assert sweep_spill_dir(directory=tmp_path) == 1
+    assert not legacy.exists()
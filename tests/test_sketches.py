@@ -0,0 +1,142 @@
+"""
+Streaming sketches stay within their error bounds, merged sketches match
+one built over the whole stream, and the parallel table profile agrees
+with exact pandas statistics.
+"""
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tools.profiler
+import tools.sql_tool
+from tools.profiler import describe_profile, profile_table
+from tools.sketches import HyperLogLog, KLLSketch, SpaceSaving
+
+N = 200000
+
+
+@pytest.mark.parametrize("distinct", [50, 3000, 150000])
+def test_hll_within_error_bound(distinct):
+    hll = HyperLogLog(precision=12)
+    values = np.arange(N) % distinct
+    for chunk in np.array_split(values, 7):
+        hll.update(chunk)
+    # Four standard errors of 1.04 / sqrt(4096)
+    assert abs(hll.count() - distinct) <= 4 * 1.04 / 64 * distinct
+
+
+def test_hll_merge_is_the_union():
+    a, b, whole = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left, right = np.arange(0, 60000), np.arange(40000, 100000)
+    a.update(left)
+    b.update(right)
+    whole.update(np.concatenate([left, right]))
+    a.merge(b)
+    assert a.count() == whole.count()
+    # 1 and 1.0 are the same value; strings hash by text
+    c = HyperLogLog()
+    c.update(np.array([1, 2, 3]))
+    c.update(np.array([1.0, 2.0, 3.0]))
+    c.update(np.array(["x", "y"], dtype=object))
+    assert c.count() == 5
+
+
+def test_kll_rank_error_within_bound():
+    rng = np.random.default_rng(3)
+    values = rng.normal(100, 15, N)
+    parts = [KLLSketch(k=200, seed=i) for i in range(4)]
+    for sketch, chunk in zip(parts, np.array_split(values, 4)):
+        for piece in np.array_split(chunk, 10):
+            sketch.update(piece)
+    merged = parts[0]
+    for sketch in parts[1:]:
+        merged.merge(sketch)
+
+    assert merged.n == N
+    assert sum(map(len, merged.levels)) < 4 * 200
+    ordered = np.sort(values)
+    qs = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+    for q, estimate in zip(qs, merged.quantiles(qs)):
+        rank = np.searchsorted(ordered, estimate) / N
+        assert abs(rank - q) <= 2 * 1.7 / 200
+
+    edges, counts = merged.histogram(10)
+    exact, _ = np.histogram(values, bins=edges)
+    assert sum(counts) == pytest.approx(N, abs=10)
+    assert np.abs(np.array(counts) - exact).max() <= 0.02 * N
+
+
+def test_space_saving_finds_heavy_hitters():
+    rng = np.random.default_rng(5)
+    tail = rng.integers(100, 100000, N)
+    values = np.concatenate([np.full(20000, 1), np.full(15000, 2), np.full(10000, 3), tail])
+    rng.shuffle(values)
+    halves = [SpaceSaving(capacity=50), SpaceSaving(capacity=50)]
+    for sketch, half in zip(halves, np.array_split(values, 2)):
+        for chunk in np.array_split(half, 20):
+            sketch.update(chunk)
+    halves[0].merge(halves[1])
+
+    top = halves[0].top(3)
+    assert [value for value, _, _ in top] == [1, 2, 3]
+    for value, count, error in top:
+        true = int((values == value).sum())
+        assert count - error <= true <= count
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    rng = np.random.default_rng(9)
+    rows = 30000
+    df = pd.DataFrame({
+        "day": pd.date_range("2024-01-01", periods=rows, freq="h").strftime("%Y-%m-%d"),
+        "region": rng.choice(["north", "south", "east"], rows, p=[0.6, 0.3, 0.1]),
+        "sales": rng.gamma(2.0, 50.0, rows),
+    })
+    df.loc[::100, "sales"] = None
+    db_path = str(tmp_path / "analyst.db")
+    conn = sqlite3.connect(db_path)
+    df.to_sql("data_table", conn, index=False, dtype={"sales": "REAL"})
+    conn.close()
+    monkeypatch.setattr(tools.sql_tool, "DB_PATH", db_path)
+    monkeypatch.setattr(tools.profiler, "DB_PATH", db_path)
+    tools.profiler.profile_cache.clear()
+    yield df
+    tools.profiler.profile_cache.clear()
+
+
+def test_profile_matches_exact_statistics(table):
+    profile = profile_table(workers=4, chunk_rows=2000)
+    assert profile["rows"] == len(table)
+    assert profile["workers"] == 4
+    sales, region, day = (profile["columns"][c] for c in ("sales", "region", "day"))
+
+    assert sales["type"] == "numeric"
+    assert sales["nulls"] == table["sales"].isna().sum()
+    assert sales["mean"] == pytest.approx(table["sales"].mean())
+    assert sales["std"] == pytest.approx(table["sales"].std(ddof=0))
+    assert sales["min"] == table["sales"].min() and sales["max"] == table["sales"].max()
+    assert sales["quantiles"]["p50"] == pytest.approx(table["sales"].median(), rel=0.05)
+
+    assert region["type"] == "text" and region["distinct"] == 3
+    assert region["top_values"][0] == {"value": "north", "count": int((table["region"] == "north").sum())}
+    assert day["type"] == "date"
+    assert (day["min"], day["max"]) == (table["day"].min(), table["day"].max())
+    assert day["distinct"] == pytest.approx(table["day"].nunique(), rel=0.05)
+
+    assert "- region (text): ~3 distinct, 0 nulls; most common: north (6" in describe_profile(profile)
+
+
+def test_profile_is_the_same_with_one_worker(table):
+    parallel = profile_table(workers=4, chunk_rows=2000)
+    tools.profiler.profile_cache.clear()
+    serial = profile_table(workers=1, chunk_rows=2000)
+    for name in ("count", "nulls", "distinct", "min", "max", "top_values"):
+        assert parallel["columns"]["region"][name] == serial["columns"]["region"][name]
+    assert parallel["columns"]["sales"]["mean"] == pytest.approx(serial["columns"]["sales"]["mean"])
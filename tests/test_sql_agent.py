@@ -0,0 +1,67 @@
+"""
+LLM SQL replies are cached only once the query they lead to validates, so
+retrying a question that ended in invalid SQL asks the LLM again.
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agents.sql_agent
+import tools.sql_tool
+from agents.base_agent import llm_cache
+from agents.sql_agent import SQLAgent
+
+VALID = "SELECT region, SUM(sales) FROM data_table GROUP BY region"
+INVALID = "SELECT regoin FROM data_table"
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "analyst.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE data_table (region TEXT, sales REAL)")
+    conn.close()
+    monkeypatch.setattr(tools.sql_tool, "DB_PATH", db_path)
+    monkeypatch.setattr(agents.sql_agent, "DB_PATH", db_path)
+    monkeypatch.setattr(agents.sql_agent, "NL2SQL_FAST_PATH", False)
+    llm_cache.clear()
+    yield SQLAgent()
+    llm_cache.clear()
+
+
+def _answer_with(agent, monkeypatch, replies: list) -> list:
+    calls = []
+
+    def invoke(template, llm_input):
+        calls.append(llm_input)
+        return replies[min(len(calls), len(replies)) - 1]
+
+    monkeypatch.setattr(agent, "_invoke_llm", invoke)
+    return calls
+
+
+def test_failed_sql_is_not_replayed(agent, monkeypatch):
+    calls = _answer_with(agent, monkeypatch, [INVALID])
+    state = agent.run({"user_query": "sales by region"})
+    assert state["sql_agent"]["validation_error"]
+    assert len(calls) == 1 + agents.sql_agent.SQL_REPAIR_ATTEMPTS
+
+    calls = _answer_with(agent, monkeypatch, [VALID])
+    state = agent.run({"user_query": "sales by region"})
+    assert len(calls) == 1
+    assert state["sql_agent"]["sql"] == VALID
+
+
+def test_validated_chain_is_cached(agent, monkeypatch):
+    calls = _answer_with(agent, monkeypatch, [INVALID, VALID])
+    assert agent.run({"user_query": "sales by region"})["sql_agent"]["sql"] == VALID
+    assert len(calls) == 2
+
+    # Generation and repair both come from the cache
+    calls = _answer_with(agent, monkeypatch, [INVALID])
+    assert agent.run({"user_query": "sales by region"})["sql_agent"]["sql"] == VALID
+    assert calls == []
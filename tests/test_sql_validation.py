@@ -0,0 +1,37 @@
+"""
+Double-quoted names that SQLite would read as string literals are
+rejected; names the query defines itself are not.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.sql_tool import _quoted_identifier_errors
+
+COLUMNS = ["region", "sales"]
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT region, SUM(sales) AS total FROM data_table GROUP BY region ORDER BY "total"',
+    'SELECT SUM(sales) AS "Total Sales" FROM data_table ORDER BY "Total Sales" DESC',
+    'SELECT "t"."region" FROM data_table AS t',
+    'SELECT "t"."region" FROM "data_table" "t"',
+    'SELECT region "r", COUNT(*) n FROM data_table ORDER BY "n"',
+    'WITH "agg" AS (SELECT region, SUM(sales) s FROM data_table GROUP BY 1) SELECT "s" FROM "agg"',
+    "SELECT region FROM data_table WHERE region = 'say \"hi\"'",
+])
+def test_accepts_defined_names(sql):
+    assert _quoted_identifier_errors(sql, COLUMNS) is None
+
+
+@pytest.mark.parametrize("sql, name", [
+    ('SELECT "Revenue" FROM data_table', "Revenue"),
+    ('SELECT region, "Revenue" FROM data_table', "Revenue"),
+    ('SELECT region FROM data_table WHERE region = "North"', "North"),
+    ('SELECT CASE WHEN sales > 1 THEN "High" ELSE "Low" END AS band FROM data_table', "High"),
+])
+def test_rejects_literal_names(sql, name):
+    assert _quoted_identifier_errors(sql, COLUMNS) == f'no such column: "{name}"'
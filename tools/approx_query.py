@@ -0,0 +1,411 @@
+"""
+Approximate answers to aggregate queries from a stratified sample.
+
+At ingest, large tables get a companion 'data_sample' table: a random sample
+stratified by one low-cardinality text column (small strata are over-sampled
+or kept whole), with per-stratum population and sample sizes in
+'data_sample_strata'.
+
+Queries of the form
+
+    SELECT <group exprs>, COUNT/SUM/TOTAL/AVG(...) FROM data_table
+    [WHERE ...] [GROUP BY ...] [ORDER BY ...] [LIMIT ...]
+
+are rewritten to collect per-stratum sums over the sample; totals are scaled
+by stratum weights and each aggregate gets an error bound (95% by default,
+see APPROX_CONFIDENCE_Z) from the stratified variance estimate (AVG via the
+ratio estimator). Anything else
+(joins, DISTINCT, MIN/MAX, HAVING, nested aggregates) is not rewritten and
+runs exactly.
+"""
+import math
+import re
+import sqlite3
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    SAMPLE_MIN_TABLE_ROWS,
+    SAMPLE_ROWS,
+    SAMPLE_MIN_PER_STRATUM,
+    SAMPLE_MAX_STRATA,
+    APPROX_CONFIDENCE_Z,
+)
+
+SAMPLE_TABLE = "data_sample"
+STRATA_TABLE = "data_sample_strata"
+STRATUM_COL = "_stratum"
+ALL_ROWS = "(all)"
+NULL_STRATUM = "(null)"
+
+CLAUSES = ("FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT")
+AGGREGATE = re.compile(r"^(COUNT|SUM|TOTAL|AVG)\s*\((.*)\)$", re.IGNORECASE | re.DOTALL)
+ANY_AGGREGATE = re.compile(r"\b(COUNT|SUM|TOTAL|AVG|MIN|MAX|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+UNSUPPORTED = re.compile(r"\b(JOIN|UNION|INTERSECT|EXCEPT|WINDOW|OVER|DISTINCT|WITH)\b", re.IGNORECASE)
+ALIAS = re.compile(r'^(.*?)\s+AS\s+("(?:[^"]|"")+"|\w+)$', re.IGNORECASE | re.DOTALL)
+
+
+# -----------------------------------------------------
+# Sample maintenance (called at ingest)
+# -----------------------------------------------------
+
+def _strata_column(df: pd.DataFrame) -> Optional[str]:
+    for col in df.columns:
+        s = df[col]
+        if (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)) \
+                and 1 < s.nunique(dropna=False) <= SAMPLE_MAX_STRATA:
+            return col
+    return None
+
+
+def build_sample_table(conn: sqlite3.Connection, df: pd.DataFrame, seed: int = 0) -> Optional[dict]:
+    """
+    Replaces the sample tables for a freshly loaded data_table. Returns
+    {"strata_column", "population_rows", "sample_rows"}, or None when the
+    table is small enough to always be queried exactly.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}")
+    conn.execute(f"DROP TABLE IF EXISTS {STRATA_TABLE}")
+    if len(df) < SAMPLE_MIN_TABLE_ROWS:
+        conn.commit()
+        return None
+
+    strata_col = _strata_column(df)
+    if strata_col is None:
+        stratum = pd.Series(ALL_ROWS, index=df.index)
+    else:
+        stratum = df[strata_col].astype(object).where(df[strata_col].notna(), NULL_STRATUM).astype(str)
+    codes, labels = pd.factorize(stratum, sort=True)
+    population = np.bincount(codes, minlength=len(labels))
+
+    # Proportional allocation with a floor, so rare strata still get rows
+    share = np.round(SAMPLE_ROWS * population / len(df)).astype(np.int64)
+    allocated = np.minimum(population, np.maximum(share, SAMPLE_MIN_PER_STRATUM))
+
+    # Random order within each stratum; keep the first `allocated` rows
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(df)), codes))
+    starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+    rank = np.arange(len(df)) - starts[codes[order]]
+    chosen = np.sort(order[rank < allocated[codes[order]]])
+
+    sample = df.iloc[chosen].assign(**{STRATUM_COL: stratum.iloc[chosen].to_numpy()})
+    sample.to_sql(SAMPLE_TABLE, conn, if_exists="replace", index=False)
+    pd.DataFrame({
+        STRATUM_COL: labels.astype(str),
+        "population": population,
+        "sample": allocated,
+    }).to_sql(STRATA_TABLE, conn, if_exists="replace", index=False)
+    conn.commit()
+
+    info = {"strata_column": strata_col, "population_rows": len(df), "sample_rows": len(chosen)}
+    print(f"[Approx] Sampled {len(chosen)} of {len(df)} rows"
+          + (f", stratified by '{strata_col}'." if strata_col else "."))
+    return info
+
+
+# -----------------------------------------------------
+# Query rewriting
+# -----------------------------------------------------
+
+def _mask(sql: str) -> str:
+    """
+    Same-length copy of sql with quoted text and parenthesized content
+    blanked, so clause keywords and commas can be found at the top level.
+    """
+    out = []
+    depth = 0
+    quote = None
+    for ch in sql:
+        if quote:
+            out.append(" ")
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`[":
+            quote = "]" if ch == "[" else ch
+            out.append(" ")
+        elif ch == "(":
+            depth += 1
+            out.append("(")
+        elif ch == ")":
+            depth -= 1
+            out.append(")")
+        else:
+            out.append(" " if depth else ch)
+    return "".join(out)
+
+
+def _split(text: str) -> list:
+    masked = _mask(text)
+    parts, start = [], 0
+    for i, ch in enumerate(masked):
+        if ch == ",":
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+def _clauses(sql: str) -> Optional[dict]:
+    masked = _mask(sql).upper()
+    if not re.match(r"^\s*SELECT\b", masked) or UNSUPPORTED.search(masked) or ";" in masked.rstrip(" ;"):
+        return None
+    found = []
+    for clause in CLAUSES:
+        matches = list(re.finditer(r"\b" + clause.replace(" ", r"\s+") + r"\b", masked))
+        if len(matches) > 1:
+            return None
+        if matches:
+            found.append((matches[0].start(), matches[0].end(), clause))
+    found.sort()
+    if [c for _, _, c in found] != [c for c in CLAUSES if c in {f[2] for f in found}]:
+        return None   # clauses out of order
+
+    parts = {"SELECT": sql[re.match(r"^\s*SELECT\b", masked).end():found[0][0] if found else len(sql)]}
+    for i, (_, end, clause) in enumerate(found):
+        stop = found[i + 1][0] if i + 1 < len(found) else len(sql)
+        parts[clause] = sql[end:stop].strip().rstrip(";").strip()
+    return parts
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name
+
+
+def _normalize(expr: str) -> str:
+    return re.sub(r"\s+", " ", expr.strip()).lower()
+
+
+def plan_query(sql: str) -> Optional[dict]:
+    """
+    Parsed form of a rewritable aggregate query, or None.
+    """
+    parts = _clauses(sql)
+    if not parts or "HAVING" in parts:
+        return None
+    if _normalize(parts.get("FROM", "")).strip('"') != "data_table":
+        return None
+
+    items = []
+    for raw in _split(parts["SELECT"]):
+        if not raw or raw == "*":
+            return None
+        m = ALIAS.match(raw)
+        # Only a top-level AS names the item (not e.g. CAST(x AS REAL))
+        if m and _mask(m.group(1)).count("(") == _mask(m.group(1)).count(")"):
+            expr, name = m.group(1).strip(), _unquote(m.group(2))
+        elif re.fullmatch(r'"(?:[^"]|"")*"', raw):
+            # SQLite names a bare quoted column after the column itself
+            expr, name = raw, _unquote(raw)
+        else:
+            expr, name = raw, raw
+        agg = AGGREGATE.match(expr)
+        # The call must span the whole expression, e.g. not SUM(a) / SUM(b)
+        if agg and re.fullmatch(r"\w+\s*\(\s*\)", _mask(expr)):
+            func, arg = agg.group(1).upper(), agg.group(2).strip()
+            if not arg or ANY_AGGREGATE.search(arg) or re.match(r"DISTINCT\b", arg, re.IGNORECASE) \
+                    or (arg == "*" and func != "COUNT"):
+                return None
+            items.append({"kind": "agg", "func": func, "arg": arg, "expr": expr, "name": name})
+        elif ANY_AGGREGATE.search(expr):
+            return None
+        else:
+            items.append({"kind": "key", "expr": expr, "name": name})
+
+    keys = [it for it in items if it["kind"] == "key"]
+    if not any(it["kind"] == "agg" for it in items):
+        return None
+
+    # Group terms may be positions or aliases of select items; the sample
+    # query renames the items, so use their expressions
+    aliases = {_normalize(it["name"]): it for it in keys if it["name"] != it["expr"]}
+    group_by = []
+    if "GROUP BY" in parts:
+        for term in _split(parts["GROUP BY"]):
+            if term.isdigit():
+                position = int(term) - 1
+                if not 0 <= position < len(items) or items[position]["kind"] != "key":
+                    return None
+                term = items[position]["expr"]
+            elif _normalize(_unquote(term)) in aliases:
+                term = aliases[_normalize(_unquote(term))]["expr"]
+            if not term or ANY_AGGREGATE.search(term):
+                return None
+            group_by.append(term)
+    elif keys:
+        return None
+
+    order_by = []
+    if "ORDER BY" in parts:
+        for term in _split(parts["ORDER BY"]):
+            m = re.fullmatch(r"(.*?)(?:\s+(ASC|DESC))?", term, re.IGNORECASE | re.DOTALL)
+            expr, descending = m.group(1).strip(), (m.group(2) or "").upper() == "DESC"
+            if expr.isdigit():
+                position = int(expr) - 1
+            else:
+                target = _normalize(_unquote(expr))
+                position = next((i for i, it in enumerate(items)
+                                 if target in (_normalize(it["name"]), _normalize(it["expr"]))), -1)
+            if not 0 <= position < len(items):
+                return None
+            order_by.append((position, descending))
+
+    limit = offset = None
+    if "LIMIT" in parts:
+        m = re.fullmatch(r"(\d+)(?:\s+OFFSET\s+(\d+)|\s*,\s*(\d+))?", parts["LIMIT"], re.IGNORECASE)
+        if not m:
+            return None
+        if m.group(3) is not None:
+            offset, limit = int(m.group(1)), int(m.group(3))
+        else:
+            limit, offset = int(m.group(1)), int(m.group(2) or 0)
+
+    return {
+        "items": items,
+        "where": parts.get("WHERE"),
+        "group_by": group_by,
+        "order_by": order_by,
+        "limit": limit,
+        "offset": offset or 0,
+    }
+
+
+def _sample_sql(plan: dict) -> str:
+    """
+    Per (group, stratum) sums over the sample: for each aggregate the sum
+    and sum of squares of its per-row contribution y (and, for AVG, the
+    count x of non-null values).
+    """
+    select = []
+    for i, it in enumerate(plan["items"]):
+        if it["kind"] == "key":
+            select.append(f"{it['expr']} AS \"_k{i}\"")
+            continue
+        arg = it["arg"]
+        if it["func"] == "COUNT":
+            y = "1" if arg == "*" else f"(CASE WHEN ({arg}) IS NOT NULL THEN 1 ELSE 0 END)"
+        else:
+            y = f"COALESCE(({arg}), 0)"
+        select.append(f"SUM({y}) AS \"_y{i}\"")
+        select.append(f"SUM({y} * {y}) AS \"_yy{i}\"")
+        if it["func"] == "AVG":
+            select.append(f"SUM(CASE WHEN ({arg}) IS NOT NULL THEN 1 ELSE 0 END) AS \"_x{i}\"")
+    # Group terms are selected separately: they need not be select items
+    for j, term in enumerate(plan["group_by"]):
+        select.append(f"{term} AS \"_g{j}\"")
+    select.append(f"{STRATUM_COL} AS \"_s\"")
+
+    sql = f"SELECT {', '.join(select)} FROM {SAMPLE_TABLE}"
+    if plan["where"]:
+        sql += f" WHERE {plan['where']}"
+    return sql + f" GROUP BY {', '.join(plan['group_by'] + [STRATUM_COL])}"
+
+
+def _stratum_variance(frame: pd.DataFrame, sums: pd.Series, squares: pd.Series) -> pd.Series:
+    """
+    Per (group, stratum) term N_h^2 (1 - n_h/N_h) s_h^2 / n_h of the variance
+    of an estimated total; rows outside the group count as 0 in s_h^2.
+    """
+    n, N = frame["sample"], frame["population"]
+    s2 = ((squares - sums ** 2 / n) / (n - 1).clip(lower=1)).clip(lower=0)
+    return (N ** 2 * (1 - n / N) * s2 / n).where(n > 1, 0.0)
+
+
+def execute_approximate(conn: sqlite3.Connection, sql: str) -> Optional[dict]:
+    """
+    Runs sql approximately on the sample. Returns a sql_result dict with an
+    extra "approximate" entry, or None if the query can't be approximated
+    or there is no sample.
+    """
+    plan = plan_query(sql)
+    if plan is None:
+        return None
+    try:
+        strata = pd.read_sql(f"SELECT * FROM {STRATA_TABLE}", conn)
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None
+
+    sample_sql = _sample_sql(plan)
+    print(f"[Approx] Executing on sample: {sample_sql}")
+    cursor = conn.execute(sample_sql)
+    frame = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+    frame = frame.merge(strata.rename(columns={STRATUM_COL: "_s"}), on="_s", how="left")
+    weight = frame["population"] / frame["sample"]
+
+    items = plan["items"]
+    # Groups are those of the query's GROUP BY, whichever keys are selected
+    groups_by = [f"_g{j}" for j in range(len(plan["group_by"]))]
+    by = [frame[g] for g in groups_by] or [pd.Series(0, index=frame.index)]
+
+    for i, it in enumerate(items):
+        if it["kind"] == "key":
+            continue
+        y, yy = frame[f"_y{i}"], frame[f"_yy{i}"]
+        frame[f"_t{i}"] = y * weight
+        if it["func"] == "AVG":
+            x = frame[f"_x{i}"]
+            frame[f"_c{i}"] = x * weight
+            # Linearized ratio estimator: z = y - R x, where x is 0/1 and y is 0 whenever x is
+            groups = frame.groupby(by, sort=False, dropna=False)
+            ratio = groups[f"_t{i}"].transform("sum") / groups[f"_c{i}"].transform("sum")
+            ratio = ratio.fillna(0)
+            frame[f"_v{i}"] = _stratum_variance(frame, y - ratio * x, yy - 2 * ratio * y + ratio ** 2 * x)
+        else:
+            frame[f"_v{i}"] = _stratum_variance(frame, y, yy)
+
+    grouped = frame.groupby(by, sort=False, dropna=False)
+    out = {}
+    for i, it in enumerate(items):
+        if it["kind"] == "key":
+            out[f"c{i}"] = grouped[f"_k{i}"].first().to_numpy()
+            continue
+        total = grouped[f"_t{i}"].sum().to_numpy()
+        variance = grouped[f"_v{i}"].sum().to_numpy()
+        if it["func"] == "AVG":
+            count = grouped[f"_c{i}"].sum().to_numpy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                estimate = np.where(count > 0, total / count, np.nan)
+                variance = np.where(count > 0, variance / count ** 2, 0.0)
+        elif it["func"] == "COUNT":
+            estimate = np.round(total).astype(np.int64)
+        else:
+            estimate = total
+        out[f"c{i}"] = estimate
+        out[f"e{i}"] = APPROX_CONFIDENCE_Z * np.sqrt(variance)
+    out = pd.DataFrame(out)
+
+    if out.empty and not groups_by:
+        # An aggregate without GROUP BY always returns one row
+        out = pd.DataFrame([{
+            **{f"c{i}": (0 if it["func"] == "COUNT" else None) for i, it in enumerate(items)},
+            **{f"e{i}": 0.0 for i, it in enumerate(items) if it["kind"] == "agg"},
+        }])
+
+    if plan["order_by"]:
+        out = out.sort_values(
+            [f"c{p}" for p, _ in plan["order_by"]],
+            ascending=[not desc for _, desc in plan["order_by"]],
+            kind="stable",
+            na_position="first",
+        )
+    start = plan["offset"]
+    stop = start + plan["limit"] if plan["limit"] is not None else None
+    out = out.iloc[start:stop]
+
+    values = out[[f"c{i}" for i in range(len(items))]]
+    rows = [tuple(r) for r in values.astype(object).where(values.notna(), None).itertuples(index=False)]
+    bounds = {it["name"]: [float(v) for v in out[f"e{i}"]] for i, it in enumerate(items) if it["kind"] == "agg"}
+
+    return {
+        "columns": [it["name"] for it in items],
+        "rows": rows,
+        "error": None,
+        "approximate": {
+            "sample_rows": int(strata["sample"].sum()),
+            "population_rows": int(strata["population"].sum()),
+            "confidence": round(math.erf(APPROX_CONFIDENCE_Z / math.sqrt(2)), 3),
+            "bounds": bounds,
+        },
+    }
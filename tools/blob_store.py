@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from config.settings import BLOB_DIR, BLOB_MEMORY_MAX_BYTES, BLOB_DISK_MAX_BYTES
+from tools.disk_gc import trim_files
+
+HANDLE_PREFIX = "blob:"
+
+
+def is_blob_handle(value) -> bool:
+    return isinstance(value, str) and value.startswith(HANDLE_PREFIX)
+
+
+class BlobStore:
+    """
+    Content-addressed store for binary artifacts (chart images).
+    Bytes are written once to disk under their sha256; a bounded in-memory
+    LRU tier serves repeat reads. State only ever carries the short handle
+    ("blob:<sha256>.<ext>"), so history and deep copies stay small.
+    The disk tier is bounded by disk_max_bytes: reads refresh a blob's
+    mtime, and the least recently used blobs are deleted when the directory
+    outgrows the limit (a handle to a deleted blob then reads as missing).
+    """
+
+    def __init__(self, blob_dir: Path = BLOB_DIR, memory_max_bytes: int = BLOB_MEMORY_MAX_BYTES,
+                 disk_max_bytes: int = BLOB_DISK_MAX_BYTES):
+        self.blob_dir = Path(blob_dir)
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None   # scanned on the first write
+        self._lock = threading.Lock()
+        self._gc_lock = threading.Lock()
+
+    def _name(self, handle: str) -> str:
+        if not is_blob_handle(handle):
+            raise ValueError(f"Not a blob handle: {handle!r}")
+        name = handle[len(HANDLE_PREFIX):]
+        if "/" in name or "\\" in name or name.startswith("."):
+            raise ValueError(f"Invalid blob handle: {handle!r}")
+        return name
+
+    def path(self, handle: str) -> Path:
+        name = self._name(handle)
+        return self.blob_dir / name[:2] / name
+
+    def _remember(self, handle: str, data: bytes) -> None:
+        if len(data) > self.memory_max_bytes:
+            return
+        with self._lock:
+            if handle in self._memory:
+                self._memory.move_to_end(handle)
+                return
+            self._memory[handle] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def put(self, data: bytes, ext: str = "png") -> str:
+        """
+        Stores bytes and returns their handle. Identical content maps to the
+        same handle and is only written once.
+        """
+        handle = f"{HANDLE_PREFIX}{hashlib.sha256(data).hexdigest()}.{ext}"
+        path = self.path(handle)
+        if not self.touch(handle):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._collect(len(data))
+        self._remember(handle, data)
+        return handle
+
+    def touch(self, handle: str) -> bool:
+        """
+        Marks a blob as recently used; False if it is not on disk.
+        """
+        try:
+            os.utime(self.path(handle))
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _collect(self, added: int) -> None:
+        """
+        Counts a newly written blob and evicts the least recently used ones
+        once the directory is over disk_max_bytes (down to 90% of it).
+        """
+        with self._gc_lock:
+            if self._disk_bytes is not None and self._disk_bytes + added <= self.disk_max_bytes:
+                self._disk_bytes += added
+                return
+            paths = (p for p in self.blob_dir.glob("*/*") if p.suffix != ".tmp")
+            self._disk_bytes = trim_files(paths, self.disk_max_bytes, int(self.disk_max_bytes * 0.9))
+
+    def get(self, handle: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(handle)
+            if data is not None:
+                self._memory.move_to_end(handle)
+        if data is not None:
+            # Keeps the disk copy (read through path()) from looking unused
+            self.touch(handle)
+            return data
+        try:
+            data = self.path(handle).read_bytes()
+        except (OSError, ValueError) as e:
+            print(f"[Blob Store] Read failed for {handle}: {e}")
+            return None
+        self.touch(handle)
+        self._remember(handle, data)
+        return data
+
+
+blob_store = BlobStore()
+
+
+def chart_image_handle(chart: dict, profile: str) -> Optional[str]:
+    """
+    Picks the handle for an output profile from a chart entry, falling back
+    to any other rendered profile.
+    """
+    images = chart.get("images") or {}
+    return images.get(profile) or next(iter(images.values()), None)
+
+
+def load_chart_image(chart: dict, profile: str = "thumb") -> Optional[bytes]:
+    """
+    Returns raw image bytes for a chart entry in shared_state.
+    """
+    handle = chart_image_handle(chart, profile)
+    if not handle:
+        return None
+    return blob_store.get(handle)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from config.settings import CHART_CACHE_DIR, CHART_CACHE_MAX_BYTES
+from tools.disk_gc import trim_files
+
+
+def chart_cache_key(df: pd.DataFrame, spec: dict, options: dict) -> str:
+    """
+    Content hash of a chart render: the spec, the render options and the
+    data of the referenced columns only (other columns don't affect the image).
+    Charts drawing more than x and y list their columns in spec["columns"].
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({"spec": spec, "options": options}, sort_keys=True, default=str).encode("utf-8"))
+
+    referenced = spec.get("columns") or (spec.get("x_col"), spec.get("y_col"))
+    cols = [c for c in dict.fromkeys(referenced) if c in df.columns]
+    for col in cols:
+        h.update(str(col).encode("utf-8"))
+        h.update(str(df[col].dtype).encode("utf-8"))
+        # Vectorized per-row hash; cheap compared to re-rendering
+        h.update(pd.util.hash_pandas_object(df[col], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ChartRenderCache:
+    """
+    Bounded on-disk cache of rendered charts: each entry holds the blob
+    handle of the rendered image (tools.blob_store keeps the bytes).
+    File mtime doubles as the LRU clock: hits touch the file, and the oldest
+    files are evicted once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: Path = CHART_CACHE_DIR, max_bytes: int = CHART_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None   # scanned on the first write
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._evict(len(data))
+        except OSError as e:
+            print(f"[Chart Cache] Write failed: {e}")
+
+    def _evict(self, added: int) -> None:
+        """
+        Counts a newly written entry and evicts the least recently used ones
+        once the directory is over max_bytes (down to 90% of it). The
+        directory is only scanned on the first write and when trimming.
+        """
+        with self._lock:
+            if self._bytes is not None and self._bytes + added <= self.max_bytes:
+                self._bytes += added
+                return
+            self._bytes = trim_files(self.cache_dir.glob("*.bin"), self.max_bytes, int(self.max_bytes * 0.9))
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self.cache_dir.glob("*.bin"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._bytes = None
+
+
+chart_cache = ChartRenderCache()
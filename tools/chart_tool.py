@@ -1,54 +1,332 @@
 import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import io
-import base64
+import numpy as np
 import pandas as pd
 
-def generate_chart_tool(rows, columns, chart_type, x_col, y_col, title):
+from config.settings import MAX_CHART_POINTS, MAX_CHART_CATEGORIES, CHART_THUMB_DPI
+from tools.chart_cache import chart_cache, chart_cache_key
+from tools.blob_store import blob_store, is_blob_handle
+from tools.result_store import rows_frame, is_spilled
+
+OTHER_LABEL = "Other"
+
+# Everything besides the spec and data that changes the rendered image
+RENDER_OPTIONS = {
+    "figsize": (10, 6),
+    "max_points": MAX_CHART_POINTS,
+    "max_categories": MAX_CHART_CATEGORIES,
+}
+
+# Output profiles saved from a single plotting pass:
+# - thumb: low-DPI raster for the Streamlit grid
+# - vector: SVG (text kept as text) for embedding in the PDF report
+# - full: the original full-size PNG
+CHART_PROFILES = {
+    "thumb": {"format": "png", "dpi": CHART_THUMB_DPI},
+    "vector": {"format": "svg", "dpi": 72, "metadata": {"Date": None}},
+    "full": {"format": "png", "dpi": 100},
+}
+DEFAULT_PROFILES = ("thumb", "vector")
+
+# Text stays text in SVG output. Set once: rcParams are process-global, so
+# switching them per render (rc_context) would race between threads.
+matplotlib.rcParams["svg.fonttype"] = "none"
+
+
+def _new_figure() -> tuple:
+    """
+    (figure, axes) of a standalone figure. Charts are rendered from several
+    threads at once (pipeline stages, API workers, speculative runs), so
+    they never touch pyplot's shared current-figure state.
+    """
+    fig = Figure(figsize=RENDER_OPTIONS["figsize"])
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _minmax_decimate(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    Returns sorted row indices keeping the min and max of each of n_buckets
+    equal-width buckets, so peaks and troughs survive the reduction.
     """
-    Generates a matplotlib chart and returns the base64 encoded PNG string.
+    n = len(y)
+    starts = np.unique(np.linspace(0, n, n_buckets, endpoint=False).astype(np.int64))
+    lengths = np.diff(np.append(starts, n))
+    bucket = np.repeat(np.arange(len(starts)), lengths)
+
+    # Sort by (bucket, y): each bucket's first slot is its min, last slot its max
+    order = np.lexsort((y, bucket))
+    keep = np.concatenate([order[starts], order[starts + lengths - 1], [0, n - 1]])
+    return np.unique(keep)
+
+
+def _top_n_with_other(df: pd.DataFrame, x_col: str, y_col: str, max_categories: int) -> pd.DataFrame:
+    """
+    Sums y per category, keeps the largest (max_categories - 1) and folds the
+    remainder into a single "Other" bucket.
+    """
+    grouped = df.groupby(x_col, sort=False)[y_col].sum()
+    if len(grouped) <= max_categories:
+        return grouped.reset_index()
+
+    values = grouped.to_numpy()
+    top = np.argpartition(-values, max_categories - 1)[:max_categories - 1]
+    top = top[np.argsort(-values[top])]
+    rest = np.ones(len(values), dtype=bool)
+    rest[top] = False
+
+    reduced = grouped.iloc[top].reset_index()
+    reduced[x_col] = reduced[x_col].astype(str)
+    other = pd.DataFrame({x_col: [OTHER_LABEL], y_col: [values[rest].sum()]})
+    return pd.concat([reduced, other], ignore_index=True)
+
+
+def _reduce_for_chart(df, chart_type, x_col, y_col, max_points=MAX_CHART_POINTS,
+                      max_categories=MAX_CHART_CATEGORIES):
+    """
+    Data-reduction stage run before plotting so render cost is capped by the
+    point budget instead of the result size.
+    Returns (reduced_df, use_hexbin).
+    """
+    y_numeric = pd.api.types.is_numeric_dtype(df[y_col])
+
+    if chart_type in ("bar", "pie"):
+        if not y_numeric:
+            return df.iloc[:max_categories], False
+        if len(df) > max_categories:
+            return _top_n_with_other(df, x_col, y_col, max(max_categories, 2)), False
+        return df, False
+
+    if len(df) <= max_points:
+        return df, False
+
+    x_numeric = pd.api.types.is_numeric_dtype(df[x_col]) or pd.api.types.is_datetime64_any_dtype(df[x_col])
+
+    if chart_type == "scatter":
+        if x_numeric and y_numeric:
+            # Too dense to read as points: bin in 2D instead
+            return df.dropna(subset=[x_col, y_col]), True
+        stride = int(np.ceil(len(df) / max_points))
+        return df.iloc[::stride], False
+
+    # Line (and default) charts
+    if not y_numeric:
+        stride = int(np.ceil(len(df) / max_points))
+        return df.iloc[::stride], False
+
+    df = df.dropna(subset=[y_col])
+    if x_numeric:
+        df = df.sort_values(x_col, kind="stable")
+    if len(df) <= max_points:
+        return df, False
+    idx = _minmax_decimate(df[y_col].to_numpy(dtype=float), max(max_points // 2, 1))
+    return df.iloc[idx], False
+
+
+def _spilled_chart_frame(rows, columns, chart_type, x_col, y_col, max_points=MAX_CHART_POINTS,
+                         max_categories=MAX_CHART_CATEGORIES) -> pd.DataFrame:
+    """
+    The x/y data of a result spilled to disk, already reduced the way
+    _reduce_for_chart would: aggregated, min/max-decimated or strided in
+    SQLite, so only about a chart's worth of rows is read back.
+    """
+    x, y = rows.column(columns, x_col), rows.column(columns, y_col)
+    probe = rows.sample_frame(columns, max_points, select=[x_col, y_col])
+    y_numeric = pd.api.types.is_numeric_dtype(probe[y_col])
+    x_numeric = pd.api.types.is_numeric_dtype(probe[x_col])
+
+    if chart_type in ("bar", "pie"):
+        if not y_numeric:
+            return rows.to_frame(columns, max_categories)[[x_col, y_col]]
+        return rows.select_frame(f"SELECT {x}, TOTAL({y}) FROM result GROUP BY {x}", [x_col, y_col])
+
+    if chart_type == "scatter" and x_numeric and y_numeric:
+        # Dense enough for a hexbin; a uniform sample shows the same density
+        return rows.sample_frame(columns, select=[x_col, y_col]).dropna()
+    if chart_type == "scatter" or not y_numeric:
+        return probe
+
+    # Line: min and max of each of max_points // 2 equal-count buckets (in
+    # x order when x is numeric), plus the first and last point
+    buckets = max(max_points // 2, 1)
+    order = x if x_numeric else "rowid"
+    return rows.select_frame(f"""
+        SELECT x, y FROM (
+            SELECT x, y, k, n,
+                   ROW_NUMBER() OVER (PARTITION BY k * {buckets} / n ORDER BY y, k) AS lo,
+                   ROW_NUMBER() OVER (PARTITION BY k * {buckets} / n ORDER BY y DESC, k) AS hi
+            FROM (
+                SELECT {x} AS x, {y} AS y,
+                       ROW_NUMBER() OVER (ORDER BY {order}) - 1 AS k, COUNT(*) OVER () AS n
+                FROM result WHERE {y} IS NOT NULL
+            )
+        )
+        WHERE lo = 1 OR hi = 1 OR k = 0 OR k = n - 1
+        ORDER BY k
+    """, [x_col, y_col])
+
+
+def _cached_profiles(df: pd.DataFrame, spec: dict, profiles) -> tuple:
+    """
+    Splits the requested profiles into cached images ({profile: handle})
+    and missing ones ({profile: cache key}) still to be rendered.
+    """
+    images = {}
+    missing = {}
+    for profile in profiles:
+        options = {**RENDER_OPTIONS, **CHART_PROFILES[profile]}
+        cache_key = chart_cache_key(df, spec, options)
+        cached = chart_cache.get(cache_key)
+        handle = cached.decode("utf-8", errors="replace") if cached is not None else None
+        # The blob may have been evicted since the entry was written
+        if is_blob_handle(handle) and blob_store.touch(handle):
+            images[profile] = handle
+        else:
+            missing[profile] = cache_key
+    return images, missing
+
+
+def _save_profiles(fig: Figure, missing: dict, images: dict) -> None:
+    """
+    Saves every missing profile from the figure.
+    """
+    for profile, cache_key in missing.items():
+        profile_opts = CHART_PROFILES[profile]
+        buf = io.BytesIO()
+        fig.savefig(buf, **profile_opts)
+        images[profile] = blob_store.put(buf.getvalue(), ext=profile_opts["format"])
+        chart_cache.put(cache_key, images[profile].encode("utf-8"))
+
+
+def generate_chart_tool(rows, columns, chart_type, x_col, y_col, title, profiles=DEFAULT_PROFILES):
+    """
+    Generates a matplotlib chart once and saves it in each requested output
+    profile. Returns {profile: blob handle}, or None on failure.
+    Large results are downsampled to MAX_CHART_POINTS before plotting, and
+    each profile's output is cached on disk keyed by spec, options and column data.
     """
     try:
         if not rows or not columns:
             return None
 
-        df = pd.DataFrame(rows, columns=columns)
-        
+        unknown = [p for p in profiles if p not in CHART_PROFILES]
+        if unknown:
+            print(f"[Chart Tool] Error: Unknown output profiles {unknown}.")
+            return None
+
         # Basic data validation
-        if x_col not in df.columns or y_col not in df.columns:
+        if x_col not in columns or y_col not in columns:
             print(f"[Chart Tool] Error: Columns {x_col} or {y_col} not found in data.")
             return None
 
-        plt.figure(figsize=(10, 6))
-        
+        if is_spilled(rows):
+            df = _spilled_chart_frame(rows, columns, chart_type, x_col, y_col)
+            print(f"[Chart Tool] Read {len(df)} of {len(rows)} spilled rows for '{chart_type}' chart.")
+        else:
+            df = rows_frame(rows, columns)
+
+        spec = {"type": chart_type, "x_col": x_col, "y_col": y_col, "title": title}
+        images, missing = _cached_profiles(df, spec, profiles)
+        if not missing:
+            return images
+
+        original_len = len(df)
+        df, use_hexbin = _reduce_for_chart(df, chart_type, x_col, y_col)
+        if use_hexbin:
+            print(f"[Chart Tool] Binning {original_len} rows into hexbin for '{chart_type}' chart.")
+        elif len(df) != original_len:
+            print(f"[Chart Tool] Reduced {original_len} rows to {len(df)} for '{chart_type}' chart.")
+
+        fig, ax = _new_figure()
+
         if chart_type == "bar":
-            plt.bar(df[x_col], df[y_col], color='skyblue')
+            ax.bar(df[x_col], df[y_col], color='skyblue')
         elif chart_type == "line":
-            plt.plot(df[x_col], df[y_col], marker='o', linestyle='-', color='green')
+            ax.plot(df[x_col], df[y_col], marker='o' if len(df) <= 100 else None,
+                    linestyle='-', color='green')
         elif chart_type == "scatter":
-            plt.scatter(df[x_col], df[y_col], color='red')
+            if use_hexbin:
+                # Rasterized inside vector outputs: thousands of hexagons bloat SVG
+                hexbin = ax.hexbin(df[x_col], df[y_col], gridsize=50, cmap='Reds', mincnt=1, rasterized=True)
+                fig.colorbar(hexbin, ax=ax, label="count")
+            else:
+                ax.scatter(df[x_col], df[y_col], color='red')
         elif chart_type == "pie":
-            plt.pie(df[y_col], labels=df[x_col], autopct='%1.1f%%')
+            ax.pie(df[y_col], labels=df[x_col], autopct='%1.1f%%')
         else:
             # Default to line
-            plt.plot(df[x_col], df[y_col])
+            ax.plot(df[x_col], df[y_col])
 
-        plt.title(title)
-        plt.xlabel(x_col)
-        plt.ylabel(y_col)
-        plt.tight_layout()
+        ax.set_title(title)
+        ax.set_xlabel(x_col)
+        ax.set_ylabel(y_col)
+        fig.tight_layout()
 
-        # Save to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        plt.close()
-        buf.seek(0)
-        
-        # Encode to base64
-        img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-        return img_base64
+        _save_profiles(fig, missing, images)
+        return images
 
     except Exception as e:
         print(f"[Chart Tool] Generation Failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def generate_forecast_chart(result, max_series=5, profiles=DEFAULT_PROFILES):
+    """
+    Charts a forecast_engine result: recent history as solid lines, the
+    forecast dashed with its 95% interval shaded, for the first max_series
+    series. Same output profiles and caching as generate_chart_tool.
+    """
+    try:
+        unknown = [p for p in profiles if p not in CHART_PROFILES]
+        if not result or unknown:
+            return None
+
+        series = result["series"][:max_series]
+        history = result["history"]
+        # Long table of everything drawn, so the cache key covers the data
+        frames = []
+        for s in series:
+            frames.append(pd.DataFrame({
+                "series": s["name"], "kind": "history",
+                "period": history["periods"], "value": history["values"][s["name"]],
+                "lower": np.nan, "upper": np.nan,
+            }))
+            frames.append(pd.DataFrame(s["forecast"]).assign(series=s["name"], kind="forecast"))
+        df = pd.concat(frames, ignore_index=True)
+        df["period"] = pd.to_datetime(df["period"])
+
+        columns = ["series", "kind", "period", "value", "lower", "upper"]
+        value_label = result["value_col"] or "value"
+        title = f"{value_label} forecast ({result['horizon']} {result['frequency']}s)"
+        spec = {"type": "forecast", "x_col": "period", "y_col": "value", "title": title, "columns": columns}
+        images, missing = _cached_profiles(df, spec, profiles)
+        if not missing:
+            return images
+
+        fig, ax = _new_figure()
+        for i, s in enumerate(series):
+            color = f"C{i}"
+            past = df[(df["series"] == s["name"]) & (df["kind"] == "history")]
+            future = df[(df["series"] == s["name"]) & (df["kind"] == "forecast")]
+            # Start the forecast line at the last observed point
+            joined = pd.concat([past.tail(1), future])
+            label = s["name"] if len(series) > 1 else value_label
+            ax.plot(past["period"], past["value"], color=color, label=label)
+            ax.plot(joined["period"], joined["value"], color=color, linestyle="--")
+            ax.fill_between(future["period"], future["lower"], future["upper"], color=color, alpha=0.15)
+
+        ax.set_title(title)
+        ax.set_xlabel(result["time_col"])
+        ax.set_ylabel(value_label)
+        if len(series) > 1:
+            ax.legend()
+        fig.tight_layout()
+
+        _save_profiles(fig, missing, images)
+        return images
+
+    except Exception as e:
+        print(f"[Chart Tool] Forecast chart failed: {e}")
+        return None
@@ -0,0 +1,35 @@
+import os
+
+
+def trim_files(paths, max_bytes: int, target_bytes: int) -> int:
+    """
+    Size-bounded garbage collection of a set of files, oldest first.
+    File mtime is the LRU clock (readers touch the files they use). If the
+    files add up to more than max_bytes, the least recently used are
+    removed until at most target_bytes remain; a target below the limit
+    leaves headroom, so a busy directory isn't rescanned on every write.
+    Returns the bytes left.
+    """
+    entries = []
+    total = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    if total <= max_bytes:
+        return total
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
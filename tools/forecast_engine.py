@@ -0,0 +1,359 @@
+"""
+Local forecasting on query results (numpy/pandas only).
+
+Detects a time column and numeric value columns, regularizes the series to
+their native frequency and fits three fast models to every series at once
+(series are the columns of one matrix, so grouped results cost the same
+Python-level work as a single series):
+
+- linear trend (least squares)
+- additive Holt-Winters (Holt's linear method when there is too little
+  history for a season), smoothing parameters picked from a small grid
+- seasonal naive
+
+The model for each series is chosen on a holdout of the most recent
+points, then refit on the full history. Intervals are approximate 95%
+prediction intervals from in-sample residuals.
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import FORECAST_MIN_POINTS, FORECAST_MAX_POINTS, FORECAST_MAX_SERIES
+
+Z_95 = 1.96
+
+# (largest median gap in days, pandas frequency, label, season length, default horizon)
+FREQUENCIES = [
+    (1.5 / 24, "h", "hour", 24, 24),
+    (1.5, "D", "day", 7, 14),
+    (10, "W", "week", 52, 8),
+    (45, "MS", "month", 12, 12),
+    (120, "QS", "quarter", 4, 4),
+    (float("inf"), "YS", "year", 1, 3),
+]
+
+DATE_LIKE = r"^\d{4}([-/]\d{1,2}([-/]\d{1,2})?)?([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?$"
+
+HW_ALPHAS = (0.2, 0.5, 0.8)
+HW_BETAS = (0.05, 0.2)
+HW_GAMMAS = (0.1, 0.3)
+
+
+def parse_times(s: pd.Series) -> pd.Series:
+    """
+    Datetimes of a column found by detect_time_column (unparseable -> NaT);
+    also used on later chunks of the same column.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return pd.to_datetime(s)
+    if pd.api.types.is_numeric_dtype(s):
+        # Years; a chunk with NULLs arrives as floats
+        years = pd.to_numeric(s, errors="coerce").astype("Int64").astype(str)
+        return pd.to_datetime(years, format="%Y", errors="coerce")
+    return pd.to_datetime(s.astype(str), errors="coerce", format="mixed")
+
+
+def detect_time_column(df: pd.DataFrame) -> tuple:
+    """
+    Returns (column, parsed datetimes) for the first column that holds
+    dates, date-like strings or years, else (None, None).
+    """
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col, parse_times(df[col])
+
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s) and "year" in str(col).lower():
+            if s.between(1800, 2200).all():
+                return col, parse_times(s)
+        elif s.dtype == object or pd.api.types.is_string_dtype(s):
+            sample = s.dropna().astype(str).head(200)
+            if sample.empty or not sample.str.match(DATE_LIKE).all():
+                continue
+            parsed = parse_times(s)
+            if parsed.notna().mean() >= 0.9:
+                return col, parsed
+    return None, None
+
+
+def detect_frequency(times: pd.Series) -> tuple:
+    unique = np.sort(times.dropna().unique())
+    if len(unique) < 2:
+        return None
+    gap_days = np.median(np.diff(unique).astype("timedelta64[s]").astype(np.float64)) / 86400
+    for max_gap, freq, label, season, horizon in FREQUENCIES:
+        if gap_days <= max_gap:
+            if freq == "W":
+                # Anchor weeks on the weekday the data uses
+                freq = f"W-{pd.Timestamp(unique[0]).day_name()[:3].upper()}"
+            return freq, label, season, horizon
+    return None
+
+
+def _period_sums(frames, time_col: str, value_cols: list, group_col: Optional[str]) -> pd.DataFrame:
+    """
+    Sums of the value column(s) per time (and group), one partial per
+    frame, combined at the end: only the partials are held in memory.
+    """
+    partials = []
+    for frame in frames:
+        frame = frame.assign(_t=parse_times(frame[time_col])).dropna(subset=["_t"])
+        if group_col is not None:
+            partials.append(frame.groupby(["_t", group_col])[value_cols[0]].sum())
+        else:
+            partials.append(frame.groupby("_t")[value_cols].sum())
+    if not partials:
+        return pd.DataFrame()
+    sums = pd.concat(partials).groupby(level=list(range(partials[0].index.nlevels))).sum()
+    return sums.unstack(group_col) if group_col is not None else sums
+
+
+def prepare_series(df: pd.DataFrame, frames=None) -> Optional[dict]:
+    """
+    Turns a query result into a regular (periods x series) matrix.
+    Series are the numeric columns, or one numeric column split by a
+    low-cardinality category column. Returns None if the result is not a
+    time series. When the result is too large to load, df is a sample used
+    to find the columns and frames yields the whole result in chunks.
+    """
+    time_col, times = detect_time_column(df)
+    if time_col is None:
+        return None
+
+    others = [c for c in df.columns if c != time_col]
+    value_cols = [
+        c for c in others
+        if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+    ]
+    if not value_cols:
+        return None
+    group_cols = [
+        c for c in others
+        if c not in value_cols and 1 < df[c].nunique() <= len(df) // max(FORECAST_MIN_POINTS, 1)
+    ]
+    group_col = group_cols[0] if group_cols else None
+
+    detected = detect_frequency(times)
+    if detected is None:
+        return None
+    freq, label, season, horizon = detected
+
+    if group_col is not None:
+        value_col = value_cols[0]
+    else:
+        # Several value columns are each their own series
+        value_col = value_cols[0] if len(value_cols) == 1 else None
+        value_cols = value_cols[:FORECAST_MAX_SERIES]
+    wide = _period_sums([df] if frames is None else frames, time_col, value_cols, group_col)
+    if wide.empty:
+        return None
+    if group_col is not None:
+        # Keep the largest series
+        totals = wide.abs().sum().sort_values(ascending=False)
+        wide = wide[totals.index[:FORECAST_MAX_SERIES]]
+        wide.columns = [str(c) for c in wide.columns]
+
+    # Regular periods; empty periods are interpolated
+    wide = wide.resample(freq).sum(min_count=1)
+    wide = wide.interpolate(limit_direction="both").tail(FORECAST_MAX_POINTS)
+    wide = wide.loc[:, wide.notna().all()]
+    if wide.shape[1] == 0 or len(wide) < FORECAST_MIN_POINTS:
+        return None
+
+    return {
+        "time_col": time_col,
+        "value_col": value_col,
+        "group_col": group_col,
+        "freq": freq,
+        "freq_label": label,
+        "season": season,
+        "horizon": min(horizon, max(len(wide) // 2, 1)),
+        "periods": wide.index,
+        "names": list(map(str, wide.columns)),
+        "Y": wide.to_numpy(dtype=np.float64),
+    }
+
+
+def _linear_trend(Y: np.ndarray, h: int) -> tuple:
+    T = len(Y)
+    x = np.arange(T, dtype=np.float64)
+    slope, intercept = np.polyfit(x, Y, 1)
+    resid = Y - (np.outer(x, slope) + intercept)
+    sigma = np.sqrt((resid ** 2).sum(axis=0) / max(T - 2, 1))
+
+    xf = np.arange(T, T + h, dtype=np.float64)
+    mean = np.outer(xf, slope) + intercept
+    leverage = 1 + 1 / T + (xf - x.mean()) ** 2 / ((x - x.mean()) ** 2).sum()
+    return mean, np.sqrt(leverage)[:, None] * sigma
+
+
+def _seasonal_naive(Y: np.ndarray, h: int, m: int) -> Optional[tuple]:
+    T = len(Y)
+    if m < 2 or T < 2 * m:
+        return None
+    steps = np.arange(h)
+    mean = Y[T - m + steps % m]
+    sigma = np.sqrt(((Y[m:] - Y[:-m]) ** 2).mean(axis=0))
+    return mean, np.sqrt(steps // m + 1)[:, None] * sigma
+
+
+def _holt_winters(Y: np.ndarray, h: int, m: int) -> tuple:
+    """
+    Additive Holt-Winters over a (alpha, beta, gamma) grid for all series
+    at once: state arrays are (grid, series), the loop runs over time only.
+    Returns (mean, se) using each series' lowest-SSE parameters.
+    """
+    T, S = Y.shape
+    seasonal = m >= 2 and T >= 2 * m
+    gammas = HW_GAMMAS if seasonal else (0.0,)
+    grid = np.array([(a, b, g) for a in HW_ALPHAS for b in HW_BETAS for g in gammas])
+    alpha, beta, gamma = (grid[:, i:i + 1] for i in range(3))   # (G, 1)
+    G = len(grid)
+
+    if seasonal:
+        level0 = Y[:m].mean(axis=0)
+        trend0 = (Y[m:2 * m].mean(axis=0) - level0) / m
+        # Initial seasonal indices with the first season's trend removed
+        ramp = (np.arange(m) - (m - 1) / 2)[:, None] * trend0
+        season = np.broadcast_to(Y[:m] - level0 - ramp, (G, m, S)).transpose(1, 0, 2).copy()   # (m, G, S)
+        # Level at the end of the first season, so the loop can start there
+        level0 = level0 + trend0 * (m - 1) / 2
+    else:
+        level0 = Y[0]
+        trend0 = Y[1] - Y[0]
+        season = np.zeros((1, G, S))
+    level = np.broadcast_to(level0, (G, S)).copy()
+    trend = np.broadcast_to(trend0, (G, S)).copy()
+    sse = np.zeros((G, S))
+
+    period = m if seasonal else 1
+    # The initial state describes the last point of the first season
+    # (or the first point), so updating starts right after it
+    start = m if seasonal else 1
+    for t in range(start, T):
+        s_t = season[t % period]
+        err = Y[t] - (level + trend + s_t)
+        sse += err ** 2
+        new_level = alpha * (Y[t] - s_t) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        if seasonal:
+            season[t % period] = gamma * (Y[t] - new_level) + (1 - gamma) * s_t
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    cols = np.arange(S)
+    steps = np.arange(1, h + 1)[:, None]
+    season_idx = (T + steps[:, 0] - 1) % period
+    mean = level[best, cols] + steps * trend[best, cols] + season[season_idx][:, best, cols]
+    sigma = np.sqrt(sse[best, cols] / max(T - start, 1))
+    return mean, np.sqrt(steps) * sigma
+
+
+def _fit_all(Y: np.ndarray, h: int, m: int) -> dict:
+    """
+    {model: (mean, se)} for every applicable model; arrays are (h, S).
+    """
+    models = {"linear_trend": _linear_trend(Y, h)}
+    models["holt_winters"] = _holt_winters(Y, h, m)
+    naive = _seasonal_naive(Y, h, m)
+    if naive is not None:
+        models["seasonal_naive"] = naive
+    return models
+
+
+def _format_period(p: pd.Timestamp, freq: str) -> str:
+    # Dates only, unless the series is hourly
+    return p.isoformat() if freq == "h" else p.strftime("%Y-%m-%d")
+
+
+def forecast(df: pd.DataFrame, frames=None) -> Optional[dict]:
+    """
+    Forecasts every series found in df (or, with frames, in the chunks of
+    a large result that df samples; see prepare_series). Returns None when
+    df is not a time series. The result holds the numbers narrated by
+    ForecastAgent and the recent history used for the chart.
+    """
+    prepared = prepare_series(df, frames)
+    if prepared is None:
+        return None
+
+    Y, h, m = prepared["Y"], prepared["horizon"], prepared["season"]
+    T, S = Y.shape
+
+    # Pick a model per series on a holdout of the latest points
+    holdout = max(1, min(h, T // 5))
+    train_models = _fit_all(Y[:-holdout], holdout, m)
+    names = list(train_models)
+    mae = np.stack([np.abs(train_models[n][0] - Y[-holdout:]).mean(axis=0) for n in names])   # (models, S)
+    choice = mae.argmin(axis=0)
+
+    full_models = _fit_all(Y, h, m)
+    cols = np.arange(S)
+    mean = np.stack([full_models[n][0] for n in names])[choice, :, cols].T      # (h, S)
+    se = np.stack([full_models[n][1] for n in names])[choice, :, cols].T
+    # Reported trend is the least-squares slope, whichever model forecasts
+    slope = np.polyfit(np.arange(T, dtype=np.float64), Y, 1)[0]
+
+    periods = prepared["periods"]
+    freq = prepared["freq"]
+    future = pd.date_range(periods[-1], periods=h + 1, freq=freq)[1:]
+    series = []
+    for j, name in enumerate(prepared["names"]):
+        series.append({
+            "name": name,
+            "model": names[choice[j]],
+            "holdout_mae": float(mae[choice[j], j]),
+            "last_period": _format_period(periods[-1], freq),
+            "last_value": float(Y[-1, j]),
+            "trend_per_period": float(slope[j]),
+            "forecast": [
+                {
+                    "period": _format_period(p, freq),
+                    "value": float(mean[k, j]),
+                    "lower": float(mean[k, j] - Z_95 * se[k, j]),
+                    "upper": float(mean[k, j] + Z_95 * se[k, j]),
+                }
+                for k, p in enumerate(future)
+            ],
+        })
+
+    history_len = min(T, 6 * h)
+    return {
+        "time_col": prepared["time_col"],
+        "value_col": prepared["value_col"],
+        "group_col": prepared["group_col"],
+        "frequency": prepared["freq_label"],
+        "horizon": h,
+        "history_points": T,
+        "series": series,
+        "history": {
+            "periods": [_format_period(p, freq) for p in periods[-history_len:]],
+            "values": {name: Y[-history_len:, j].tolist() for j, name in enumerate(prepared["names"])},
+        },
+    }
+
+
+def describe_forecast(result: dict, max_series: int = 5) -> str:
+    """
+    Plain-text summary of computed forecasts; the LLM narrates from this and
+    it is shown as-is if the LLM is unavailable.
+    """
+    lines = [
+        f"Forecast of {result['horizon']} {result['frequency']}s ahead from "
+        f"{result['history_points']} points"
+        + (f", per {result['group_col']}" if result["group_col"] else "") + ":"
+    ]
+    for s in result["series"][:max_series]:
+        end = s["forecast"][-1]
+        lines.append(
+            f"- {s['name']} ({s['model'].replace('_', ' ')}): last {s['last_value']:,.2f} "
+            f"at {s['last_period'][:10]}; {end['period'][:10]} forecast {end['value']:,.2f} "
+            f"(95% interval {end['lower']:,.2f} to {end['upper']:,.2f}); "
+            f"trend {s['trend_per_period']:+,.2f} per {result['frequency']}."
+        )
+    if len(result["series"]) > max_series:
+        lines.append(f"- ... and {len(result['series']) - max_series} more series.")
+    return "\n".join(lines)
@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from config.settings import (
+    HISTORY_DB_PATH,
+    HISTORY_CACHE_SESSIONS,
+    HISTORY_UNCOMPRESSED_TURNS,
+    HISTORY_RETENTION_DAYS,
+    HISTORY_SUMMARY_CHARS,
+)
+
+TURN_KEYS = ("user_query", "insight_agent", "forecast_agent", "chart_agent")
+
+
+def summarize_turn(item: dict, max_chars: int = HISTORY_SUMMARY_CHARS) -> dict:
+    """
+    Compact form of a turn kept in memory: the question, the start of the
+    insights and how many charts were produced.
+    """
+    insights = item.get("insight_agent", {}).get("insights", "") or ""
+    return {
+        "user_query": item.get("user_query", ""),
+        "summary": insights[:max_chars],
+        "charts": len(item.get("chart_agent", {}).get("charts", [])),
+    }
+
+
+def _decode(payload) -> dict:
+    # Compacted turns are compressed bytes, recent ones JSON text
+    return json.loads(zlib.decompress(payload) if isinstance(payload, bytes) else payload)
+
+
+class HistoryStore:
+    """
+    Session turn history in a local SQLite file.
+
+    Full turns (insights, forecast, chart handles) stay on disk and are only
+    read when needed, e.g. by the report job. Memory holds per-session
+    summaries for at most max_sessions recently used sessions (LRU).
+    Every turn is kept in full: those older than the newest
+    uncompressed_turns of a session are stored zlib-compressed (load()
+    returns them unchanged), and sessions idle for retention_days are
+    deleted.
+    """
+
+    def __init__(self, db_path: str, max_sessions: int, uncompressed_turns: int, retention_days: float):
+        self.db_path = str(db_path)
+        self.max_sessions = max_sessions
+        self.uncompressed_turns = uncompressed_turns
+        self.retention_days = retention_days
+        self._summaries = OrderedDict()   # session_id -> list of summaries
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._init_db(conn)
+                    self._initialized = True
+        return conn
+
+    def _init_db(self, conn: sqlite3.Connection) -> None:
+        # WAL lets report jobs read while the UI/API append
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                session_id TEXT NOT NULL,
+                turn INTEGER NOT NULL,
+                user_query TEXT,
+                summary TEXT,
+                payload TEXT NOT NULL,
+                compacted INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, turn)
+            )
+        """)
+        conn.commit()
+        self._expire(conn)
+
+    def _expire(self, conn: sqlite3.Connection) -> None:
+        if self.retention_days <= 0:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        deleted = conn.execute("""
+            DELETE FROM turns WHERE session_id IN (
+                SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?
+            )
+        """, (cutoff,)).rowcount
+        conn.commit()
+        if deleted:
+            print(f"[HistoryStore] Expired {deleted} turns older than {self.retention_days} days.")
+
+    def _cache_put(self, session_id: str, summaries: list) -> None:
+        # Caller holds the lock
+        self._summaries[session_id] = summaries
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+
+    def summaries(self, session_id: str) -> list:
+        """
+        Compact per-turn summaries of a session, oldest first.
+        """
+        conn = self._connect()
+        try:
+            # Held across the read so a concurrent append can't be missed
+            with self._lock:
+                cached = self._summaries.get(session_id)
+                if cached is not None:
+                    self._summaries.move_to_end(session_id)
+                    return list(cached)
+
+                rows = conn.execute(
+                    "SELECT summary FROM turns WHERE session_id = ? ORDER BY turn", (session_id,)
+                ).fetchall()
+                loaded = [json.loads(summary) for (summary,) in rows]
+                self._cache_put(session_id, loaded)
+                return list(loaded)
+        finally:
+            conn.close()
+
+    def count(self, session_id: str) -> int:
+        return len(self.summaries(session_id))
+
+    def load(self, session_id: str, start: int = 0, end: Optional[int] = None) -> list:
+        """
+        Full turns [start, end) of a session, read from disk.
+        """
+        query = "SELECT payload FROM turns WHERE session_id = ? AND turn >= ?"
+        params = [session_id, start]
+        if end is not None:
+            query += " AND turn < ?"
+            params.append(end)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + " ORDER BY turn", params).fetchall()
+        finally:
+            conn.close()
+        return [_decode(payload) for (payload,) in rows]
+
+    def append(self, session_id: str, item: dict) -> int:
+        """
+        Stores a finished turn and returns its index in the session.
+        """
+        item = {k: item.get(k, {}) for k in TURN_KEYS}
+        summary = summarize_turn(item)
+
+        conn = self._connect()
+        try:
+            with self._lock:
+                turn = conn.execute(
+                    "SELECT COALESCE(MAX(turn) + 1, 0) FROM turns WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                conn.execute(
+                    "INSERT INTO turns (session_id, turn, user_query, summary, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, turn, item["user_query"], json.dumps(summary),
+                     json.dumps(item, default=str), time.time())
+                )
+                conn.commit()
+                cached = self._summaries.get(session_id)
+                if cached is not None:
+                    cached.append(summary)
+                    self._summaries.move_to_end(session_id)
+
+            if turn + 1 > self.uncompressed_turns:
+                self._compact_session(conn, session_id, turn + 1 - self.uncompressed_turns)
+        finally:
+            conn.close()
+        return turn
+
+    def _compact_session(self, conn: sqlite3.Connection, session_id: str, before_turn: int) -> None:
+        rows = conn.execute(
+            "SELECT turn, payload FROM turns WHERE session_id = ? AND turn < ? AND compacted = 0",
+            (session_id, before_turn)
+        ).fetchall()
+        for turn, payload in rows:
+            conn.execute(
+                "UPDATE turns SET payload = ?, compacted = 1 WHERE session_id = ? AND turn = ?",
+                (zlib.compress(payload.encode("utf-8")), session_id, turn)
+            )
+        conn.commit()
+        if rows:
+            print(f"[HistoryStore] Compacted {len(rows)} old turns of session {session_id}.")
+
+    def delete_session(self, session_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_sessions": len(self._summaries),
+                "cached_turns": sum(len(s) for s in self._summaries.values()),
+            }
+
+
+history_store = HistoryStore(
+    HISTORY_DB_PATH,
+    max_sessions=HISTORY_CACHE_SESSIONS,
+    uncompressed_turns=HISTORY_UNCOMPRESSED_TURNS,
+    retention_days=HISTORY_RETENTION_DAYS,
+)
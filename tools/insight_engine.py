@@ -0,0 +1,279 @@
+"""
+Local statistical analysis of a full query result (numpy/pandas only).
+
+Vectorized passes over every row produce candidate findings:
+
+- correlations between numeric columns
+- outliers (Tukey IQR fences, severity by z-score)
+- top contributors and Pareto share of a measure per category
+- period-over-period change when there is a time column
+- skewed distributions
+
+Each finding carries a score in [0, 1]; findings are ranked by score and
+only the best few are handed to InsightAgent for phrasing.
+
+A result too large to load is analyzed from a uniform sample plus its
+chunks: totals (contributors, period changes) are summed over every chunk,
+the other statistics come from the sample.
+"""
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    INSIGHT_MAX_FINDINGS,
+    INSIGHT_MIN_CORRELATION,
+    INSIGHT_OUTLIER_Z,
+    INSIGHT_MAX_GROUPS,
+)
+from tools.forecast_engine import detect_time_column, detect_frequency, parse_times
+
+ID_NAME = re.compile(r"(^|[_\s])id$|^(row|index)$", re.IGNORECASE)
+MIN_ROWS = 3
+
+
+def _numeric_columns(df: pd.DataFrame, exclude=()) -> list:
+    """
+    Numeric measure columns; identifiers (named *id, or unique increasing
+    integers) are left out since their statistics mean nothing.
+    """
+    cols = []
+    for col in df.columns:
+        s = df[col]
+        if col in exclude or not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            continue
+        if ID_NAME.search(str(col)):
+            continue
+        if pd.api.types.is_integer_dtype(s) and s.is_unique and s.is_monotonic_increasing and len(s) > MIN_ROWS:
+            continue
+        cols.append(col)
+    return cols
+
+
+def _category_columns(df: pd.DataFrame, exclude=()) -> list:
+    return [
+        col for col in df.columns
+        if col not in exclude
+        and (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])
+             or isinstance(df[col].dtype, pd.CategoricalDtype))
+        and 1 < df[col].nunique() <= INSIGHT_MAX_GROUPS
+    ]
+
+
+def _fmt(value: float) -> str:
+    return f"{value:,.0f}" if abs(value) >= 1000 else f"{value:,.2f}"
+
+
+def _correlations(df: pd.DataFrame, numeric: list) -> list:
+    if len(numeric) < 2:
+        return []
+    # Rank correlation: robust to outliers and catches monotonic non-linear links
+    corr = df[numeric].corr(method="spearman").to_numpy()
+    i, j = np.triu_indices(len(numeric), k=1)
+    r = corr[i, j]
+    keep = np.abs(np.nan_to_num(r)) >= INSIGHT_MIN_CORRELATION
+    findings = []
+    for a, b, value in zip(i[keep], j[keep], r[keep]):
+        direction = "positively" if value > 0 else "negatively"
+        findings.append({
+            "kind": "correlation",
+            "columns": [numeric[a], numeric[b]],
+            "value": float(value),
+            "score": float(abs(value)) * 0.9,
+            "text": f"{numeric[a]} and {numeric[b]} are {direction} correlated (Spearman rho = {value:+.2f}).",
+        })
+    return findings
+
+
+def _outliers(df: pd.DataFrame, numeric: list, label_col: Optional[str], sampled: bool = False) -> list:
+    if not numeric or len(df) < 8:
+        return []
+    X = df[numeric].to_numpy(dtype=np.float64)
+    mean = np.nanmean(X, axis=0)
+    std = np.nanstd(X, axis=0)
+    q1, q3 = np.nanpercentile(X, [25, 75], axis=0)
+    iqr = q3 - q1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.abs(X - mean) / std
+    z = np.where(np.isfinite(z), z, 0.0)
+    # Outliers must be beyond the Tukey fences and far out in z-score
+    outside = ((X < q1 - 1.5 * iqr) | (X > q3 + 1.5 * iqr)) & (z >= INSIGHT_OUTLIER_Z)
+    counts = outside.sum(axis=0)
+    worst = z.argmax(axis=0)
+
+    findings = []
+    for k, col in enumerate(numeric):
+        max_z = z[worst[k], k]
+        if counts[k] == 0:
+            continue
+        row = worst[k]
+        where = f" ({label_col} = {df[label_col].iloc[row]})" if label_col else ""
+        findings.append({
+            "kind": "outlier",
+            "columns": [col],
+            "value": float(X[row, k]),
+            "count": int(counts[k]),
+            # Many outliers mean a heavy tail (see skew) rather than a few notable rows
+            "score": float(min(1.0, max_z / (4 * INSIGHT_OUTLIER_Z)) * max(0.2, 1 - 20 * counts[k] / len(df))),
+            "text": f"{col} has {int(counts[k])} outlying value(s)"
+                    + (f" in a sample of {len(df):,} rows" if sampled else "") + "; the most extreme is "
+                    f"{_fmt(X[row, k])}{where}, {max_z:.1f} standard deviations from the mean "
+                    f"of {_fmt(mean[k])}.",
+        })
+    return findings
+
+
+def _totals(frames, numeric: list, categories: list, time_col: Optional[str], freq: Optional[str]) -> dict:
+    """
+    Sums needed by the contributor and period findings, accumulated one
+    frame at a time: absolute totals per numeric column, per-category
+    totals and per-period totals.
+    """
+    abs_sums, by_cat, by_period = [], {cat: [] for cat in categories}, []
+    for frame in frames:
+        values = frame[numeric].apply(pd.to_numeric, errors="coerce")
+        abs_sums.append(values.abs().sum())
+        for cat in categories:
+            by_cat[cat].append(values.groupby(frame[cat], sort=False).sum())
+        if freq is not None:
+            times = parse_times(frame[time_col])
+            by_period.append(values.assign(_t=times).dropna(subset=["_t"]).set_index("_t")
+                             .resample(freq).sum(min_count=1))
+    return {
+        "abs": pd.concat(abs_sums, axis=1).sum(axis=1) if abs_sums else pd.Series(dtype=float),
+        "categories": {cat: pd.concat(parts).groupby(level=0, sort=False).sum() for cat, parts in by_cat.items()
+                       if parts},
+        "periods": pd.concat(by_period).groupby(level=0).sum(min_count=1) if by_period else None,
+    }
+
+
+def _contributors(totals: dict, numeric: list, categories: list) -> list:
+    if not numeric or not categories:
+        return []
+    # The measure with the largest total is most likely the one of interest (sales, revenue)
+    measure = totals["abs"].idxmax()
+    findings = []
+    for cat in categories:
+        per_value = totals["categories"][cat][measure]
+        per_value = per_value[per_value > 0].sort_values(ascending=False)
+        n = len(per_value)
+        if n < 2:
+            continue
+        share = per_value.to_numpy() / per_value.sum()
+        cumulative = np.cumsum(share)
+        k80 = int(np.searchsorted(cumulative, 0.8) + 1)
+        top, top_share = per_value.index[0], share[0]
+        text = f"{top} is the largest {cat} by {measure} with {top_share:.0%} of the total"
+        if n >= 5 and k80 < n:
+            text += f"; {k80} of {n} {cat} values ({k80 / n:.0%}) make up 80% of it"
+        findings.append({
+            "kind": "contributors",
+            "columns": [cat, measure],
+            "top": [str(v) for v in per_value.index[:3]],
+            "top_share": float(top_share),
+            # Concentrated distributions are more notable than even ones
+            "score": float(max(top_share - 1 / n, 1 - k80 / n if n >= 5 else 0)),
+            "text": text + ".",
+        })
+    return findings
+
+
+def _period_changes(totals: dict, numeric: list, time_col: Optional[str], label: Optional[str]) -> list:
+    if time_col is None or not numeric or totals["periods"] is None:
+        return []
+    series = totals["periods"].dropna(how="all")
+    if len(series) < 2:
+        return []
+
+    values = series.to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = (values[1:] - values[:-1]) / np.abs(values[:-1])
+    change = np.where(np.isfinite(change), change, np.nan)
+    periods = series.index.strftime("%Y-%m-%d")
+
+    findings = []
+    for k, col in enumerate(numeric):
+        last = change[-1, k]
+        if not np.isnan(last):
+            findings.append({
+                "kind": "period_change",
+                "columns": [time_col, col],
+                "value": float(last),
+                "score": float(min(1.0, abs(last) / 0.5)),
+                "text": f"{col} changed {last:+.1%} in the latest {label} ({periods[-1]}): "
+                        f"{_fmt(values[-2, k])} to {_fmt(values[-1, k])}.",
+            })
+        if len(change) > 2 and not np.isnan(change[:, k]).all():
+            big = int(np.nanargmax(np.abs(change[:, k])))
+            if big != len(change) - 1:
+                findings.append({
+                    "kind": "period_change",
+                    "columns": [time_col, col],
+                    "value": float(change[big, k]),
+                    "score": float(min(1.0, abs(change[big, k]) / 0.5)) * 0.8,
+                    "text": f"The largest {label}-over-{label} move in {col} was "
+                            f"{change[big, k]:+.1%} in {periods[big + 1]}.",
+                })
+    return findings
+
+
+def _skew(df: pd.DataFrame, numeric: list) -> list:
+    if not numeric or len(df) < 8:
+        return []
+    data = df[numeric]
+    skew = data.skew().to_numpy()
+    mean = data.mean().to_numpy()
+    median = data.median().to_numpy()
+    findings = []
+    for k, col in enumerate(numeric):
+        if np.isnan(skew[k]) or abs(skew[k]) < 1:
+            continue
+        side = "right" if skew[k] > 0 else "left"
+        findings.append({
+            "kind": "skew",
+            "columns": [col],
+            "value": float(skew[k]),
+            "score": float(min(1.0, abs(skew[k]) / 5)) * 0.6,
+            "text": f"{col} is {side}-skewed (skewness {skew[k]:.1f}): mean {_fmt(mean[k])} "
+                    f"vs median {_fmt(median[k])}.",
+        })
+    return findings
+
+
+def analyze(df: pd.DataFrame, max_findings: int = INSIGHT_MAX_FINDINGS, frames=None) -> list:
+    """
+    Ranked findings for a full result, best first. Each finding is a dict
+    with kind, columns, score and a one-sentence text. For a result too
+    large to load, df is a uniform sample and frames yields every row in
+    chunks (for the totals).
+    """
+    if len(df) < MIN_ROWS:
+        return []
+    time_col, times = detect_time_column(df)
+    exclude = (time_col,) if time_col is not None else ()
+    numeric = _numeric_columns(df, exclude)
+    categories = _category_columns(df, exclude)
+    detected = detect_frequency(times) if time_col is not None else None
+    freq, label = detected[:2] if detected is not None else (None, None)
+    totals = _totals([df] if frames is None else frames, numeric, categories, time_col, freq) if numeric else None
+
+    findings = (
+        _correlations(df, numeric)
+        # Rows are named by their first category (or time) value
+        + _outliers(df, numeric, categories[0] if categories else time_col, sampled=frames is not None)
+        + (_contributors(totals, numeric, categories) if totals else [])
+        + (_period_changes(totals, numeric, time_col, label) if totals else [])
+        + _skew(df, numeric)
+    )
+    findings.sort(key=lambda f: f["score"], reverse=True)
+    return findings[:max_findings]
+
+
+def describe_findings(findings: list) -> str:
+    """
+    Numbered list of findings; the LLM phrases from this and it is shown
+    as-is if the LLM is unavailable.
+    """
+    return "\n".join(f"{i}. {f['text']}" for i, f in enumerate(findings, 1))
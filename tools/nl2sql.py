@@ -0,0 +1,278 @@
+"""
+Deterministic translator for the most common question shapes:
+
+    how many rows                      -> COUNT(*)
+    how many distinct <col>            -> COUNT(DISTINCT col)
+    number of records by <cat>         -> COUNT(*) GROUP BY cat
+    total/average/max/min <num> [by <cat>]
+    top/bottom N <cat> by <num>        -> SUM GROUP BY ORDER BY LIMIT N
+    <num> over time / by month|year    -> SUM GROUP BY strftime(...)
+
+A question only matches if the whole (normalized) sentence fits a template
+and every slot resolves to a column of the right kind, so anything with
+filters, joins of ideas or unknown words falls through to the LLM.
+"""
+import re
+import sqlite3
+from typing import Optional
+
+from tools.lru_cache import LRUCache
+from tools.sql_tool import DB_PATH, data_version
+
+profile_cache = LRUCache("column_profile", 8)
+
+NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC")
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}(-\d{2})?([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+# Integer columns with at most this many distinct values can be grouped by
+MAX_GROUP_CARDINALITY = 200
+# Rows read to count distinct values (see column_profile)
+PROFILE_SAMPLE_ROWS = 20000
+# tools.approx_query.SAMPLE_TABLE; not imported here since that module loads pandas
+SAMPLE_TABLE = "data_sample"
+
+FILLER = (
+    r"^(please\s+)?(can you\s+|could you\s+)?(show( me)?|give( me)?|list|what (is|are|was|were)|"
+    r"tell me|find|get|display|plot|chart)?\s*(the\s+)?"
+)
+AGGREGATES = {
+    "total": "SUM", "sum of": "SUM", "sum": "SUM",
+    "average": "AVG", "avg": "AVG", "mean": "AVG",
+    "maximum": "MAX", "max": "MAX", "highest": "MAX", "largest": "MAX",
+    "minimum": "MIN", "min": "MIN", "lowest": "MIN", "smallest": "MIN",
+}
+PERIODS = {
+    "day": "%Y-%m-%d", "daily": "%Y-%m-%d",
+    "week": "%Y-W%W", "weekly": "%Y-W%W",
+    "month": "%Y-%m", "monthly": "%Y-%m",
+    "year": "%Y", "yearly": "%Y", "annual": "%Y",
+}
+
+# Confidence of a column match
+EXACT, PLURAL, PARTIAL = 1.0, 0.95, 0.6
+
+
+def column_profile() -> dict:
+    """
+    {column: {"type": "numeric"|"date"|"text", "distinct": n}} for
+    data_table, cached per data version. Empty if there is no table.
+    Kinds come from the declared types and a few values. Distinct counts
+    are taken over at most PROFILE_SAMPLE_ROWS rows of the approximate-mode
+    sample table (or of data_table when it has none), so this never scans
+    a large table; they are lower bounds, which is all the cardinality
+    check in _group_column needs.
+    """
+    version = data_version()
+    cached = profile_cache.get(version)
+    if cached is not None:
+        return cached
+
+    profile = {}
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            info = conn.execute("PRAGMA table_info(data_table)").fetchall()
+            if info:
+                names = [name for _, name, *_ in info]
+                has_sample = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SAMPLE_TABLE,)
+                ).fetchone()
+                source = SAMPLE_TABLE if has_sample else "data_table"
+                distinct = conn.execute(
+                    f"SELECT {', '.join(f'COUNT(DISTINCT {quote(n)})' for n in names)} "
+                    f"FROM (SELECT * FROM {source} LIMIT ?)", (PROFILE_SAMPLE_ROWS,)
+                ).fetchone()
+                first = conn.execute("SELECT * FROM data_table LIMIT 50").fetchall()
+                for k, (_, name, decl_type, *_) in enumerate(info):
+                    sample = [row[k] for row in first if row[k] is not None][:20]
+                    if any(t in (decl_type or "").upper() for t in NUMERIC_TYPES):
+                        kind = "numeric"
+                    elif sample and all(isinstance(v, str) and DATE_PATTERN.match(v) for v in sample):
+                        kind = "date"
+                    else:
+                        kind = "text"
+                    profile[name] = {"type": kind, "distinct": distinct[k]}
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"[NL2SQL] Profiling failed: {e}")
+        return {}
+
+    if profile:
+        profile_cache.put(version, profile)
+    return profile
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().strip()
+    text = re.sub(r"[?.!]+$", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return re.sub(FILLER, "", text).strip()
+
+
+def _singular(phrase: str) -> str:
+    """
+    Singular form of the last word (categories -> category, sales -> sale).
+    """
+    words = phrase.split()
+    if not words:
+        return phrase
+    last = words[-1]
+    if last.endswith("ies") and len(last) > 4:
+        last = last[:-3] + "y"
+    elif re.search(r"(ss|x|ch|sh)es$", last):
+        last = last[:-2]
+    elif last.endswith("s") and not last.endswith("ss"):
+        last = last[:-1]
+    return " ".join(words[:-1] + [last])
+
+
+def _match_measure(phrase: str, profile: dict, agg_word: Optional[str]) -> tuple:
+    """
+    Numeric column for a phrase. The aggregate word may be part of the column
+    name ("total sales" -> Total_Sales), so that reading is tried first.
+    """
+    if agg_word:
+        column, score = _match_column(f"{agg_word} {phrase}", profile, ("numeric",))
+        if score >= PLURAL:
+            return column, score
+    return _match_column(phrase, profile, ("numeric",))
+
+
+def _match_column(phrase: str, profile: dict, kinds: tuple) -> tuple:
+    """
+    Best column for a phrase among columns of the given kinds.
+    Returns (column, confidence) or (None, 0.0); ambiguous matches score 0.
+    """
+    phrase = re.sub(r"^(the|each|every|all)\s+", "", phrase.strip())
+    candidates = []
+    for name, info in profile.items():
+        if info["type"] not in kinds:
+            continue
+        label = re.sub(r"[_\s]+", " ", name.lower()).strip()
+        if phrase == label:
+            score = EXACT
+        elif _singular(phrase) == _singular(label):
+            score = PLURAL
+        elif label in phrase.split() or phrase in label.split():
+            score = PARTIAL
+        else:
+            continue
+        candidates.append((score, name))
+
+    if not candidates:
+        return None, 0.0
+    candidates.sort(reverse=True)
+    if len(candidates) > 1 and candidates[0][0] == candidates[1][0]:
+        return None, 0.0
+    return candidates[0][1], candidates[0][0]
+
+
+def _group_column(phrase: str, profile: dict) -> tuple:
+    column, score = _match_column(phrase, profile, ("text", "date", "numeric"))
+    if column is None:
+        return None, 0.0
+    info = profile[column]
+    if info["type"] == "numeric" and info["distinct"] > MAX_GROUP_CARDINALITY:
+        return None, 0.0
+    return column, score
+
+
+def translate(question: str, profile: Optional[dict] = None) -> tuple:
+    """
+    Returns (sql, confidence) for a recognized question, or (None, 0.0).
+    """
+    profile = column_profile() if profile is None else profile
+    if not profile or not question:
+        return None, 0.0
+    q = _normalize(question)
+    agg_words = "|".join(sorted(map(re.escape, AGGREGATES), key=len, reverse=True))
+
+    # Row count
+    if re.fullmatch(r"(how many|number of|count( of)?|total number of) (rows|records|entries|lines)( are there| in the (data|dataset|table))?", q):
+        return "SELECT COUNT(*) AS row_count FROM data_table", EXACT
+
+    # Distinct count
+    m = re.fullmatch(r"(how many|number of|count( of)?) (distinct|unique|different) (.+?)( are there)?", q)
+    if m:
+        column, score = _match_column(m.group(4), profile, ("text", "date", "numeric"))
+        if column:
+            return f"SELECT COUNT(DISTINCT {quote(column)}) AS distinct_count FROM data_table", score
+        return None, 0.0
+
+    # Count per group
+    m = re.fullmatch(r"(how many|number of|count( of)?) (rows|records|entries)? ?(by|per|for each|in each) (.+)", q) \
+        or re.fullmatch(r"(count|number of rows|number of records) (by|per|for each) (.+)", q)
+    if m:
+        column, score = _group_column(m.groups()[-1], profile)
+        if column:
+            c = quote(column)
+            return (f"SELECT {c}, COUNT(*) AS count FROM data_table GROUP BY {c} ORDER BY count DESC", score)
+        return None, 0.0
+
+    # Top / bottom N groups by a measure
+    m = re.fullmatch(r"(top|bottom|best|worst) (\d+ )?(.+?) (by|in terms of|with the (most|highest|lowest)) (?:(total) )?(.+)", q)
+    if m:
+        group, g_score = _group_column(m.group(3), profile)
+        measure, m_score = _match_measure(m.group(7), profile, m.group(6))
+        if group and measure:
+            n = int(m.group(2) or 5)
+            order = "ASC" if m.group(1) in ("bottom", "worst") else "DESC"
+            g, v = quote(group), quote(measure)
+            return (f"SELECT {g}, SUM({v}) AS total FROM data_table GROUP BY {g} "
+                    f"ORDER BY total {order} LIMIT {n}", min(g_score, m_score))
+        return None, 0.0
+
+    # Measure over time
+    m = re.fullmatch(
+        r"(?:(" + agg_words + r") )?(?:of )?(?P<measure>.+?) "
+        r"(?:over time|trend|(?:by|per) (?P<period>day|week|month|year)|(?P<adj>daily|weekly|monthly|yearly|annual)(?: trend)?)", q
+    ) or re.fullmatch(
+        r"(?P<adj>daily|weekly|monthly|yearly|annual) (?:(" + agg_words + r") )?(?P<measure>.+?)(?: trend)?", q
+    )
+    if m:
+        dates = [c for c, info in profile.items() if info["type"] == "date"]
+        agg_word = next((g for g in m.groups() if g in AGGREGATES), None)
+        measure, score = _match_measure(m.group("measure"), profile, agg_word)
+        if measure and len(dates) == 1:
+            period = m.groupdict().get("period") or m.group("adj") or "month"
+            func = AGGREGATES.get(agg_word or "total", "SUM")
+            d, v = quote(dates[0]), quote(measure)
+            fmt = PERIODS[period]
+            return (f"SELECT strftime('{fmt}', {d}) AS period, {func}({v}) AS value FROM data_table "
+                    f"WHERE {d} IS NOT NULL GROUP BY period ORDER BY period", score)
+        if dates:
+            return None, 0.0
+        # No date column: "by month" may name a regular column, try the templates below
+
+    # Aggregate, optionally per group
+    m = re.fullmatch(r"(" + agg_words + r") (?:of )?(.+?)(?: (?:by|per|for each|in each|across) (.+))?", q)
+    if m:
+        func = AGGREGATES[m.group(1)]
+        measure, m_score = _match_measure(m.group(2), profile, m.group(1))
+        if not measure:
+            return None, 0.0
+        v = quote(measure)
+        if m.group(3) is None:
+            return f"SELECT {func}({v}) AS value FROM data_table", m_score
+        group, g_score = _group_column(m.group(3), profile)
+        if not group:
+            return None, 0.0
+        g = quote(group)
+        return (f"SELECT {g}, {func}({v}) AS value FROM data_table GROUP BY {g} ORDER BY value DESC",
+                min(m_score, g_score))
+
+    # "<measure> by <group>" without an aggregate word: assume a total
+    m = re.fullmatch(r"(.+?) (?:by|per|for each|in each) (.+)", q)
+    if m:
+        measure, m_score = _match_column(m.group(1), profile, ("numeric",))
+        group, g_score = _group_column(m.group(2), profile)
+        if measure and group:
+            g, v = quote(group), quote(measure)
+            return (f"SELECT {g}, SUM({v}) AS value FROM data_table GROUP BY {g} ORDER BY value DESC",
+                    0.9 * min(m_score, g_score))
+
+    return None, 0.0
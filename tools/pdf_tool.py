@@ -1,115 +1,226 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
+import hashlib
 import io
-import base64
+import json
 import os
+import re
 import uuid
 
+from config.settings import REPORT_FRAGMENTS_MAX_BYTES
+from tools.blob_store import blob_store, chart_image_handle, load_chart_image
+from tools.disk_gc import trim_files
+
 REPORTS_DIR = os.path.join(os.path.dirname(__file__), '../orchestrator/reports')
+FRAGMENTS_DIR = os.path.join(REPORTS_DIR, 'fragments')
 
-def generate_pdf_report(history: list) -> str:
+def _draw_chart(c, chart: dict, x: float, y: float, width: float, height: float) -> None:
     """
-    Generates a PDF report containing insights, forecast, and charts for the entire session history.
-    Returns the absolute path to the generated PDF.
+    Draws a chart into the (x, y, width, height) box.
+    Prefers the vector (SVG) profile, scaled uniformly to fit; falls back to
+    a raster profile when no SVG is available or svglib is not installed.
     """
-    try:
-        os.makedirs(REPORTS_DIR, exist_ok=True)
-        filename = f"report_{uuid.uuid4().hex[:8]}.pdf"
-        filepath = os.path.join(REPORTS_DIR, filename)
+    handle = chart_image_handle(chart, "vector")
+    if handle and handle.endswith(".svg"):
+        try:
+            from svglib.svglib import svg2rlg
+            from reportlab.graphics import renderPDF
 
-        c = canvas.Canvas(filepath, pagesize=letter)
-        width, height = letter
+            drawing = svg2rlg(str(blob_store.path(handle)))
+            if drawing is not None:
+                scale = min(width / drawing.width, height / drawing.height)
+                drawing.scale(scale, scale)
+                renderPDF.draw(drawing, c, x, y)
+                return
+        except ImportError:
+            print("[PDF Tool] svglib not installed; embedding raster chart.")
 
-        # Title Page
-        c.setFont("Helvetica-Bold", 24)
-        c.drawCentredString(width / 2, height / 2 + 50, "AI Data Analyst Report")
-        c.setFont("Helvetica", 14)
-        c.drawCentredString(width / 2, height / 2, "Comprehensive Session Report")
-        c.showPage()
+    img_bytes = load_chart_image(chart, "full") if "full" in chart.get("images", {}) else None
+    if img_bytes is None:
+        img_bytes = load_chart_image(chart, "thumb")
+    if img_bytes:
+        c.drawImage(ImageReader(io.BytesIO(img_bytes)), x, y, width=width, height=height)
 
-        for i, item in enumerate(history):
-            # New page for each query if not the first (or just continuous flow?)
-            # Let's do continuous flow but ensure title separation
-            
+def _draw_title_page(c) -> None:
+    width, height = letter
+    c.setFont("Helvetica-Bold", 24)
+    c.drawCentredString(width / 2, height / 2 + 50, "AI Data Analyst Report")
+    c.setFont("Helvetica", 14)
+    c.drawCentredString(width / 2, height / 2, "Comprehensive Session Report")
+    c.showPage()
+
+def _draw_turn(c, item: dict, i: int) -> None:
+    """
+    Draws one query/answer turn, starting on a fresh page.
+    """
+    height = letter[1]
+    y_position = height - 50
+    
+    # Query Header
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(50, y_position, f"Query {i+1}: {item.get('user_query', 'N/A')}")
+    y_position -= 30
+    
+    # Insights
+    insights = item.get("insight_agent", {}).get("insights", "No insights generated.")
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y_position, "Insights:")
+    y_position -= 15
+    c.setFont("Helvetica", 10)
+    
+    text_object = c.beginText(50, y_position)
+    text_object.setFont("Helvetica", 10)
+    lines = insights.split('\n')
+    for line in lines:
+        while len(line) > 90:
+            text_object.textLine(line[:90])
+            line = line[90:]
+        text_object.textLine(line)
+    c.drawText(text_object)
+    
+    y_position = text_object.getY() - 20
+
+    # Forecast
+    forecast = item.get("forecast_agent", {}).get("forecast_text", "")
+    if forecast and forecast != "No forecast generated.":
+        if y_position < 100:
+            c.showPage()
             y_position = height - 50
-            
-            # Query Header
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(50, y_position, f"Query {i+1}: {item.get('user_query', 'N/A')}")
+        
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(50, y_position, "Forecast:")
+        y_position -= 15
+        
+        text_object = c.beginText(50, y_position)
+        text_object.setFont("Helvetica", 10)
+        lines = forecast.split('\n')
+        for line in lines:
+            while len(line) > 90:
+                text_object.textLine(line[:90])
+                line = line[90:]
+            text_object.textLine(line)
+        c.drawText(text_object)
+        y_position = text_object.getY() - 20
+
+        for chart in item.get("forecast_agent", {}).get("charts", []):
+            if y_position < 250:
+                c.showPage()
+                y_position = height - 50
+            y_position -= 200
+            try:
+                _draw_chart(c, chart, 50, y_position, width=400, height=200)
+            except Exception as e:
+                c.drawString(50, y_position + 100, f"[Image Error: {e}]")
             y_position -= 30
-            
-            # Insights
-            insights = item.get("insight_agent", {}).get("insights", "No insights generated.")
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(50, y_position, "Insights:")
-            y_position -= 15
-            c.setFont("Helvetica", 10)
-            
-            text_object = c.beginText(50, y_position)
-            text_object.setFont("Helvetica", 10)
-            lines = insights.split('\n')
-            for line in lines:
-                while len(line) > 90:
-                    text_object.textLine(line[:90])
-                    line = line[90:]
-                text_object.textLine(line)
-            c.drawText(text_object)
-            
-            y_position = text_object.getY() - 20
-
-            # Forecast
-            forecast = item.get("forecast_agent", {}).get("forecast_text", "")
-            if forecast and forecast != "No forecast generated.":
-                if y_position < 100:
-                    c.showPage()
-                    y_position = height - 50
-                
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(50, y_position, "Forecast:")
-                y_position -= 15
-                
-                text_object = c.beginText(50, y_position)
-                text_object.setFont("Helvetica", 10)
-                lines = forecast.split('\n')
-                for line in lines:
-                    while len(line) > 90:
-                        text_object.textLine(line[:90])
-                        line = line[90:]
-                    text_object.textLine(line)
-                c.drawText(text_object)
-                y_position = text_object.getY() - 20
-
-            # Charts
-            charts = item.get("chart_agent", {}).get("charts", [])
-            for j, chart in enumerate(charts):
-                if y_position < 250:
-                    c.showPage()
-                    y_position = height - 50
-                
-                c.setFont("Helvetica-Bold", 10)
-                title = chart.get("spec", {}).get("title", f"Chart {j+1}")
-                c.drawString(50, y_position, f"Chart: {title}")
-                y_position -= 210
-                
-                img_data = chart.get("png")
-                if img_data:
-                    try:
-                        img_bytes = base64.b64decode(img_data)
-                        img_buffer = io.BytesIO(img_bytes)
-                        img = ImageReader(img_buffer)
-                        c.drawImage(img, 50, y_position, width=400, height=200)
-                    except Exception as e:
-                        c.drawString(50, y_position + 100, f"[Image Error: {e}]")
-                
-                y_position -= 30
-            
-            # Separator between queries
+
+    # Charts
+    charts = item.get("chart_agent", {}).get("charts", [])
+    for j, chart in enumerate(charts):
+        if y_position < 250:
             c.showPage()
+            y_position = height - 50
+        
+        c.setFont("Helvetica-Bold", 10)
+        title = chart.get("spec", {}).get("title", f"Chart {j+1}")
+        c.drawString(50, y_position, f"Chart: {title}")
+        y_position -= 210
+        
+        try:
+            _draw_chart(c, chart, 50, y_position, width=400, height=200)
+        except Exception as e:
+            c.drawString(50, y_position + 100, f"[Image Error: {e}]")
+        
+        y_position -= 30
+    
+    # Separator between queries
+    c.showPage()
+
+def _fragment_digest(item: dict, i: int) -> str:
+    """
+    Content hash of a rendered turn. Chart images are content-addressed
+    handles, so equal digests mean byte-identical fragments.
+    """
+    payload = json.dumps({
+        "index": i,
+        "user_query": item.get("user_query", ""),
+        "insight_agent": item.get("insight_agent", {}),
+        "forecast_agent": item.get("forecast_agent", {}),
+        "chart_agent": item.get("chart_agent", {}),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _render_fragment(name: str, draw) -> str:
+    """
+    Returns the path of a cached single-section PDF, rendering it with
+    draw(canvas) only if it doesn't exist yet.
+    """
+    path = os.path.join(FRAGMENTS_DIR, f"{name}.pdf")
+    try:
+        # Marks the fragment as recently used (see _trim_fragments)
+        os.utime(path)
+        return path
+    except OSError:
+        pass
+
+    os.makedirs(FRAGMENTS_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    c = canvas.Canvas(tmp_path, pagesize=letter)
+    draw(c)
+    c.save()
+    os.replace(tmp_path, path)
+    return path
+
+def _trim_fragments() -> None:
+    """
+    Deletes the least recently used fragments once they take more than
+    REPORT_FRAGMENTS_MAX_BYTES; a later report simply redraws them.
+    """
+    try:
+        names = [n for n in os.listdir(FRAGMENTS_DIR) if n.endswith(".pdf")]
+    except OSError:
+        return
+    trim_files([os.path.join(FRAGMENTS_DIR, n) for n in names],
+               REPORT_FRAGMENTS_MAX_BYTES, int(REPORT_FRAGMENTS_MAX_BYTES * 0.9))
+
+def report_path_for_session(session_id: str) -> str:
+    safe_id = re.sub(r"[^A-Za-z0-9_-]", "", session_id or "") or uuid.uuid4().hex[:8]
+    return os.path.join(REPORTS_DIR, f"report_{safe_id}.pdf")
+
+def generate_pdf_report(history: list, session_id: str = None) -> str:
+    """
+    Generates a PDF report containing insights, forecast, and charts for the entire session history.
+    Each turn is rendered once into a cached fragment; the session report is
+    assembled by concatenating fragments, so only new turns cost a redraw.
+    Returns the absolute path to the generated PDF (stable per session_id).
+    """
+    try:
+        from pypdf import PdfWriter
+
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        filepath = report_path_for_session(session_id)
+
+        fragments = [_render_fragment("title", _draw_title_page)]
+        for i, item in enumerate(history):
+            fragments.append(_render_fragment(
+                _fragment_digest(item, i),
+                lambda c, item=item, i=i: _draw_turn(c, item, i)
+            ))
+
+        writer = PdfWriter()
+        for fragment in fragments:
+            writer.append(fragment)
 
-        c.save()
-        return filepath
+        # Write-then-rename so a concurrent download never sees a partial file
+        tmp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            writer.write(f)
+        writer.close()
+        os.replace(tmp_path, filepath)
+        # After assembly, so this report's own fragments are the newest
+        _trim_fragments()
+        return os.path.abspath(filepath)
 
     except Exception as e:
         print(f"[PDF Tool] Generation Failed: {e}")
-        return ""
\ No newline at end of file
+        return ""
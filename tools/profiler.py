@@ -0,0 +1,243 @@
+"""
+One-pass profile of the whole data_table with bounded memory.
+
+The table is split into rowid ranges scanned in parallel; each range streams
+its rows in chunks into per-column sketches (tools.sketches), and the range
+results are merged. Memory depends on the number of columns, not rows.
+Discovery mode builds its overview charts and questions from the profile.
+"""
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    PROFILE_WORKERS,
+    PROFILE_CHUNK_ROWS,
+    PROFILE_HLL_PRECISION,
+    PROFILE_KLL_K,
+    PROFILE_TOP_VALUES,
+)
+from tools.lru_cache import LRUCache
+from tools.nl2sql import DATE_PATTERN, NUMERIC_TYPES
+from tools.sketches import HyperLogLog, KLLSketch, SpaceSaving
+from tools.sql_tool import DB_PATH, data_version
+
+profile_cache = LRUCache("table_profile", 4)
+
+QUANTILES = {"p01": 0.01, "p05": 0.05, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p95": 0.95, "p99": 0.99}
+HISTOGRAM_BINS = 12
+
+
+class ColumnSketch:
+    """
+    Streaming summary of one column: counts, distinct values, heavy hitters
+    and, for numeric columns, moments and quantiles.
+    """
+
+    def __init__(self, kind: str, seed: int = 0):
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.distinct = HyperLogLog(PROFILE_HLL_PRECISION)
+        self.top = SpaceSaving(PROFILE_TOP_VALUES)
+        self.min = None
+        self.max = None
+        if kind == "numeric":
+            self.quantiles = KLLSketch(PROFILE_KLL_K, seed=seed)
+            # Running moments, merged with Chan's parallel formula
+            self.n = 0
+            self.mean = 0.0
+            self.m2 = 0.0
+
+    def _add_moments(self, n: int, mean: float, m2: float) -> None:
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    def _add_range(self, low, high) -> None:
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def update(self, values: pd.Series) -> None:
+        self.count += len(values)
+        missing = values.isna()
+        self.nulls += int(missing.sum())
+        values = values[~missing]
+        if values.empty:
+            return
+
+        if self.kind == "numeric":
+            x = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+            x = x[~np.isnan(x)]
+            if len(x) == 0:
+                return
+            mean = x.mean()
+            self._add_moments(len(x), mean, float(((x - mean) ** 2).sum()))
+            self._add_range(float(x.min()), float(x.max()))
+            self.quantiles.update(x)
+        else:
+            x = values.astype(str).to_numpy(dtype=object)
+            if self.kind == "date":
+                # ISO dates order correctly as strings
+                self._add_range(x.min(), x.max())
+        self.distinct.update(x)
+        self.top.update(x)
+
+    def merge(self, other: "ColumnSketch") -> None:
+        self.count += other.count
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+        if other.min is not None:
+            self._add_range(other.min, other.max)
+        if self.kind == "numeric":
+            self.quantiles.merge(other.quantiles)
+            self._add_moments(other.n, other.mean, other.m2)
+
+    def summary(self) -> dict:
+        non_null = self.count - self.nulls
+        result = {
+            "type": self.kind,
+            "count": self.count,
+            "nulls": self.nulls,
+            # The estimate can't exceed the number of values seen
+            "distinct": min(self.distinct.count(), non_null),
+            "top_values": [{"value": v, "count": c} for v, c, _ in self.top.top(10)],
+            "min": self.min,
+            "max": self.max,
+        }
+        if self.kind == "numeric" and self.n:
+            result["mean"] = self.mean
+            result["std"] = float(np.sqrt(self.m2 / self.n))
+            result["quantiles"] = dict(zip(QUANTILES, self.quantiles.quantiles(list(QUANTILES.values()))))
+            edges, counts = self.quantiles.histogram(HISTOGRAM_BINS)
+            result["histogram"] = {"edges": edges, "counts": counts}
+        return result
+
+
+def _column_kinds(conn: sqlite3.Connection) -> dict:
+    """
+    {column: "numeric"|"date"|"text"} from declared types and a few values.
+    """
+    kinds = {}
+    cursor = conn.execute("SELECT * FROM data_table LIMIT 50")
+    sample = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+    for _, name, decl_type, *_ in conn.execute("PRAGMA table_info(data_table)").fetchall():
+        values = sample[name].dropna().head(20).tolist()
+        if any(t in (decl_type or "").upper() for t in NUMERIC_TYPES):
+            kinds[name] = "numeric"
+        elif values and all(isinstance(v, str) and DATE_PATTERN.match(v) for v in values):
+            kinds[name] = "date"
+        else:
+            kinds[name] = "text"
+    return kinds
+
+
+def _scan_range(kinds: dict, low: int, high: int, seed: int, chunk_rows: int) -> dict:
+    """
+    Sketches of rows with low <= rowid <= high, streamed chunk by chunk.
+    """
+    sketches = {name: ColumnSketch(kind, seed=seed) for name, kind in kinds.items()}
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.execute("SELECT * FROM data_table WHERE rowid BETWEEN ? AND ?", (low, high))
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            chunk = pd.DataFrame(rows, columns=columns)
+            for name, sketch in sketches.items():
+                sketch.update(chunk[name])
+    finally:
+        conn.close()
+    return sketches
+
+
+def profile_table(workers: int = PROFILE_WORKERS, chunk_rows: int = PROFILE_CHUNK_ROWS) -> Optional[dict]:
+    """
+    Profile of data_table, cached per data version. Returns None if there
+    is no table:
+
+        {"rows": n, "columns": {name: summary}, "workers": w, "seconds": s}
+    """
+    version = data_version()
+    cached = profile_cache.get(version)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            kinds = _column_kinds(conn)
+            low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM data_table").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"[Profiler] Profiling failed: {e}")
+        return None
+
+    merged = {name: ColumnSketch(kind) for name, kind in kinds.items()}
+    if low is not None:
+        # Contiguous rowid ranges, one per worker
+        workers = max(1, min(workers, (high - low) // max(chunk_rows, 1) + 1))
+        bounds = np.linspace(low, high + 1, workers + 1).astype(np.int64)
+        ranges = [(int(bounds[i]), int(bounds[i + 1]) - 1) for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(lambda args: _scan_range(kinds, *args, chunk_rows),
+                             [(lo, hi, seed) for seed, (lo, hi) in enumerate(ranges)])
+            for part in parts:
+                for name, sketch in part.items():
+                    merged[name].merge(sketch)
+    else:
+        workers = 0
+
+    columns = {name: sketch.summary() for name, sketch in merged.items()}
+    profile = {
+        "rows": next(iter(merged.values())).count if merged else 0,
+        "columns": columns,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    print(f"[Profiler] Profiled {profile['rows']} rows x {len(columns)} columns "
+          f"in {profile['seconds']}s ({workers} workers).")
+    profile_cache.put(version, profile)
+    return profile
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.0f}" if abs(value) >= 1000 else f"{value:,.4g}"
+    return str(value)
+
+
+def describe_profile(profile: dict, max_columns: int = 30) -> str:
+    """
+    Compact per-column text summary for prompts.
+    """
+    lines = [f"Rows: {profile['rows']:,}"]
+    for name, col in list(profile["columns"].items())[:max_columns]:
+        line = f"- {name} ({col['type']}): ~{col['distinct']:,} distinct, {col['nulls']:,} nulls"
+        if col["type"] == "numeric" and "quantiles" in col:
+            q = col["quantiles"]
+            line += (f"; min {_fmt(col['min'])}, median {_fmt(q['p50'])}, "
+                     f"max {_fmt(col['max'])}, mean {_fmt(col['mean'])}")
+        elif col["type"] == "date" and col["min"] is not None:
+            line += f"; {col['min']} to {col['max']}"
+        if col["type"] == "text" and col["top_values"]:
+            non_null = max(col["count"] - col["nulls"], 1)
+            top = ", ".join(f"{t['value']} ({t['count'] / non_null:.0%})" for t in col["top_values"][:5])
+            line += f"; most common: {top}"
+        lines.append(line)
+    if len(profile["columns"]) > max_columns:
+        lines.append(f"- ... and {len(profile['columns']) - max_columns} more columns.")
+    return "\n".join(lines)
@@ -0,0 +1,269 @@
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+INTERACTIVE = "interactive"
+DISCOVERY = "discovery"
+SPECULATIVE = "speculative"
+
+# Lower value is served first
+PRIORITIES = {INTERACTIVE: 0, DISCOVERY: 1, SPECULATIVE: 2}
+
+
+class RunPriority:
+    """
+    Priority class of one pipeline run, shared by all of its LLM calls.
+    It can only be raised, e.g. when an interactive caller joins a
+    speculative run: calls made from then on, and calls already queued
+    (after LLMRateLimiter.reprioritize()), are served at the new class.
+    """
+
+    def __init__(self, priority: str = INTERACTIVE):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        self.value = priority
+        self._lock = threading.Lock()
+
+    def raise_to(self, priority: str) -> bool:
+        """
+        Raises the class to priority if that is higher; True if it changed.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        with self._lock:
+            if PRIORITIES[priority] >= PRIORITIES[self.value]:
+                return False
+            self.value = priority
+        return True
+
+
+def as_run_priority(priority) -> RunPriority:
+    return priority if isinstance(priority, RunPriority) else RunPriority(priority)
+
+
+# Priority and cancel token of the pipeline run issuing LLM calls. Set by the
+# orchestrator; copied into stage threads by the DAG scheduler.
+current_priority = contextvars.ContextVar("llm_priority", default=RunPriority(INTERACTIVE))
+current_cancel_token = contextvars.ContextVar("llm_cancel_token", default=None)
+_current_ticket = contextvars.ContextVar("llm_ticket", default=None)
+
+
+@contextmanager
+def request_context(priority=INTERACTIVE, cancel_token=None):
+    """
+    Tags LLM calls made inside the block (including in DAG stage threads
+    started from it) with a priority class (a name, or a RunPriority that
+    can be raised later) and an optional cancel token.
+    """
+    priority_reset = current_priority.set(as_run_priority(priority))
+    token_reset = current_cancel_token.set(cancel_token)
+    try:
+        yield
+    finally:
+        current_priority.reset(priority_reset)
+        current_cancel_token.reset(token_reset)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return max(1, len(text or "") // 4)
+
+
+def is_throttle_error(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return any(s in text for s in ("429", "resource_exhausted", "resource exhausted", "quota", "rate limit"))
+
+
+class LLMRequestCancelled(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_min up to one minute's capacity. The level may go
+    negative when actual usage exceeds the estimate taken up front.
+    """
+
+    def __init__(self, rate_per_min: float):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(rate_per_min)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until amount can be taken (0 if available now).
+        """
+        self._refill(now)
+        # A request larger than the bucket is let through once it is full
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+
+class _Ticket:
+    def __init__(self, priority: RunPriority, tokens: int):
+        self.run_priority = priority
+        self.tokens = tokens
+        self.throttled = False
+
+    @property
+    def priority(self) -> str:
+        return self.run_priority.value
+
+
+class LLMRateLimiter:
+    """
+    Process-wide admission control for LLM calls.
+
+    - Token buckets for requests/min and tokens/min.
+    - Adaptive concurrency (AIMD): the in-flight limit grows by 1 per
+      window of successful calls and halves on a quota error (429) or a call
+      slower than target_latency.
+    - Waiting calls are admitted strictly by priority class, then FIFO, so
+      interactive questions overtake discovery and speculative work.
+    """
+
+    DECREASE_COOLDOWN = 2.0
+
+    def __init__(self, requests_per_min: float, tokens_per_min: float, initial_concurrency: int,
+                 min_concurrency: int, max_concurrency: int, target_latency: float):
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency)
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._waiting = []   # heap of (priority, seq, ticket)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self.metrics = {
+            "admitted": 0,
+            "cancelled": 0,
+            "throttled": 0,
+            "slow": 0,
+            "wait_seconds": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    def _admit_delay(self, ticket: _Ticket, now: float) -> Optional[float]:
+        """
+        None if the ticket may not proceed yet for lack of a slot or turn;
+        otherwise the seconds still needed for bucket refill (0 = go).
+        """
+        if not self._waiting or self._waiting[0][2] is not ticket:
+            return None
+        if self.in_flight >= int(self.limit):
+            return None
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket.tokens, now))
+
+    def acquire(self, priority, tokens: int, cancel_token=None) -> _Ticket:
+        ticket = _Ticket(as_run_priority(priority), tokens)
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, (PRIORITIES[ticket.priority], next(self._seq), ticket))
+            self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], len(self._waiting))
+            while True:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self._waiting.remove(next(w for w in self._waiting if w[2] is ticket))
+                    heapq.heapify(self._waiting)
+                    self.metrics["cancelled"] += 1
+                    self._cond.notify_all()
+                    raise LLMRequestCancelled("LLM call cancelled while queued")
+
+                delay = self._admit_delay(ticket, time.monotonic())
+                if delay == 0.0:
+                    break
+                # Wake up on release/notify, for bucket refill, or to re-check cancellation
+                self._cond.wait(timeout=min(delay, 0.5) if delay is not None else 0.5)
+
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            self.metrics["admitted"] += 1
+            self.metrics["wait_seconds"] += time.monotonic() - started
+            # The next waiter may be admissible too
+            self._cond.notify_all()
+        return ticket
+
+    def release(self, ticket: _Ticket, latency: float, output_tokens: int = 0) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            # Charge what the response actually used
+            self.tokens.take(output_tokens)
+
+            now = time.monotonic()
+            slow = latency > self.target_latency
+            if ticket.throttled or slow:
+                self.metrics["throttled" if ticket.throttled else "slow"] += 1
+                if now - self._last_decrease > self.DECREASE_COOLDOWN:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+                    print(f"[LLMRateLimiter] Concurrency limit lowered to {int(self.limit)}.")
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def reprioritize(self) -> None:
+        """
+        Re-sorts waiting calls after a RunPriority was raised, keeping FIFO
+        order within each class.
+        """
+        with self._cond:
+            self._waiting = [(PRIORITIES[t.priority], seq, t) for _, seq, t in self._waiting]
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, text: str):
+        """
+        Holds an admission slot around one LLM call, using the priority and
+        cancel token of the current request context.
+        """
+        ticket = self.acquire(current_priority.get(), estimate_tokens(text), current_cancel_token.get())
+        reset = _current_ticket.set(ticket)
+        started = time.monotonic()
+        result = {"output": ""}
+        try:
+            yield result
+        finally:
+            _current_ticket.reset(reset)
+            self.release(ticket, time.monotonic() - started, estimate_tokens(result["output"]))
+
+    def report_error(self, error: Exception) -> None:
+        """
+        Called by the LLM client on failures; quota errors shrink the
+        concurrency limit when the call's slot is released.
+        """
+        ticket = _current_ticket.get()
+        if ticket is not None and is_throttle_error(error):
+            ticket.throttled = True
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITIES}
+            for _, _, ticket in self._waiting:
+                depth[ticket.priority] += 1
+            return {
+                "in_flight": self.in_flight,
+                "concurrency_limit": int(self.limit),
+                "queue_depth": depth,
+                "request_budget": round(self.requests.level, 1),
+                "token_budget": round(self.tokens.level),
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.metrics.items()},
+            }
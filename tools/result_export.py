@@ -0,0 +1,172 @@
+"""
+Chunked CSV / Parquet export of query results.
+
+Rows arrive as an iterator of chunks, either from an open cursor
+(tools.sql_tool.stream_query) or from a stored result
+(tools.result_store.rows_chunks). Each chunk is encoded and written before
+the next one is read, so an export holds at most one chunk of rows in
+memory. Parquet needs pyarrow.
+"""
+import csv
+import io
+import os
+import tempfile
+from typing import Iterable, Iterator
+
+from config.settings import RESULT_SPILL_DIR
+from tools.result_store import spill_prefix
+
+# format -> (MIME type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def csv_chunks(columns: list, chunks: Iterable[list]) -> Iterator[bytes]:
+    """
+    UTF-8 CSV, one encoded block per chunk of rows (header first).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def write_csv(columns: list, chunks: Iterable[list], path: str) -> None:
+    with open(path, "wb") as f:
+        for block in csv_chunks(columns, chunks):
+            f.write(block)
+
+
+def _column_array(pa, values):
+    """
+    Arrow array of one chunk's column. SQLite columns may mix value types;
+    such a column is exported as text.
+    """
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _promote(pa, current, new):
+    """
+    Type that holds values of both types: wider numbers, otherwise text.
+    """
+    if current == new:
+        return current
+    if pa.types.is_integer(current) and pa.types.is_integer(new):
+        return pa.int64()
+    if (pa.types.is_integer(current) or pa.types.is_floating(current)) and \
+            (pa.types.is_integer(new) or pa.types.is_floating(new)):
+        return pa.float64()
+    return pa.string()
+
+
+def _cast(pa, array, type_):
+    try:
+        return array.cast(type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.array([None if v is None else str(v) for v in array.to_pylist()], type=type_)
+
+
+def write_parquet(columns: list, chunks: Iterable[list], path: str) -> None:
+    """
+    One Parquet row group per chunk. Column types are inferred per chunk
+    and promoted as the result goes on (a column that was all NULL takes
+    the type of its first values, integers widen to floats, mixed types
+    become text). A promotion rewrites the row groups written so far into
+    the new schema, one row group at a time; columns that stay all NULL
+    are written as text.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow); export as CSV instead.")
+
+    schema = None
+    all_null = set()   # columns with no value so far; their text type is provisional
+    writer = None
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            arrays = [_column_array(pa, column) for column in zip(*chunk)]
+            if schema is None:
+                all_null = {i for i, a in enumerate(arrays) if pa.types.is_null(a.type)}
+                types = [pa.string() if i in all_null else a.type for i, a in enumerate(arrays)]
+            else:
+                types = []
+                for i, (field, array) in enumerate(zip(schema, arrays)):
+                    if pa.types.is_null(array.type):
+                        types.append(field.type)
+                    elif i in all_null:
+                        all_null.discard(i)
+                        types.append(array.type)
+                    else:
+                        types.append(_promote(pa, field.type, array.type))
+
+            new_schema = pa.schema([pa.field(str(name), t) for name, t in zip(columns, types)])
+            if schema is None:
+                writer = pq.ParquetWriter(path, new_schema)
+            elif not new_schema.equals(schema):
+                writer = _rewrite(pa, pq, writer, path, new_schema)
+            schema = new_schema
+            writer.write_table(pa.Table.from_arrays(
+                [_cast(pa, a, f.type) for a, f in zip(arrays, schema)], schema=schema
+            ))
+        if writer is None:
+            pq.write_table(pa.table({str(c): pa.array([], type=pa.string()) for c in columns}), path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _rewrite(pa, pq, writer, path: str, schema):
+    """
+    Closes writer and copies what it wrote into a new writer with schema,
+    which is returned still open.
+    """
+    writer.close()
+    previous = f"{path}.previous"
+    os.replace(path, previous)
+    try:
+        new_writer = pq.ParquetWriter(path, schema)
+        source = pq.ParquetFile(previous)
+        for group in range(source.num_row_groups):
+            table = source.read_row_group(group)
+            new_writer.write_table(pa.Table.from_arrays(
+                [_cast(pa, column.combine_chunks(), f.type) for column, f in zip(table.columns, schema)],
+                schema=schema,
+            ))
+        source.close()
+    finally:
+        os.remove(previous)
+    return new_writer
+
+
+def export_file(columns: list, chunks: Iterable[list], fmt: str) -> str:
+    """
+    Writes an export to a new temporary file and returns its path; the
+    caller removes the file once it has been sent.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(EXPORT_FORMATS)}")
+    fd, path = tempfile.mkstemp(prefix=spill_prefix("export"), suffix=EXPORT_FORMATS[fmt][1], dir=RESULT_SPILL_DIR)
+    os.close(fd)
+    try:
+        if fmt == "csv":
+            write_csv(columns, chunks, path)
+        else:
+            write_parquet(columns, chunks, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
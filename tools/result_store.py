@@ -0,0 +1,375 @@
+"""
+Memory budget for query results.
+
+Rows are fetched in chunks while their in-memory size is tracked. A result
+that stays within RESULT_MEMORY_MAX_BYTES (and within the process-wide
+budget shared by every result held in memory) is returned as ResultRows, a
+list of tuples that keeps its bytes charged to the budget until the last
+reference to it (shared state, caches, history, a UI session) goes away.
+A larger one is written to a temporary SQLite file and returned as
+SpilledRows: a read-only sequence that pages rows in on demand, so
+rows[:20], len(rows) and iteration keep working while only the pages
+actually read are held in memory. Deep copies share the same file, which
+is removed once the last reference to the handle goes away.
+
+pandas is imported only by the functions that build DataFrames, so
+importing this module (from tools.sql_tool) stays cheap.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections.abc import Sequence
+from typing import Optional
+
+
+from config.settings import (
+    RESULT_MEMORY_MAX_BYTES,
+    RESULT_MEMORY_TOTAL_BYTES,
+    RESULT_FETCH_ROWS,
+    RESULT_PAGE_ROWS,
+    RESULT_SAMPLE_ROWS,
+    RESULT_SPILL_DIR,
+    RESULT_SPILL_MAX_AGE_S,
+)
+
+SIZE_SAMPLE_ROWS = 64
+
+
+def estimate_bytes(rows: list) -> int:
+    """
+    Approximate Python memory of a list of row tuples, from a sample of rows.
+    """
+    if not rows:
+        return 0
+    step = max(1, len(rows) // SIZE_SAMPLE_ROWS)
+    sample = rows[::step]
+    per_row = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r) for r in sample) / len(sample)
+    # Plus the list's own pointer per row
+    return int((per_row + 8) * len(rows))
+
+
+class MemoryBudget:
+    """
+    Byte budget shared by in-memory results. A fetch reserves bytes as its
+    chunks arrive; they are released when it spills, or once the ResultRows
+    it returns is released or evicted.
+    """
+
+    def __init__(self, total_bytes: int = RESULT_MEMORY_TOTAL_BYTES):
+        self.total_bytes = total_bytes
+        self.used_bytes = 0
+        self.spills = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes: int) -> bool:
+        with self._lock:
+            if self.used_bytes + nbytes > self.total_bytes:
+                return False
+            self.used_bytes += nbytes
+            return True
+
+    def release(self, nbytes: int) -> None:
+        with self._lock:
+            self.used_bytes = max(0, self.used_bytes - nbytes)
+
+    def record_spill(self) -> None:
+        with self._lock:
+            self.spills += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"used_bytes": self.used_bytes, "total_bytes": self.total_bytes, "spills": self.spills}
+
+
+result_budget = MemoryBudget()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def spill_prefix(kind: str) -> str:
+    """
+    File name prefix for this process's spill ("result") and export files;
+    the owning PID lets sweep_spill_dir() tell leftovers from live files.
+    """
+    return f"{kind}-{os.getpid()}-"
+
+
+class ResultRows(list):
+    """
+    In-memory result rows. The bytes reserved while fetching stay charged
+    to the budget until the list is garbage collected. Read-only by
+    convention, like SpilledRows: copies of pipeline state share it.
+    """
+
+    def hold(self, budget: MemoryBudget, nbytes: int) -> "ResultRows":
+        self.nbytes = nbytes
+        weakref.finalize(self, budget.release, nbytes)
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class SpilledRows(Sequence):
+    """
+    Lazy, read-only row sequence backed by a temporary SQLite file.
+    Rows are stored in order under rowid 1..n, so a page is a rowid range
+    (keyset) read rather than an OFFSET scan.
+    """
+
+    def __init__(self, path: str, length: int, width: int):
+        self.path = path
+        self._length = length
+        self.width = width
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    @classmethod
+    def create(cls, head: list, cursor: sqlite3.Cursor, width: int,
+               chunk_rows: int = RESULT_FETCH_ROWS) -> "SpilledRows":
+        """
+        Writes the rows fetched so far and the rest of the cursor to a new file.
+        """
+        fd, path = tempfile.mkstemp(suffix=".db", prefix=spill_prefix("result"), dir=RESULT_SPILL_DIR)
+        os.close(fd)
+        # Untyped columns keep each value's own type
+        columns = ", ".join(f"c{i}" for i in range(width))
+        insert = f"INSERT INTO result VALUES ({', '.join('?' * width)})"
+        length = 0
+        try:
+            conn = sqlite3.connect(path)
+            try:
+                conn.execute("PRAGMA journal_mode=OFF")
+                conn.execute("PRAGMA synchronous=OFF")
+                conn.execute(f"CREATE TABLE result ({columns})")
+                chunk = head
+                while chunk:
+                    conn.executemany(insert, chunk)
+                    length += len(chunk)
+                    chunk = cursor.fetchmany(chunk_rows)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            _remove(path)
+            raise
+        return cls(path, length, width)
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        # One short-lived connection per read: handles are used from any thread
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def page(self, offset: int, limit: int) -> list:
+        """
+        Rows offset .. offset + limit - 1 as a list of tuples.
+        """
+        if limit <= 0 or offset >= self._length:
+            return []
+        return self._query(
+            "SELECT * FROM result WHERE rowid > ? ORDER BY rowid LIMIT ?", (max(offset, 0), limit)
+        )
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step < 0:
+                return list(reversed(self.page(stop + 1, start - stop)))[::-step]
+            rows = self.page(start, stop - start)
+            return rows[::step] if step > 1 else rows
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("result row index out of range")
+        return self.page(index, 1)[0]
+
+    def __iter__(self):
+        for offset in range(0, self._length, RESULT_PAGE_ROWS):
+            yield from self.page(offset, RESULT_PAGE_ROWS)
+
+    def __deepcopy__(self, memo):
+        # Read-only: copies of pipeline state share the file
+        return self
+
+    def __repr__(self) -> str:
+        return f"<SpilledRows {self._length} rows x {self.width} columns>"
+
+    def to_frame(self, columns: list, limit: Optional[int] = None) -> "pd.DataFrame":
+        """
+        Reads the rows (or the first `limit`) straight into a DataFrame,
+        which is far more compact than the equivalent list of tuples.
+        """
+        import pandas as pd
+
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            frame = pd.read_sql_query(
+                "SELECT * FROM result ORDER BY rowid LIMIT ?", conn,
+                params=(-1 if limit is None else limit,),
+            )
+        finally:
+            conn.close()
+        frame.columns = columns
+        return frame
+
+    def column(self, columns: list, name: str) -> str:
+        """
+        Name of result column `name` in the spill table, for select_frame().
+        """
+        return f"c{columns.index(name)}"
+
+    def select_frame(self, sql: str, columns: list, params: tuple = ()) -> "pd.DataFrame":
+        """
+        DataFrame of a query against the spill table ('result', columns
+        c0..cN, see column()), so reductions run in SQLite, on disk.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self._query(sql, params), columns=columns)
+
+    def sample_frame(self, columns: list, max_rows: int = RESULT_SAMPLE_ROWS,
+                     select: Optional[list] = None) -> "pd.DataFrame":
+        """
+        Every k-th row (at most max_rows, spread over the whole result) of
+        the `select` columns, or all columns.
+        """
+        select = select or columns
+        step = max(1, -(-self._length // max_rows))
+        refs = ", ".join(self.column(columns, name) for name in select)
+        return self.select_frame(
+            f"SELECT {refs} FROM result WHERE (rowid - 1) % ? = 0 ORDER BY rowid LIMIT ?",
+            select, (step, max_rows),
+        )
+
+
+def is_spilled(rows) -> bool:
+    return isinstance(rows, SpilledRows)
+
+
+def rows_frame(rows, columns: list, limit: Optional[int] = None) -> "pd.DataFrame":
+    """
+    DataFrame of a result's rows, whether they are in memory or spilled.
+    """
+    if is_spilled(rows):
+        return rows.to_frame(columns, limit)
+    import pandas as pd
+
+    return pd.DataFrame(rows if limit is None else rows[:limit], columns=columns)
+
+
+def rows_page(rows, offset: int, limit: int) -> list:
+    """
+    One window of a result's rows; for spilled results only that rowid
+    range is read from disk.
+    """
+    if is_spilled(rows):
+        return rows.page(offset, limit)
+    return list(rows[offset:offset + limit])
+
+
+def rows_chunks(rows, chunk_rows: int = RESULT_PAGE_ROWS):
+    """
+    A result's rows as successive lists of at most chunk_rows rows.
+    """
+    for offset in range(0, len(rows), chunk_rows):
+        yield rows_page(rows, offset, chunk_rows)
+
+
+def frame_chunks(rows, columns: list, chunk_rows: int = RESULT_PAGE_ROWS):
+    """
+    A result's rows as successive DataFrames of at most chunk_rows rows.
+    """
+    import pandas as pd
+
+    for chunk in rows_chunks(rows, chunk_rows):
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def fetch_rows(cursor: sqlite3.Cursor, max_bytes: int = RESULT_MEMORY_MAX_BYTES,
+               budget: MemoryBudget = result_budget, chunk_rows: int = RESULT_FETCH_ROWS):
+    """
+    All rows of an executed cursor: a ResultRows list, charged to the
+    budget while it is held, when they fit; otherwise a SpilledRows handle.
+    """
+    rows = ResultRows()
+    size = 0
+    try:
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            chunk_bytes = estimate_bytes(chunk)
+            if size + chunk_bytes > max_bytes or not budget.reserve(chunk_bytes):
+                print(f"[Result Store] Result over {size + chunk_bytes:,} bytes after {len(rows) + len(chunk)} rows; "
+                      f"spilling to disk.")
+                budget.record_spill()
+                head = rows + chunk
+                rows.clear()
+                budget.release(size)
+                size = 0
+                spilled = SpilledRows.create(head, cursor, len(cursor.description), chunk_rows)
+                print(f"[Result Store] Spilled {len(spilled)} rows.")
+                return spilled
+            rows.extend(chunk)
+            size += chunk_bytes
+    except BaseException:
+        budget.release(size)
+        raise
+    return rows.hold(budget, size)
+
+
+def _owner_alive(name: str) -> Optional[bool]:
+    """
+    Whether the process named in a spill file name is still running, or
+    None when that can't be told (no PID in the name, or no POSIX kill()).
+    """
+    parts = name.split("-", 2)
+    if len(parts) < 3 or not parts[1].isdigit() or os.name != "posix":
+        return None
+    try:
+        os.kill(int(parts[1]), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+def sweep_spill_dir(max_age_s: float = RESULT_SPILL_MAX_AGE_S, directory=RESULT_SPILL_DIR) -> int:
+    """
+    Removes spill and export files left behind by processes that exited
+    without cleaning up: files whose owning PID is dead, and files with no
+    known owner once they are older than max_age_s. Files of running
+    processes are never touched. Returns the number of files removed.
+    """
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for entry in os.scandir(directory):
+        if not entry.name.startswith(("result-", "export-")):
+            continue
+        try:
+            alive = _owner_alive(entry.name)
+            if alive is False or (alive is None and entry.stat().st_mtime < cutoff):
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+sweep_spill_dir()
@@ -0,0 +1,74 @@
+import threading
+from typing import Callable, Hashable, Optional, Tuple
+
+
+class _Flight:
+    def __init__(self, context=None):
+        self.context = context
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it is in flight wait and receive the
+    same result (or exception). Nothing is cached once the call returns.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], object], context=None,
+           on_join: Optional[Callable[[object], None]] = None) -> Tuple[object, bool]:
+        """
+        Returns (result, shared). shared is True when more than one caller
+        received this result, in which case callers must not mutate it.
+        The leader's context is handed to on_join of each caller that joins
+        its execution (e.g. to raise the execution's priority).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight(context)
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            print(f"[SingleFlight:{self.name}] Joined in-flight execution.")
+            if on_join is not None:
+                on_join(flight.context)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, flight.waiters > 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "in_flight": len(self._flights),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+            }
@@ -0,0 +1,189 @@
+"""
+Mergeable streaming sketches with bounded memory (numpy/pandas only).
+
+- HyperLogLog: distinct count estimate
+- KLLSketch: quantiles and histograms of numeric values
+- SpaceSaving: most frequent values (heavy hitters)
+
+Each sketch is fed with update(array) one chunk at a time, and two sketches
+built over different row ranges combine with merge(other), so a table can be
+profiled in parallel and the partial results folded together.
+"""
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values: np.ndarray) -> np.ndarray:
+    """
+    Stable 64-bit hashes. Numbers hash by value (1 and 1.0 are equal) and
+    everything else by its string form, so chunks with different inferred
+    dtypes agree.
+    """
+    if np.issubdtype(values.dtype, np.number):
+        return pd.util.hash_array(values.astype(np.float64))
+    return pd.util.hash_array(values.astype(str).astype(object))
+
+
+class HyperLogLog:
+    """
+    HyperLogLog with 2**precision registers (relative error ~1.04/sqrt(m)).
+    precision must be at least 11 so the rank bits fit a float64 exactly.
+    """
+
+    def __init__(self, precision: int = 12):
+        if not 11 <= precision <= 18:
+            raise ValueError("precision must be between 11 and 18")
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        h = hash_values(values)
+        idx = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = h & np.uint64((1 << (64 - self.p)) - 1)
+        # Rank = position of the leftmost 1-bit in the remaining 64 - p bits
+        with np.errstate(divide="ignore"):
+            bits = np.floor(np.log2(rest.astype(np.float64)))
+        rank = np.where(rest > 0, (64 - self.p) - bits, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range correction (linear counting)
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch. Level h holds items of weight 2**h; a full level is
+    sorted and every other item (random offset) is promoted, so memory stays
+    around 3k items whatever the stream length. Rank error is ~1.7/k.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        # Compact the lowest over-full level until the sketch fits its total budget
+        while sum(map(len, self.levels)) > sum(self._capacity(h) for h in range(len(self.levels))):
+            level = next(h for h, items in enumerate(self.levels) if len(items) > self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays at this level
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            paired = items[:len(items) - len(keep)]
+            promoted = paired[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def _weighted(self) -> tuple:
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2.0 ** h) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantiles(self, qs) -> list:
+        if self.n == 0:
+            return [None for _ in qs]
+        items, weights = self._weighted()
+        cumulative = np.cumsum(weights)
+        targets = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        idx = np.minimum(np.searchsorted(cumulative, targets, side="left"), len(items) - 1)
+        return items[idx].tolist()
+
+    def histogram(self, bins: int = 20) -> tuple:
+        """
+        (edges, estimated counts) over the observed range.
+        """
+        if self.n == 0:
+            return [], []
+        items, weights = self._weighted()
+        counts, edges = np.histogram(items, bins=bins, weights=weights)
+        # Weights are scaled so the counts add up to the true stream length
+        counts = counts * (self.n / weights.sum())
+        return edges.tolist(), np.round(counts).astype(np.int64).tolist()
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k summary keeping at most `capacity` counters.
+    Counts are upper bounds; `errors` bound the overestimate. Merging
+    charges values missing from a full summary that summary's minimum count.
+    """
+
+    def __init__(self, capacity: int = 50):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+
+    def _floor(self) -> int:
+        # Largest count a value not tracked here could have
+        return int(self.counts.min()) if len(self.counts) >= self.capacity else 0
+
+    def _combine(self, counts: pd.Series, errors: pd.Series, floor: int) -> None:
+        own_floor = self._floor()
+        merged = self.counts.add(counts, fill_value=0)
+        merged_errors = self.errors.add(errors, fill_value=0)
+        missing_here = ~merged.index.isin(self.counts.index)
+        missing_there = ~merged.index.isin(counts.index)
+        merged[missing_here] += own_floor
+        merged_errors[missing_here] += own_floor
+        merged[missing_there] += floor
+        merged_errors[missing_there] += floor
+
+        top = merged.nlargest(self.capacity, keep="first")
+        self.counts = top.astype(np.int64)
+        self.errors = merged_errors.reindex(top.index).astype(np.int64)
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        # The chunk's exact counts are a summary with no error
+        counts = pd.Series(values).value_counts(sort=False)
+        self._combine(counts, pd.Series(0, index=counts.index, dtype=np.int64), 0)
+
+    def merge(self, other: "SpaceSaving") -> None:
+        self._combine(other.counts, other.errors, other._floor())
+
+    def top(self, n: int = 10) -> list:
+        """
+        [(value, count, max overestimate)] for the n most frequent values.
+        """
+        top = self.counts.nlargest(n, keep="first")
+        return [(value, int(count), int(self.errors[value])) for value, count in top.items()]
@@ -1,14 +1,155 @@
 import sqlite3
-import pandas as pd
 import os
+import re
+from typing import Optional
+
+from config.settings import SQL_RESULT_CACHE_SIZE, SQL_RESULT_CACHE_MAX_ROWS, EXPORT_CHUNK_ROWS
+from tools.lru_cache import LRUCache
+from tools.single_flight import SingleFlight
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '../db/analyst.db')
 
+# shared_state["sql_mode"] values
+EXACT = "exact"
+APPROXIMATE = "approximate"
+
+sql_result_cache = LRUCache("sql_result", SQL_RESULT_CACHE_SIZE)
+# Identical queries running at the same time share one execution
+sql_flight = SingleFlight("sql")
+
+def data_version() -> str:
+    """
+    Cheap token identifying the current database contents; changes whenever
+    the file is rewritten (e.g. a new CSV upload). Used to key caches.
+    """
+    try:
+        st = os.stat(DB_PATH)
+    except OSError:
+        return "missing"
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _execute_sql(sql_query: str):
+    """
+    Runs one query and returns (columns, rows); raises on SQL errors.
+    """
+    from tools.result_store import fetch_rows
+
+    # Ensure DB directory exists
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.cursor()
+        
+        print(f"[SQL Tool] Executing: {sql_query}")
+        cursor.execute(sql_query)
+        
+        columns = [description[0] for description in cursor.description]
+        # A list, or a paged handle on disk if the result is over the memory budget
+        rows = fetch_rows(cursor)
+    finally:
+        conn.close()
+    return columns, rows
+
+_NAME = r'(?:"(?:[^"]|"")+"|[A-Za-z_]\w*)'
+_NOT_ALIAS = {"WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER",
+              "CROSS", "NATURAL", "ON", "USING", "UNION", "EXCEPT", "INTERSECT", "WINDOW", "AS"}
+# Keywords followed by a value, not by an alias
+_BEFORE_VALUE = {"SELECT", "DISTINCT", "ALL", "BY", "WHERE", "HAVING", "AND", "OR", "NOT", "ON", "CASE", "WHEN",
+                 "THEN", "ELSE", "IN", "IS", "LIKE", "GLOB", "BETWEEN", "RETURNING", "VALUES", "SET", "LIMIT",
+                 "OFFSET"}
+
+def _sql_aliases(sql: str) -> set:
+    """
+    Lower-cased names the query defines itself: column and table aliases
+    (with or without AS) and CTE names. Over-collecting only lets a name
+    through to SQLite; missing one rejects a valid query.
+    """
+    unquote = lambda name: name[1:-1].replace('""', '"') if name.startswith('"') else name
+    aliases = set()
+    # expr AS name, and CTEs: name AS (...)
+    aliases.update(unquote(n) for n in re.findall(r'\bAS\s+(' + _NAME + ')', sql, flags=re.IGNORECASE))
+    aliases.update(unquote(n) for n in re.findall(r'(' + _NAME + r')\s+AS\s*\(', sql, flags=re.IGNORECASE))
+    # Implicit column aliases: expr name, / expr name FROM
+    for m in re.finditer(r'(\w+|[")\]])\s+(' + _NAME + r')\s*(?=,|\bFROM\b)', sql, flags=re.IGNORECASE):
+        if m.group(1).upper() not in _BEFORE_VALUE and m.group(2).upper() not in _NOT_ALIAS:
+            aliases.add(unquote(m.group(2)))
+    # FROM/JOIN table alias
+    for n in re.findall(r'\b(?:FROM|JOIN)\s+' + _NAME + r'\s+(' + _NAME + ')', sql, flags=re.IGNORECASE):
+        if n.upper() not in _NOT_ALIAS:
+            aliases.add(unquote(n))
+    return {a.lower() for a in aliases}
+
+def _quoted_identifier_errors(sql_query: str, columns: list) -> Optional[str]:
+    """
+    SQLite treats a double-quoted name that matches no column as a string
+    literal, so e.g. SELECT "Revenue" silently returns the text 'Revenue'.
+    Reports such names in value positions unless they are columns, the
+    table or names the query defines (aliases, CTEs). Qualifiers ("t".) and
+    qualified names ("t"."x") are never literals and are left to SQLite.
+    """
+    # Ignore anything inside single-quoted string literals
+    stripped = re.sub(r"'(?:[^']|'')*'", "''", sql_query)
+    known = {c.lower() for c in columns} | {"data_table"} | _sql_aliases(stripped)
+    for m in re.finditer(r'"((?:[^"]|"")+)"', stripped):
+        name = m.group(1).replace('""', '"')
+        if name.lower() in known:
+            continue
+        before, after = stripped[:m.start()].rstrip(), stripped[m.end():].lstrip()
+        if before.endswith(".") or after.startswith("."):
+            continue
+        # Names being defined, or tables
+        if re.search(r'\b(?:AS|FROM|JOIN|INTO|TABLE)$', before, flags=re.IGNORECASE):
+            continue
+        return f'no such column: "{name}"'
+    return None
+
+def validate_sql(sql_query: str, columns: Optional[list] = None) -> Optional[str]:
+    """
+    Compiles the query with EXPLAIN against the live schema (nothing is
+    executed) and checks double-quoted column references.
+    Returns the error message, or None if the query is valid.
+    """
+    if not sql_query:
+        return "No SQL query provided"
+    if not os.path.exists(DB_PATH):
+        # Nothing to validate against; execution reports the problem
+        return None
+
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(DB_PATH)}?mode=ro", uri=True)
+        try:
+            conn.execute(f"EXPLAIN {sql_query}")
+        finally:
+            conn.close()
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        return str(e)
+
+    if columns:
+        return _quoted_identifier_errors(sql_query, columns)
+    return None
+
+def _execute_approximate(sql_query: str) -> Optional[dict]:
+    """
+    Runs an aggregate query on the sample table; None if it can't be approximated.
+    """
+    # numpy/pandas are only loaded once a query is approximated
+    from tools.approx_query import execute_approximate
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return execute_approximate(conn, sql_query)
+    finally:
+        conn.close()
+
 def run_sql_tool(shared_state: dict) -> dict:
     """
     Executes the SQL query found in shared_state['sql_agent']['sql']
     against the SQLite database.
     Updates shared_state['sql_result'] with columns and rows.
+    With shared_state['sql_mode'] == APPROXIMATE, aggregate queries run on
+    the sample table (see tools.approx_query) unless the exact result is
+    already cached; the result then carries an 'approximate' entry.
     """
     sql_query = shared_state.get("sql_agent", {}).get("sql", "")
     
@@ -17,30 +158,44 @@ def run_sql_tool(shared_state: dict) -> dict:
         shared_state["sql_result"] = {"columns": [], "rows": [], "error": "No SQL query provided"}
         return shared_state
 
+    cache_key = (data_version(), sql_query)
+    cached = sql_result_cache.get(cache_key)
+    if cached is not None:
+        columns, rows = cached
+        shared_state["sql_result"] = {"columns": columns, "rows": rows, "error": None}
+        print(f"[SQL Tool] Cache hit: {len(rows)} rows.")
+        return shared_state
+
+    if shared_state.get("sql_mode") == APPROXIMATE:
+        approx_key = cache_key + (APPROXIMATE,)
+        try:
+            result = sql_result_cache.get(approx_key)
+            if result is None:
+                result, _ = sql_flight.do(approx_key, lambda: _execute_approximate(sql_query))
+                if result is not None:
+                    sql_result_cache.put(approx_key, result)
+        except Exception as e:
+            # Fall back to the exact query, which reports real errors
+            print(f"[SQL Tool] Approximate execution failed: {e}")
+            result = None
+        if result is not None:
+            shared_state["sql_result"] = {**result, "approximate": dict(result["approximate"])}
+            print(f"[SQL Tool] Approximate: {len(result['rows'])} rows from the sample.")
+            return shared_state
+
     try:
-        # Ensure DB directory exists
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        print(f"[SQL Tool] Executing: {sql_query}")
-        cursor.execute(sql_query)
-        
-        columns = [description[0] for description in cursor.description]
-        rows = cursor.fetchall()
-        
-        conn.close()
+        (columns, rows), _ = sql_flight.do(cache_key, lambda: _execute_sql(sql_query))
         
-        # Convert rows to list of lists for JSON serialization if needed, 
-        # but list of tuples is fine for internal use.
-        # We'll stick to list of tuples as returned by fetchall.
+        # Rows are a list of tuples, or a tools.result_store.SpilledRows
+        # handle (same sequence interface) for results over the memory budget.
         
         shared_state["sql_result"] = {
             "columns": columns,
             "rows": rows,
             "error": None
         }
+        if len(rows) <= SQL_RESULT_CACHE_MAX_ROWS:
+            sql_result_cache.put(cache_key, (columns, rows))
         print(f"[SQL Tool] Success: {len(rows)} rows returned.")
 
     except Exception as e:
@@ -53,11 +208,73 @@ def run_sql_tool(shared_state: dict) -> dict:
 
     return shared_state
 
+def run_exact_sql(sql_query: str) -> dict:
+    """
+    Exact sql_result for a query (the refine job of approximate mode).
+    """
+    return run_sql_tool({"sql_agent": {"sql": sql_query}, "sql_mode": EXACT})["sql_result"]
+
+# Statements a streamed (export) query may perform: reads only
+_STREAM_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+def _read_only(action, *_):
+    return sqlite3.SQLITE_OK if action in _STREAM_ACTIONS else sqlite3.SQLITE_DENY
+
+def stream_query(sql_query: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Runs a read-only query and returns (columns, chunks), where chunks
+    yields lists of at most chunk_rows rows straight from the cursor. The
+    connection stays open until the generator is exhausted or closed.
+    Raises sqlite3.Error / ValueError for invalid or non-SELECT queries.
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(DB_PATH)}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        conn.set_authorizer(_read_only)
+        cursor = conn.execute(sql_query)
+        if cursor.description is None:
+            raise ValueError("Only queries that return rows can be exported.")
+        columns = [description[0] for description in cursor.description]
+    except Exception:
+        conn.close()
+        raise
+
+    def chunks():
+        try:
+            while True:
+                chunk = cursor.fetchmany(chunk_rows)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            conn.close()
+
+    return columns, chunks()
+
+def fetch_sample_tool(limit: int = 1000) -> dict:
+    """
+    Returns the first `limit` rows of 'data_table' as a sql_result dict,
+    used as input for discovery mode.
+    """
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM data_table LIMIT ?", (limit,))
+        rows = cursor.fetchall()
+        columns = [description[0] for description in cursor.description]
+        conn.close()
+        return {"columns": columns, "rows": rows, "error": None}
+    except Exception as e:
+        print(f"[SQL Tool] Sample fetch failed: {e}")
+        return {"columns": [], "rows": [], "error": str(e)}
+
 def load_csv_to_db(csv_file):
     """
     Helper to load a CSV file into the SQLite DB as 'data_table'.
     """
     try:
+        import pandas as pd
+        from tools.approx_query import build_sample_table
+
         df = pd.read_csv(csv_file)
         
         # Ensure DB directory exists
@@ -65,6 +282,8 @@ def load_csv_to_db(csv_file):
         
         conn = sqlite3.connect(DB_PATH)
         df.to_sql("data_table", conn, if_exists="replace", index=False)
+        # Sample for approximate queries (dropped for small tables)
+        build_sample_table(conn, df)
         conn.close()
         print(f"[SQL Tool] Loaded {len(df)} rows into 'data_table'.")
         return True
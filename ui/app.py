@@ -1,23 +1,200 @@
 import streamlit as st
 import sys
 import os
-import base64
+import uuid
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-import nest_asyncio
-nest_asyncio.apply()
-
 # Ensure root import visibility
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from orchestrator.root_orchestrator import RootOrchestrator
-from tools.sql_tool import load_csv_to_db
+from orchestrator.service import get_orchestrator
+from tools.sql_tool import load_csv_to_db, fetch_sample_tool
+from tools.blob_store import load_chart_image
+from orchestrator.jobs import report_jobs, refine_jobs, QUEUED, RUNNING, DONE
+from orchestrator.speculative import speculator
+from tools.history_store import history_store
+from tools.result_store import rows_frame, rows_page, rows_chunks
+from tools.result_export import EXPORT_FORMATS, export_file
+from config.settings import RESULT_VIEW_PAGE_SIZES, EXPORT_CHUNK_ROWS
 
 st.set_page_config(page_title="AI Data Analyst", layout="wide")
 
+@st.cache_resource
+def get_shared_orchestrator():
+    """
+    One orchestrator per server process, shared by every session and rerun.
+    """
+    return get_orchestrator()
+
+# Create (and start warming) the orchestrator on the first script run,
+# not on the first button click
+get_shared_orchestrator()
+
+def render_report(job_id):
+    """
+    Report download panel. While the background job is pending the panel
+    polls its status; once it finishes, the app reruns to stop polling.
+    """
+    job = report_jobs.status(job_id) if job_id else None
+    pending = job is not None and job["status"] in (QUEUED, RUNNING)
+
+    @st.fragment(run_every=2 if pending else None)
+    def report_panel():
+        job = report_jobs.status(job_id) if job_id else None
+        if job is None:
+            st.warning("Report generation failed.")
+            return
+
+        if job["status"] in (QUEUED, RUNNING):
+            st.info("Generating PDF report in the background...")
+            return
+        if pending:
+            st.rerun()
+
+        report_path = job.get("result")
+        if job["status"] == DONE and report_path and os.path.exists(report_path):
+            with open(report_path, "rb") as f:
+                st.download_button(
+                    label="Download PDF Report",
+                    data=f,
+                    file_name=os.path.basename(report_path),
+                    mime="application/pdf"
+                )
+        else:
+            st.warning("Report generation failed.")
+
+    report_panel()
+
+def _export(columns, rows, fmt):
+    """
+    Export file of a stored result, written from it chunk by chunk.
+    Runs only when a download button is clicked.
+    """
+    path = export_file(columns, rows_chunks(rows, EXPORT_CHUNK_ROWS), fmt)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def render_rows(columns, rows, key):
+    """
+    Result table, one page at a time: only the visible window of rows is
+    read (from disk for spilled results) and sent to the browser.
+    """
+    col1, col2 = st.columns(2)
+    page_size = col1.selectbox("Rows per page", RESULT_VIEW_PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-len(rows) // page_size))
+    # A larger page size can leave the current page past the end
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = col2.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, key=f"{key}_page")
+    offset = (page - 1) * page_size
+    window = rows_page(rows, offset, page_size)
+    st.caption(f"Rows {offset + 1:,}–{offset + len(window):,} of {len(rows):,}")
+    st.dataframe(rows_frame(window, columns), hide_index=True)
+
+    for column, fmt in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+        mime, extension = EXPORT_FORMATS[fmt]
+        column.download_button(
+            label=f"Download {fmt.upper()}",
+            data=lambda fmt=fmt: _export(columns, rows, fmt),
+            file_name=f"result{extension}",
+            mime=mime,
+            key=f"{key}_export_{fmt}",
+        )
+
+def render_refine(job_id):
+    """
+    Exact result of an approximate query, polled like the report panel.
+    """
+    job = refine_jobs.status(job_id)
+    pending = job is not None and job["status"] in (QUEUED, RUNNING)
+
+    @st.fragment(run_every=2 if pending else None)
+    def refine_panel():
+        job = refine_jobs.status(job_id)
+        if job is None:
+            return
+        if job["status"] in (QUEUED, RUNNING):
+            st.caption("Computing the exact result in the background...")
+            return
+        if pending:
+            st.rerun()
+
+        exact = job.get("result") or {}
+        if job["status"] == DONE and not exact.get("error"):
+            with st.expander(f"Exact result ({len(exact.get('rows', []))} rows)"):
+                render_rows(exact["columns"], exact.get("rows", []), key=f"refine_{job_id}")
+        else:
+            st.warning("Exact result could not be computed.")
+
+    refine_panel()
+
+def render_result(result):
+    # 1. SQL Results
+    st.subheader("📊 Data Query")
+    sql_result = result.get("sql_result", {})
+    if sql_result.get("error"):
+        st.error(f"SQL Error: {sql_result['error']}")
+    else:
+        st.code(result.get("sql_agent", {}).get("sql", "No SQL generated"), language="sql")
+        rows = sql_result.get("rows", [])
+        cols = sql_result.get("columns", [])
+        approx = sql_result.get("approximate")
+        if approx:
+            bounds = "; ".join(
+                f"{name} ±{max(widths):,.4g}" for name, widths in approx["bounds"].items() if widths
+            )
+            st.info(
+                f"Approximate: estimated from a {approx['sample_rows']:,}-row sample of "
+                f"{approx['population_rows']:,} rows. {approx['confidence']:.0%} bounds (largest): {bounds or 'n/a'}."
+            )
+        if rows:
+            render_rows(cols, rows, key=f"result_{abs(hash(result.get('sql_agent', {}).get('sql')))}_{len(rows)}")
+        else:
+            st.warning("No data returned from query.")
+        if approx and approx.get("refine_job"):
+            render_refine(approx["refine_job"])
+
+    # 2. Insights & Forecast
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("💡 Insights")
+        insights = result.get("insight_agent", {}).get("insights", "No insights available.")
+        st.write(insights)
+
+    with col2:
+        st.subheader("📈 Forecast")
+        forecast = result.get("forecast_agent", {}).get("forecast_text", "No forecast available.")
+        st.write(forecast)
+        for chart in result.get("forecast_agent", {}).get("charts", []):
+            img_bytes = load_chart_image(chart, "thumb")
+            if img_bytes:
+                st.image(img_bytes)
+
+    # 3. Charts
+    st.subheader("🎨 Visualizations")
+    charts = result.get("chart_agent", {}).get("charts", [])
+    if charts:
+        cols = st.columns(len(charts))
+        for i, chart in enumerate(charts):
+            with cols[i]:
+                st.caption(chart.get("spec", {}).get("title", "Chart"))
+                img_bytes = load_chart_image(chart, "thumb")
+                if img_bytes:
+                    st.image(img_bytes)
+    else:
+        st.info("No charts generated.")
+
+    # 4. Report (rendered by a background job)
+    st.subheader("📄 Report")
+    render_report(result.get("report_job"))
+
 def main():
     st.title("🤖 AI Autonomous Data Analyst")
     st.markdown("---")
@@ -27,8 +204,9 @@ def main():
         st.session_state.messages = []
     if "discovery_data" not in st.session_state:
         st.session_state.discovery_data = None
-    if "history" not in st.session_state:
-        st.session_state.history = []
+    if "session_id" not in st.session_state:
+        # Stable per-session id: the PDF report is rebuilt under one filename
+        st.session_state.session_id = uuid.uuid4().hex
 
     # Sidebar for setup
     with st.sidebar:
@@ -44,27 +222,21 @@ def main():
                         st.success("Data loaded!")
                         
                         # Run Discovery
-                        orchestrator = RootOrchestrator()
-                        # We need to pass the data to discovery, but currently it reads from DB.
-                        # We can just pass a dummy state with sql_result populated from a "select * limit 5"
-                        # Or better, let's just fetch a sample in the UI and pass it?
-                        # Actually, let's make a helper to get sample data.
-                        
-                        import sqlite3
-                        conn = sqlite3.connect(os.path.join(os.path.dirname(__file__), '../db/analyst.db'))
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT * FROM data_table LIMIT 1000")
-                        rows = cursor.fetchall()
-                        columns = [description[0] for description in cursor.description]
-                        conn.close()
-                        
+                        orchestrator = get_shared_orchestrator()
                         discovery_state = {
-                            "sql_result": {"rows": rows, "columns": columns},
+                            "sql_result": fetch_sample_tool(20),
                             "user_query": "" # No query for discovery
                         }
                         
                         result = orchestrator.run_discovery(discovery_state)
                         st.session_state.discovery_data = result
+
+                        # Precompute the recommended questions while the user reads
+                        speculator.start(
+                            orchestrator,
+                            st.session_state.session_id,
+                            result.get("insight_agent", {}).get("recommended_questions", [])
+                        )
                     else:
                         st.error("Failed to load data.")
 
@@ -73,6 +245,9 @@ def main():
     # 1. Discovery Section (Charts & Recommendations)
     if st.session_state.discovery_data:
         st.subheader("🚀 Data Overview")
+        profile = st.session_state.discovery_data.get("profile")
+        if profile:
+            st.caption(f"Profiled all {profile['rows']:,} rows and {len(profile['columns'])} columns.")
         
         # Charts
         charts = st.session_state.discovery_data.get("chart_agent", {}).get("charts", [])
@@ -81,9 +256,9 @@ def main():
             for i, chart in enumerate(charts):
                 with cols[i]:
                     st.caption(chart.get("spec", {}).get("title", "Overview Chart"))
-                    img_data = chart.get("png")
-                    if img_data:
-                        st.image(base64.b64decode(img_data))
+                    img_bytes = load_chart_image(chart, "thumb")
+                    if img_bytes:
+                        st.image(img_bytes)
         
         # Recommendations
         st.subheader("💡 Recommended Questions")
@@ -98,83 +273,49 @@ def main():
     # 2. Chat Interface
     user_query = st.text_input("Ask a question about your data:", key="user_query_input", placeholder="e.g., Show me sales trends over time")
 
+    approximate = st.checkbox(
+        "Fast approximate preview",
+        help="Answers aggregates from a sample with error bounds; the exact result follows in the background."
+    )
+
     if st.button("Analyze Query") and user_query:
-        orchestrator = RootOrchestrator()
+        orchestrator = get_shared_orchestrator()
         
         with st.spinner("Running AI Analysis Pipeline..."):
             try:
-                # Pass history to orchestrator
-                result = orchestrator.run(user_query, history=st.session_state.history)
+                # Drops other speculative work; waits if this one is in flight
+                speculator.claim(st.session_state.session_id, user_query)
+
+                # History is read from the session's store by the report job
+                result = orchestrator.run(
+                    user_query,
+                    session_id=st.session_state.session_id,
+                    approximate=approximate
+                )
                 
-                # Append result to history for next time
+                # Append result to history for next time, unless the query never ran
                 # We only need specific fields to save space/context
-                history_item = {
-                    "user_query": user_query,
-                    "insight_agent": result.get("insight_agent", {}),
-                    "forecast_agent": result.get("forecast_agent", {}),
-                    "chart_agent": result.get("chart_agent", {})
-                }
-                st.session_state.history.append(history_item)
-                
-                # 1. SQL Results
-                st.subheader("📊 Data Query")
-                sql_result = result.get("sql_result", {})
-                if sql_result.get("error"):
-                    st.error(f"SQL Error: {sql_result['error']}")
-                else:
-                    st.code(result.get("sql_agent", {}).get("sql", "No SQL generated"), language="sql")
-                    rows = sql_result.get("rows", [])
-                    cols = sql_result.get("columns", [])
-                    if rows:
-                        st.dataframe([dict(zip(cols, row)) for row in rows])
-                    else:
-                        st.warning("No data returned from query.")
-
-                # 2. Insights & Forecast
-                col1, col2 = st.columns(2)
+                if result.get("stage_status", {}).get("sql_tool") == DONE:
+                    history_item = {
+                        "user_query": user_query,
+                        "insight_agent": result.get("insight_agent", {}),
+                        "forecast_agent": result.get("forecast_agent", {}),
+                        "chart_agent": result.get("chart_agent", {})
+                    }
+                    history_store.append(st.session_state.session_id, history_item)
                 
-                with col1:
-                    st.subheader("💡 Insights")
-                    insights = result.get("insight_agent", {}).get("insights", "No insights available.")
-                    st.write(insights)
-
-                with col2:
-                    st.subheader("📈 Forecast")
-                    forecast = result.get("forecast_agent", {}).get("forecast_text", "No forecast available.")
-                    st.write(forecast)
-
-                # 3. Charts
-                st.subheader("🎨 Visualizations")
-                charts = result.get("chart_agent", {}).get("charts", [])
-                if charts:
-                    cols = st.columns(len(charts))
-                    for i, chart in enumerate(charts):
-                        with cols[i]:
-                            st.caption(chart.get("spec", {}).get("title", "Chart"))
-                            img_data = chart.get("png")
-                            if img_data:
-                                st.image(base64.b64decode(img_data))
-                else:
-                    st.info("No charts generated.")
-
-                # 4. Report
-                st.subheader("📄 Report")
-                report_path = result.get("report_file")
-                if report_path and os.path.exists(report_path):
-                    with open(report_path, "rb") as f:
-                        st.download_button(
-                            label="Download PDF Report",
-                            data=f,
-                            file_name=os.path.basename(report_path),
-                            mime="application/pdf"
-                        )
-                else:
-                    st.warning("Report generation failed.")
+                # Kept in session state so results survive the reruns
+                # triggered while the report renders in the background
+                st.session_state.last_result = result
 
             except Exception as e:
+                st.session_state.last_result = None
                 st.error(f"Pipeline Critical Error: {e}")
                 import traceback
                 st.code(traceback.format_exc())
 
+    if st.session_state.get("last_result"):
+        render_result(st.session_state.last_result)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file